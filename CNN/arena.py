@@ -0,0 +1,315 @@
+"""Head-to-head arena between two policy models for checkpoint gating.
+
+All games advance in lockstep: on every ply the games where model A is to
+move are sent through A in one forward pass, and likewise for B. Colours
+alternate between games. Moves are sampled from the policy at
+``--temperature`` for the first ``--sample-moves`` plies (so games differ)
+and taken greedily afterwards. A player passes when no legal move is left
+that does not fill its own eye. The game ends after two passes or once
+neither side has such a move, and is then scored by Tromp-Taylor area rules
+with komi (``scoring.py``). Each model has its own ``EvalCache``, so the
+opening positions that recur between games are evaluated once.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from board import Color, GoGameState
+from mcts import ko_point
+from runtime import EvalCache, Policy, batch_policy_probs, load_policy
+from scoring import area_scores, eye_mask, has_moves
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def play_policy_move(
+    state: GoGameState,
+    color: Color,
+    probs: np.ndarray,
+    ko: Optional[Tuple[int, int]],
+    temperature: float,
+    rng: np.random.Generator,
+) -> Tuple[Optional[Tuple[int, int]], List[Tuple[int, int]]]:
+    """Play a move drawn from ``probs`` on ``state``; returns ``(coord, captured)`` or ``(None, [])`` for pass.
+
+    Occupied points, the ko point and own single-point eyes are excluded.
+    ``temperature == 0`` takes the most likely move. A pass output (conv
+    head) competes with the board moves; otherwise the player passes only
+    when nothing else is legal.
+    """
+    size = state.size
+    points = size * size
+    value = 1 if color == 'B' else -1
+    weights = np.zeros(points + 1, dtype=np.float64)
+    weights[:probs.shape[0]] = probs
+    allowed = (state.board == 0) & ~eye_mask(state.board, value)
+    if ko is not None:
+        allowed[ko[1], ko[0]] = False
+    weights[:points][~allowed.ravel()] = 0.0
+    with np.errstate(divide='ignore'):
+        keys = np.log(weights)
+    if temperature > 0:
+        # Gumbel-max：按 p^(1/T) 抽样后的顺序依次尝试，自杀点被跳过
+        keys = keys / temperature + rng.gumbel(size=keys.shape)
+    for action in np.argsort(-keys):
+        if weights[action] <= 0:
+            break
+        if action == points:
+            return None, []
+        coord = (int(action % size), int(action // size))
+        try:
+            captured = state.play_move(color, coord)
+        except ValueError:
+            continue
+        return coord, captured
+    return None, []
+
+
+class ArenaGame:
+    """One game in the arena; ``players[0]`` is black."""
+
+    __slots__ = ('index', 'states', 'players', 'to_play', 'ko', 'passes', 'moves', 'score')
+
+    def __init__(self, index: int, states: Tuple[GoGameState, GoGameState], a_is_black: bool) -> None:
+        self.index = index
+        self.states = states  # 每个模型按自己的特征集各维护一个局面，特征相同时为同一对象
+        self.players = (0, 1) if a_is_black else (1, 0)
+        self.to_play: Color = 'B'
+        self.ko: Optional[Tuple[int, int]] = None
+        self.passes = 0
+        self.moves = 0
+        self.score: Optional[float] = None
+
+    @property
+    def player(self) -> int:
+        return self.players[0 if self.to_play == 'B' else 1]
+
+    @property
+    def a_is_black(self) -> bool:
+        return self.players[0] == 0
+
+
+def wilson_interval(successes: float, n: int, z: float = 1.96) -> Tuple[float, float]:
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+def elo_difference(win_rate: float) -> float:
+    # 胜率为0或1时Elo发散，截断到±800左右
+    p = min(max(win_rate, 0.01), 0.99)
+    return -400.0 * math.log10(1.0 / p - 1.0) + 0.0  # 避免输出-0
+
+
+def summarize(games: Sequence[ArenaGame]) -> Dict:
+    """Results from model A's point of view (draws count half)."""
+    def tally(subset: Sequence[ArenaGame]) -> Dict:
+        wins = losses = draws = 0
+        for game in subset:
+            black_margin = game.score
+            margin = black_margin if game.a_is_black else -black_margin
+            if margin > 0:
+                wins += 1
+            elif margin < 0:
+                losses += 1
+            else:
+                draws += 1
+        n = len(subset)
+        points = wins + 0.5 * draws
+        rate = points / n if n else 0.0
+        low, high = wilson_interval(points, n)
+        return {
+            'games': n,
+            'wins': wins,
+            'losses': losses,
+            'draws': draws,
+            'win_rate': rate,
+            'ci95': [low, high],
+            'elo': elo_difference(rate),
+            'elo_ci95': [elo_difference(low), elo_difference(high)],
+        }
+
+    return {
+        'overall': tally(games),
+        'a_black': tally([g for g in games if g.a_is_black]),
+        'a_white': tally([g for g in games if not g.a_is_black]),
+        'avg_moves': float(np.mean([g.moves for g in games])) if games else 0.0,
+    }
+
+
+def run_arena(
+    models: Tuple[Policy, Policy],
+    features: Tuple,
+    board_size: int,
+    device: torch.device,
+    num_games: int,
+    parallel: int,
+    komi: float = 7.5,
+    temperature: float = 1.0,
+    sample_moves: int = 20,
+    max_moves: Optional[int] = None,
+    seed: int = 0,
+    cache_size: int = 50000,
+) -> List[ArenaGame]:
+    """Play ``num_games`` games with at most ``parallel`` in flight; returns the finished games.
+
+    ``cache_size`` is the number of entries in each model's evaluation cache (0 disables it).
+    """
+    rng = np.random.default_rng(seed)
+    # 两个模型的输出不同，各用一个缓存
+    caches = tuple(EvalCache(cache_size) if cache_size > 0 else None for _ in models)
+    max_moves = max_moves or 2 * board_size * board_size
+    shared = features[0] == features[1]
+
+    def new_game(index: int) -> ArenaGame:
+        state_a = GoGameState(board_size, features[0])
+        state_b = state_a if shared else GoGameState(board_size, features[1])
+        return ArenaGame(index, (state_a, state_b), a_is_black=index % 2 == 0)
+
+    pending = deque(range(num_games))
+    active: List[ArenaGame] = []
+    finished: List[ArenaGame] = []
+    positions = 0
+    start = time.perf_counter()
+
+    def finish_ended(games: List[ArenaGame]) -> None:
+        boards = np.stack([game.states[0].board for game in games])
+        # 双方都只剩自己的眼可下时无需再走两步pass
+        settled = ~has_moves(boards, 1) & ~has_moves(boards, -1)
+        ended = [i for i, game in enumerate(games) if game.passes >= 2 or game.moves >= max_moves or settled[i]]
+        if not ended:
+            return
+        done = [games[i] for i in ended]
+        for game, score in zip(done, area_scores(boards[ended], komi)):
+            game.score = float(score)
+        finished.extend(done)
+        LOGGER.info("Finished %d/%d games", len(finished), num_games)
+
+    while pending or active:
+        while pending and len(active) < parallel:
+            active.append(new_game(pending.popleft()))
+        for side in (0, 1):
+            # 每一方走完都要判断终局，否则第二次pass之后另一方还会再走一手
+            games = [game for game in active if game.player == side and game.score is None]
+            if not games:
+                continue
+            probs = batch_policy_probs(
+                models[side],
+                [game.states[side] for game in games],
+                [game.to_play for game in games],
+                device,
+                caches[side],
+            )
+            positions += len(games)
+            for game, game_probs in zip(games, probs):
+                color = game.to_play
+                temp = temperature if game.moves < sample_moves else 0.0
+                coord, captured = play_policy_move(game.states[side], color, game_probs, game.ko, temp, rng)
+                if coord is None:
+                    game.passes += 1
+                    game.ko = None
+                else:
+                    if not shared:
+                        game.states[1 - side].play_move(color, coord)
+                    game.passes = 0
+                    game.ko = ko_point(game.states[side], coord[0], coord[1], captured)
+                game.to_play = 'W' if color == 'B' else 'B'
+                game.moves += 1
+            finish_ended(games)
+        active = [game for game in active if game.score is None]
+    elapsed = time.perf_counter() - start
+    LOGGER.info(
+        "Played %d games (%d positions) in %.1fs: %.0f positions/s",
+        num_games,
+        positions,
+        elapsed,
+        positions / max(elapsed, 1e-9),
+    )
+    for label, cache in zip('AB', caches):
+        if cache is not None:
+            LOGGER.info("Model %s evaluation cache: %s", label, cache.stats())
+    finished.sort(key=lambda game: game.index)
+    return finished
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Play two policy models against each other and report strength')
+    parser.add_argument('model_a', help='Candidate checkpoint or artifact')
+    parser.add_argument('model_b', help='Reference checkpoint or artifact')
+    parser.add_argument('--board-size', type=int, default=19)
+    parser.add_argument('--device', default=None, help='Torch device (defaults to cuda if available)')
+    parser.add_argument('--games', type=int, default=200, help='Number of games (colours alternate)')
+    parser.add_argument('--parallel', type=int, default=100, help='Games in flight, i.e. the largest batch per model')
+    parser.add_argument('--komi', type=float, default=7.5)
+    parser.add_argument('--temperature', type=float, default=1.0, help='Sampling temperature for the opening plies')
+    parser.add_argument('--sample-moves', type=int, default=20, help='Plies sampled at --temperature before playing greedily')
+    parser.add_argument('--max-moves', type=int, default=None, help='Score the game after this many plies (default 2*size^2)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-size', type=int, default=50000, help='Evaluation cache entries per model (0 disables)')
+    parser.add_argument('--gate', type=float, default=None, help='Exit with status 1 unless A wins at least this fraction')
+    parser.add_argument('--output', default=None, help='Write the results as JSON')
+    return parser.parse_args()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    args = parse_args()
+    device = torch.device(args.device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+    model_a, features_a = load_policy(Path(args.model_a).expanduser(), args.board_size, device)
+    model_b, features_b = load_policy(Path(args.model_b).expanduser(), args.board_size, device)
+
+    games = run_arena(
+        (model_a, model_b),
+        (features_a, features_b),
+        args.board_size,
+        device,
+        args.games,
+        args.parallel,
+        komi=args.komi,
+        temperature=args.temperature,
+        sample_moves=args.sample_moves,
+        max_moves=args.max_moves,
+        seed=args.seed,
+        cache_size=args.cache_size,
+    )
+    results = summarize(games)
+    print(f"A: {args.model_a}\nB: {args.model_b}")
+    for key, label in (('overall', 'overall'), ('a_black', 'A black'), ('a_white', 'A white')):
+        row = results[key]
+        low, high = row['ci95']
+        elo_low, elo_high = row['elo_ci95']
+        print(
+            f"{label:>8}: {row['wins']:4d}W {row['losses']:4d}L {row['draws']:3d}D  "
+            f"win rate {row['win_rate']:.3f} [{low:.3f}, {high:.3f}]  "
+            f"Elo {row['elo']:+.0f} [{elo_low:+.0f}, {elo_high:+.0f}]"
+        )
+    print(f"avg game length: {results['avg_moves']:.1f} plies")
+
+    if args.output:
+        results.update({'model_a': args.model_a, 'model_b': args.model_b, 'komi': args.komi})
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        LOGGER.info("Wrote %s", args.output)
+    if args.gate is not None:
+        accepted = results['overall']['win_rate'] >= args.gate
+        print(f"gate {args.gate:.2f}: {'ACCEPT' if accepted else 'REJECT'}")
+        sys.exit(0 if accepted else 1)
+
+
+if __name__ == '__main__':
+    main()
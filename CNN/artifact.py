@@ -0,0 +1,62 @@
+"""Self-contained inference artifacts: a TorchScript policy graph plus JSON metadata."""
+from __future__ import annotations
+
+import json
+import logging
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import torch
+import torch.nn as nn
+
+
+LOGGER = logging.getLogger(__name__)
+
+META_FILE = 'policy_meta.json'
+
+
+class _CpuOnly(nn.Module):
+    """Run a CPU-only module (quantized kernels) behind a model used with another device."""
+
+    def __init__(self, inner: nn.Module) -> None:
+        super().__init__()
+        self.inner = inner
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.inner(x.cpu()).to(x.device)
+
+
+def save_artifact(module: torch.jit.ScriptModule, path: Path, meta: Dict[str, Any]) -> None:
+    torch.jit.save(module, str(path), _extra_files={META_FILE: json.dumps(meta)})
+
+
+def is_artifact(path: Path) -> bool:
+    """True for files written by ``save_artifact`` (as opposed to training checkpoints)."""
+    if not zipfile.is_zipfile(path):
+        return False
+    with zipfile.ZipFile(path) as archive:
+        return any(name.endswith(f'extra/{META_FILE}') for name in archive.namelist())
+
+
+def read_meta(path: Path) -> Dict[str, Any]:
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            if name.endswith(f'extra/{META_FILE}'):
+                return json.loads(archive.read(name).decode('utf-8'))
+    raise ValueError(f"{path} is not a policy artifact")
+
+
+def load_artifact(path: Path, device: torch.device) -> Tuple[nn.Module, Dict[str, Any]]:
+    meta = read_meta(path)
+    quantized = bool(meta.get('quantized'))
+    if quantized and meta.get('quantized_engine'):
+        # int8算子需要与导出时相同的量化后端
+        torch.backends.quantized.engine = meta['quantized_engine']
+    # int8算子只有CPU实现
+    module = torch.jit.load(str(path), map_location='cpu' if quantized else device)
+    module.eval()
+    if quantized and device.type != 'cpu':
+        LOGGER.warning("Quantized model %s runs on CPU; inputs on %s are copied over", path, device)
+        return _CpuOnly(module), meta
+    return module, meta
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import torch
+
+from config import TrainingConfig
+from prefetcher import DevicePrefetcher
+from profiling import PhaseTimer, synchronize
+from trainer import Trainer
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class TrialResult:
+    batch_size: int
+    num_workers: int
+    prefetch_factor: int
+    samples_per_sec: float = 0.0
+    peak_memory_mb: Optional[float] = None  # None when it cannot be measured (CPU without psutil)
+    error: Optional[str] = None
+
+
+def _rss_bytes() -> Optional[int]:
+    """Resident memory of this process and its DataLoader workers, or ``None`` without psutil."""
+    try:
+        import psutil
+    except ImportError:
+        # resource.ru_maxrss是进程生命周期内的峰值，后面的试验会继承前面的峰值，不能用来比较
+        return None
+    proc = psutil.Process(os.getpid())
+    total = proc.memory_info().rss
+    for child in proc.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            continue
+    return total
+
+
+def run_trial(
+    cfg: TrainingConfig,
+    batch_size: int,
+    num_workers: int,
+    prefetch_factor: int,
+    steps: int,
+    warmup_steps: int,
+) -> TrialResult:
+    """Time ``steps`` full training steps (after ``warmup_steps``) with the given loader settings.
+
+    The step is ``Trainer.train_step`` on batches from ``Trainer.make_batches``,
+    so model, AMP, compile, channels_last, distillation and device prefetching
+    match the real run. Memory is sampled only outside the timed window.
+    """
+    result = TrialResult(batch_size, num_workers, prefetch_factor)
+    # 试验在单进程里进行，不初始化进程组；每个rank的loader设置与单进程相同
+    trial_cfg = replace(
+        cfg,
+        batch_size=batch_size,
+        num_workers=num_workers,
+        prefetch_factor=prefetch_factor,
+        distributed=False,
+    )
+    trainer = Trainer(trial_cfg, persist=False)
+    device = trainer.device
+    timer = PhaseTimer(device, enabled=False)
+    if device.type == 'cuda':
+        torch.cuda.reset_peak_memory_stats(device)
+
+    batches = trainer.make_batches()
+    rss: List[Optional[int]] = []
+    try:
+        for _ in range(warmup_steps):
+            trainer.train_step(*next(batches), timer)
+        synchronize(device)
+        rss.append(_rss_bytes())
+        samples = 0
+        start = time.perf_counter()
+        for _ in range(steps):
+            inputs, _, _, _, _ = trainer.train_step(*next(batches), timer)
+            samples += inputs.size(0)
+        synchronize(device)
+        result.samples_per_sec = samples / (time.perf_counter() - start)
+        rss.append(_rss_bytes())
+    except RuntimeError as exc:  # 包括显存不足，记录后继续下一组
+        result.error = str(exc).splitlines()[0]
+        if device.type == 'cuda':
+            torch.cuda.empty_cache()
+    finally:
+        if isinstance(batches, DevicePrefetcher):
+            batches.close()
+        del batches
+    if device.type == 'cuda':
+        result.peak_memory_mb = torch.cuda.max_memory_allocated(device) / 2**20
+    elif any(value is not None for value in rss):
+        result.peak_memory_mb = max(value for value in rss if value is not None) / 2**20
+    return result
+
+
+def autotune(
+    cfg: TrainingConfig,
+    batch_sizes: Sequence[int],
+    worker_counts: Sequence[int],
+    prefetch_factors: Sequence[int],
+    steps: int = 30,
+    warmup_steps: int = 5,
+) -> List[TrialResult]:
+    results = []
+    for batch_size in batch_sizes:
+        for num_workers in worker_counts:
+            # 没有worker时prefetch_factor无意义，只跑一次
+            factors = prefetch_factors if num_workers > 0 else prefetch_factors[:1]
+            for prefetch_factor in factors:
+                result = run_trial(cfg, batch_size, num_workers, prefetch_factor, steps, warmup_steps)
+                LOGGER.info(
+                    "autotune bs=%d workers=%d prefetch=%d: %.1f samples/s, peak memory %s%s",
+                    batch_size,
+                    num_workers,
+                    prefetch_factor,
+                    result.samples_per_sec,
+                    'n/a' if result.peak_memory_mb is None else f'{result.peak_memory_mb:.0f} MB',
+                    f" ({result.error})" if result.error else '',
+                )
+                results.append(result)
+    return results
+
+
+def best_trial(results: Sequence[TrialResult]) -> TrialResult:
+    candidates = [r for r in results if r.error is None]
+    if not candidates:
+        raise RuntimeError("All autotune trials failed")
+    return max(candidates, key=lambda r: r.samples_per_sec)
+
+
+def save_tuned(path: Path, best: TrialResult, results: Sequence[TrialResult]) -> None:
+    payload = {
+        'best': {
+            'batch_size': best.batch_size,
+            'num_workers': best.num_workers,
+            'prefetch_factor': best.prefetch_factor,
+        },
+        'trials': [asdict(r) for r in results],
+    }
+    path.write_text(json.dumps(payload, indent=2), encoding='utf-8')
+
+
+def apply_tuned(cfg: TrainingConfig, path: Path) -> TrainingConfig:
+    """Return ``cfg`` with the loader settings chosen by a previous autotune run."""
+    best = json.loads(path.read_text(encoding='utf-8'))['best']
+    return replace(
+        cfg,
+        batch_size=best['batch_size'],
+        num_workers=best['num_workers'],
+        prefetch_factor=best['prefetch_factor'],
+    )
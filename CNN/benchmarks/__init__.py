@@ -0,0 +1,4 @@
+"""Micro-benchmarks for the engine, data pipeline, model and inference hot paths.
+
+Run from the CNN directory: ``python -m benchmarks --help``.
+"""
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import tempfile
+from pathlib import Path
+
+import torch
+
+from board import FeatureSet
+
+from . import bench_data, bench_engine, bench_inference, bench_model
+from .common import compare_to_baseline, save_results, synthetic_games
+
+
+SUITES = ('engine', 'data', 'model', 'inference')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark TinyGo hot paths on synthetic data')
+    parser.add_argument('--suite', nargs='*', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--board-size', type=int, default=19)
+    parser.add_argument('--games', type=int, default=100, help='Synthetic games to generate')
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--workers', type=int, nargs='*', default=[0, 2, 4], help='DataLoader worker counts')
+    parser.add_argument('--data-batch-size', type=int, default=256)
+    parser.add_argument('--data-batches', type=int, default=50, help='Batches to read per loader trial')
+    parser.add_argument('--batch-sizes', type=int, nargs='*', default=[1, 32, 256])
+    parser.add_argument('--history-planes', type=int, default=0, help='History planes of the benchmarked model')
+    parser.add_argument('--liberty-planes', type=int, default=0, help='Liberty planes of the benchmarked model')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed repetitions per model measurement')
+    parser.add_argument('--positions', type=int, default=200, help='Positions for ai_move latency')
+    parser.add_argument('--quick', action='store_true', help='Small sizes for a smoke run')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help='Previous results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed relative slowdown before flagging')
+    return parser.parse_args()
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    args = parse_args()
+    if args.quick:
+        args.games, args.data_batches, args.repeat, args.positions = 10, 5, 3, 20
+        args.workers, args.batch_sizes = [0, 2], [1, 32]
+    device = torch.device(args.device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+    games = synthetic_games(args.games, args.board_size)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        if 'engine' in args.suite:
+            results += bench_engine.run(games, args.board_size)
+        if 'data' in args.suite:
+            results += bench_data.run(
+                games, args.board_size, Path(tmp), args.workers, args.data_batch_size, args.data_batches
+            )
+        if 'model' in args.suite:
+            features = FeatureSet(history=args.history_planes, liberties=args.liberty_planes)
+            results += bench_model.run(args.board_size, args.batch_sizes, device, args.repeat, features)
+        if 'inference' in args.suite:
+            results += bench_inference.run(games, args.board_size, device, args.positions)
+
+    for result in results:
+        print(f"{result.name:45s} {result.value:12.2f} {result.unit}")
+    output = Path(args.output).expanduser()
+    save_results(results, output)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, Path(args.baseline).expanduser(), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
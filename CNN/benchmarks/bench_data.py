@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import logging
+import time
+from pathlib import Path
+from typing import Iterable, List, Sequence
+
+import torch
+
+from datasets import DatasetConfig, build_dataloader
+
+from .common import BenchResult, Move, write_data_file, write_sgf_files
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _throughput(loader: Iterable, max_batches: int, warmup_batches: int = 2) -> float:
+    """Samples/s over ``max_batches`` batches, read after ``warmup_batches`` untimed ones."""
+    # worker进程启动和首个batch的延迟不计入，否则多worker反而显得更慢
+    batches = iter(loader)
+    for _ in range(warmup_batches):
+        next(batches)
+    samples = 0
+    start = time.perf_counter()
+    for batch_index, (inputs, _) in enumerate(batches):
+        samples += inputs.size(0)
+        if batch_index + 1 >= max_batches:
+            break
+    return samples / (time.perf_counter() - start)
+
+
+def run(
+    games: List[List[Move]],
+    board_size: int,
+    workdir: Path,
+    worker_counts: Sequence[int],
+    batch_size: int,
+    max_batches: int,
+) -> List[BenchResult]:
+    results = []
+    data_file = write_data_file(games, workdir / 'synthetic.data')
+    cfg = DatasetConfig(board_size=board_size, data_files=[data_file], val_ratio=0.0)
+    for workers in worker_counts:
+        loader = build_dataloader(cfg, mode='train', batch_size=batch_size, num_workers=workers)
+        rate = _throughput(loader, max_batches)
+        results.append(BenchResult(f'data.GoMoveDataset.workers{workers}', rate, 'samples/s'))
+
+    try:
+        from datasets_sgf import DatasetConfig as SgfDatasetConfig
+        from datasets_sgf import build_sgf_dataloader
+    except ImportError as exc:
+        LOGGER.warning("Skipping SgfGoMoveDataset benchmark: %s", exc)
+        return results
+    sgf_files = write_sgf_files(games, workdir / 'sgf', board_size)
+    sgf_cfg = SgfDatasetConfig(board_size=board_size, data_files=sgf_files, val_ratio=0.0)
+    for workers in worker_counts:
+        loader = build_sgf_dataloader(sgf_cfg, mode='train', batch_size=batch_size, num_workers=workers)
+        rate = _throughput(loader, max_batches)
+        results.append(BenchResult(f'data.SgfGoMoveDataset.workers{workers}', rate, 'samples/s'))
+    return results
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import time
+from typing import List
+
+from board import FeatureSet, GoGameState
+
+from .common import BenchResult, Move
+
+
+def _replay(games: List[List[Move]], board_size: int, features: FeatureSet) -> int:
+    count = 0
+    for moves in games:
+        state = GoGameState(board_size, features)
+        for color, x, y in moves:
+            state.play_move(color, (x, y))
+            count += 1
+    return count
+
+
+def _feature_time(games: List[List[Move]], board_size: int, features: FeatureSet) -> float:
+    """Total time spent in ``make_features`` over every position of ``games``."""
+    elapsed = 0.0
+    for moves in games:
+        state = GoGameState(board_size, features)
+        for color, x, y in moves:
+            # 只计make_features本身，落子不计入
+            start = time.perf_counter()
+            state.make_features(color)
+            elapsed += time.perf_counter() - start
+            state.play_move(color, (x, y))
+    return elapsed
+
+
+def run(games: List[List[Move]], board_size: int) -> List[BenchResult]:
+    results = []
+    feature_sets = {
+        'base': FeatureSet(),
+        'hist8_lib4': FeatureSet(history=8, liberties=4),
+    }
+    for label, features in feature_sets.items():
+        start = time.perf_counter()
+        moves = _replay(games, board_size, features)
+        play_elapsed = time.perf_counter() - start
+        results.append(BenchResult(f'engine.play_move.{label}', moves / play_elapsed, 'moves/s'))
+
+        feature_elapsed = _feature_time(games, board_size, features)
+        results.append(BenchResult(f'engine.make_features.{label}', moves / feature_elapsed, 'positions/s'))
+    return results
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import List
+
+import torch
+
+from board import GoGameState
+from mcts import MCTS
+from model import SimplePolicyNet
+from play import ai_move
+
+from .common import BenchResult, Move, median, percentile, time_calls
+
+
+MCTS_VISITS = 256
+
+
+def run(games: List[List[Move]], board_size: int, device: torch.device, positions: int) -> List[BenchResult]:
+    model = SimplePolicyNet(board_size=board_size).to(device)
+    model.eval()
+
+    # 取各盘不同阶段的局面，避免只测空棋盘
+    states = []
+    for moves in games:
+        state = GoGameState(board_size)
+        for turn, (color, x, y) in enumerate(moves):
+            if turn % 37 == 0:
+                states.append((state.copy(), color))
+            state.play_move(color, (x, y))
+            if len(states) >= positions:
+                break
+        if len(states) >= positions:
+            break
+
+    durations: List[float] = []
+    for state, color in states:
+        durations.extend(time_calls(lambda: ai_move(model, state, color, device, 5), repeat=1, warmup=0))
+    ms = [d * 1000.0 for d in durations]
+
+    # 每个局面新建搜索树，避免复用上一局面的访问次数
+    search_seconds = 0.0
+    for state, color in states[:4]:
+        engine = MCTS(model, device)
+        engine.set_position(state, color)
+        search_seconds += min(time_calls(lambda: engine.search(visits=MCTS_VISITS), repeat=1, warmup=0))
+    visits_per_sec = MCTS_VISITS * min(len(states), 4) / search_seconds if search_seconds else 0.0
+    return [
+        BenchResult(
+            'inference.ai_move.latency',
+            median(ms),
+            'ms',
+            higher_is_better=False,
+            extra={'p90_ms': percentile(ms, 90), 'positions': float(len(ms))},
+        ),
+        BenchResult('inference.mcts.visits_per_sec', visits_per_sec, 'visits/s'),
+    ]
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from typing import List, Optional, Sequence
+
+import torch
+import torch.nn as nn
+
+from board import FeatureSet
+from model import POLICY_HEADS, SimplePolicyNet
+
+from .common import BenchResult, median, time_calls
+
+
+def run(
+    board_size: int,
+    batch_sizes: Sequence[int],
+    device: torch.device,
+    repeat: int,
+    features: Optional[FeatureSet] = None,
+) -> List[BenchResult]:
+    features = features or FeatureSet()
+    results = []
+    criterion = nn.CrossEntropyLoss()
+    for head in POLICY_HEADS:
+        model = SimplePolicyNet(board_size=board_size, in_channels=features.num_planes, head=head).to(device)
+        results += _run_model(model, f'model.{head}', board_size, batch_sizes, criterion, device, repeat)
+    return results
+
+
+def _run_model(
+    model: SimplePolicyNet,
+    prefix: str,
+    board_size: int,
+    batch_sizes: Sequence[int],
+    criterion: nn.Module,
+    device: torch.device,
+    repeat: int,
+) -> List[BenchResult]:
+    results = []
+    # 输入平面数以模型为准，启用历史/气数平面后不再是3
+    in_channels = model.stem[0].in_channels
+    for batch_size in batch_sizes:
+        inputs = torch.randn(batch_size, in_channels, board_size, board_size, device=device)
+        targets = torch.randint(0, board_size * board_size, (batch_size,), device=device)
+
+        model.eval()
+
+        def forward() -> None:
+            with torch.no_grad():
+                model(inputs)
+
+        elapsed = median(time_calls(forward, repeat, warmup=2, device=device))
+        results.append(BenchResult(f'{prefix}.forward.bs{batch_size}', batch_size / elapsed, 'samples/s'))
+
+        model.train()
+
+        def forward_backward() -> None:
+            model.zero_grad(set_to_none=True)
+            criterion(model(inputs), targets).backward()
+
+        # BatchNorm训练模式需要batch大于1
+        if batch_size > 1:
+            elapsed = median(time_calls(forward_backward, repeat, warmup=2, device=device))
+            results.append(BenchResult(f'{prefix}.forward_backward.bs{batch_size}', batch_size / elapsed, 'samples/s'))
+    return results
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import json
+import platform
+import random
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import torch
+
+from board import GoGameState
+from profiling import synchronize
+
+
+Move = Tuple[str, int, int]  # color, x, y (0-indexed)
+
+
+@dataclass
+class BenchResult:
+    name: str
+    value: float
+    unit: str
+    higher_is_better: bool = True
+    extra: Optional[Dict[str, float]] = None
+
+
+def time_calls(
+    fn: Callable[[], None],
+    repeat: int,
+    warmup: int = 1,
+    device: Optional[torch.device] = None,
+) -> List[float]:
+    """Wall time of each of ``repeat`` calls to ``fn`` (seconds), after ``warmup`` calls."""
+    for _ in range(warmup):
+        fn()
+    if device is not None:
+        synchronize(device)
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        if device is not None:
+            synchronize(device)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def median(values: List[float]) -> float:
+    return statistics.median(values)
+
+
+def synthetic_games(num_games: int, board_size: int = 19, max_moves: int = 200, seed: int = 0) -> List[List[Move]]:
+    """Random legal games, reproducible for a given seed."""
+    rng = random.Random(seed)
+    games = []
+    for _ in range(num_games):
+        state = GoGameState(board_size)
+        moves: List[Move] = []
+        for turn in range(max_moves):
+            color = 'B' if turn % 2 == 0 else 'W'
+            # 随机尝试若干次，找不到合法点就结束这盘
+            for _ in range(20):
+                x, y = rng.randrange(board_size), rng.randrange(board_size)
+                if state.board[y, x] != 0:
+                    continue
+                try:
+                    state.play_move(color, (x, y))
+                except ValueError:
+                    continue
+                moves.append((color, x, y))
+                break
+            else:
+                break
+        games.append(moves)
+    return games
+
+
+def write_data_file(games: List[List[Move]], path: Path) -> Path:
+    """Write games in the .data training format (1-indexed coordinates)."""
+    with path.open('w', encoding='utf-8') as fh:
+        for moves in games:
+            fh.write(json.dumps([{color: [x + 1, y + 1]} for color, x, y in moves]) + '\n')
+    return path
+
+
+def write_sgf_files(games: List[List[Move]], directory: Path, board_size: int = 19) -> List[Path]:
+    directory.mkdir(parents=True, exist_ok=True)
+    letters = 'abcdefghijklmnopqrstuvwxy'
+    paths = []
+    for index, moves in enumerate(games):
+        nodes = ''.join(f';{color}[{letters[x]}{letters[y]}]' for color, x, y in moves)
+        path = directory / f'{index}.sgf'
+        path.write_text(f'(;GM[1]FF[4]SZ[{board_size}]{nodes})', encoding='utf-8')
+        paths.append(path)
+    return paths
+
+
+def environment() -> Dict[str, str]:
+    return {
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'num_threads': str(torch.get_num_threads()),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def save_results(results: List[BenchResult], path: Path) -> None:
+    payload = {
+        'environment': environment(),
+        'results': {r.name: asdict(r) for r in results},
+    }
+    path.write_text(json.dumps(payload, indent=2), encoding='utf-8')
+
+
+def compare_to_baseline(results: List[BenchResult], baseline_path: Path, tolerance: float) -> List[str]:
+    """Return a message for every result that is worse than baseline by more than ``tolerance``."""
+    baseline = json.loads(baseline_path.read_text(encoding='utf-8'))['results']
+    regressions = []
+    for result in results:
+        previous = baseline.get(result.name)
+        if previous is None or not previous['value']:
+            continue
+        ratio = result.value / previous['value']
+        change = ratio - 1.0 if result.higher_is_better else 1.0 - ratio
+        if change < -tolerance:
+            regressions.append(
+                f"{result.name}: {result.value:.3f} {result.unit} vs baseline {previous['value']:.3f} "
+                f"({change * 100:+.1f}%)"
+            )
+    return regressions
@@ -0,0 +1,221 @@
+"""Go board engine and input feature planes, free of any training or torch dependencies."""
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+Color = str  # alias for readability
+
+
+@dataclass(frozen=True)
+class FeatureSet:
+    """Input planes fed to the policy net.
+
+    Layout: black, white, side to move, then ``history`` pairs of
+    (black, white) planes for the previous positions (most recent first),
+    then ``liberties`` planes marking stones whose group has 1, 2, ...,
+    ``>= liberties`` liberties.
+    """
+
+    history: int = 0
+    liberties: int = 0
+
+    @property
+    def num_planes(self) -> int:
+        return 3 + 2 * self.history + self.liberties
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, int]]) -> 'FeatureSet':
+        # 旧checkpoint没有记录特征集，默认只有3个平面
+        if not data:
+            return cls()
+        return cls(history=int(data.get('history', 0)), liberties=int(data.get('liberties', 0)))
+
+
+class GoGameState:
+    """Minimal Go board state to rebuild positions and apply captures."""
+
+    def __init__(self, size: int, features: Optional[FeatureSet] = None) -> None:
+        if size <= 0 or size > 25:
+            raise ValueError(f"Unsupported board size: {size}")
+        self.size = size
+        self.features = features or FeatureSet()
+        self.board = np.zeros((size, size), dtype=np.int8)  # 0 empty, 1 black, -1 white
+        # 历史盘面环形缓冲区：预先分配，每步只覆盖一个槽位
+        self._history = np.zeros((self.features.history, size, size), dtype=np.int8)
+        self._history_head = 0  # next slot to overwrite
+        self._history_len = 0
+        # 每个棋子所在棋串的气数，仅在需要气数特征时增量维护
+        self._liberties = np.zeros((size, size), dtype=np.int16) if self.features.liberties else None
+
+    def copy(self) -> 'GoGameState':
+        other = GoGameState.__new__(GoGameState)
+        other.size = self.size
+        other.features = self.features
+        other.board = self.board.copy()
+        other._history = self._history.copy()
+        other._history_head = self._history_head
+        other._history_len = self._history_len
+        other._liberties = None if self._liberties is None else self._liberties.copy()
+        return other
+
+    def apply_setup(self, color: Color, coords: Sequence[Tuple[int, int]]) -> None:
+        value = 1 if color == 'B' else -1
+        for x, y in coords:
+            # 转换1-indexed坐标到0-indexed
+            if 1 <= x <= self.size and 1 <= y <= self.size:
+                self.board[y-1, x-1] = value
+        self._recompute_liberties()
+
+    def apply_empty(self, coords: Sequence[Tuple[int, int]]) -> None:
+        for x, y in coords:
+            # 转换1-indexed坐标到0-indexed
+            if 1 <= x <= self.size and 1 <= y <= self.size:
+                self.board[y-1, x-1] = 0
+        self._recompute_liberties()
+
+    def play_move(self, color: Color, coord: Tuple[int, int]) -> List[Tuple[int, int]]:
+        x, y = coord
+        if self.board[y, x] != 0:
+            raise ValueError("attempt to play on occupied point")
+        value = 1 if color == 'B' else -1
+        self.board[y, x] = value
+
+        captured_groups: List[List[Tuple[int, int]]] = []
+        survivors: List[Tuple[List[Tuple[int, int]], int]] = []
+        for nx, ny in self._neighbors(x, y):
+            if self.board[ny, nx] == -value:
+                group, liberties = self._collect_group(nx, ny)
+                if liberties == 0:
+                    captured_groups.append(group)
+                else:
+                    survivors.append((group, liberties))
+
+        # 记录所有被提子的位置
+        captured_stones = []
+        for group in captured_groups:
+            for gx, gy in group:
+                self.board[gy, gx] = 0
+                captured_stones.append((gx, gy))
+
+        own_group, liberties = self._collect_group(x, y)
+        if liberties == 0:
+            # suicide move, revert captures and raise
+            for group in captured_groups:
+                for gx, gy in group:
+                    self.board[gy, gx] = -value
+            self.board[y, x] = 0
+            raise ValueError("suicide move")
+
+        if self.features.history:
+            # 落子合法后才写入历史槽位：槽位满时里面是最旧的历史，非法落子不能覆盖它
+            # 写入的是落子前的盘面，即去掉新子、放回被提的子
+            slot = self._history[self._history_head]
+            slot[...] = self.board
+            slot[y, x] = 0
+            for gx, gy in captured_stones:
+                slot[gy, gx] = -value
+            self._history_head = (self._history_head + 1) % self.features.history
+            self._history_len = min(self._history_len + 1, self.features.history)
+        if self._liberties is not None:
+            self._update_liberties(value, own_group, liberties, survivors, captured_stones)
+        return captured_stones
+
+    def make_features(self, to_play: Color) -> np.ndarray:
+        size = self.size
+        history = self.features.history
+        planes = np.zeros((self.features.num_planes, size, size), dtype=np.float32)
+        np.equal(self.board, 1, out=planes[0])
+        np.equal(self.board, -1, out=planes[1])
+        if to_play == 'B':
+            planes[2] = 1.0
+
+        # 从最近一步开始倒序读取环形缓冲区，不足的历史保持全零
+        for i in range(self._history_len):
+            past = self._history[(self._history_head - 1 - i) % history]
+            np.equal(past, 1, out=planes[3 + 2 * i])
+            np.equal(past, -1, out=planes[4 + 2 * i])
+
+        if self._liberties is not None:
+            base = 3 + 2 * history
+            last = self.features.liberties - 1
+            for k in range(last):
+                np.equal(self._liberties, k + 1, out=planes[base + k])
+            np.greater_equal(self._liberties, last + 1, out=planes[base + last])
+        return planes
+
+    def _neighbors(self, x: int, y: int) -> Iterator[Tuple[int, int]]:
+        if x > 0:
+            yield x - 1, y
+        if x + 1 < self.size:
+            yield x + 1, y
+        if y > 0:
+            yield x, y - 1
+        if y + 1 < self.size:
+            yield x, y + 1
+
+    def _collect_group(self, x: int, y: int) -> Tuple[List[Tuple[int, int]], int]:
+        value = self.board[y, x]
+        stack = [(x, y)]
+        visited = set(stack)
+        group: List[Tuple[int, int]] = []
+        liberties = set()
+        while stack:
+            cx, cy = stack.pop()
+            group.append((cx, cy))
+            for nx, ny in self._neighbors(cx, cy):
+                v = self.board[ny, nx]
+                if v == 0:
+                    liberties.add((nx, ny))
+                elif v == value and (nx, ny) not in visited:
+                    visited.add((nx, ny))
+                    stack.append((nx, ny))
+        return group, len(liberties)
+
+    def _update_liberties(
+        self,
+        value: int,
+        own_group: List[Tuple[int, int]],
+        own_liberties: int,
+        survivors: List[Tuple[List[Tuple[int, int]], int]],
+        captured_stones: List[Tuple[int, int]],
+    ) -> None:
+        # 只刷新受这步棋影响的棋串：自己的棋串、相邻的对方棋串、被提子旁边的己方棋串
+        libs = self._liberties
+        for gx, gy in own_group:
+            libs[gy, gx] = own_liberties
+        for group, liberties in survivors:
+            for gx, gy in group:
+                libs[gy, gx] = liberties
+        if not captured_stones:
+            return
+        for cx, cy in captured_stones:
+            libs[cy, cx] = 0
+        refreshed = set(own_group)
+        for cx, cy in captured_stones:
+            for nx, ny in self._neighbors(cx, cy):
+                if self.board[ny, nx] == value and (nx, ny) not in refreshed:
+                    group, liberties = self._collect_group(nx, ny)
+                    refreshed.update(group)
+                    for gx, gy in group:
+                        libs[gy, gx] = liberties
+
+    def _recompute_liberties(self) -> None:
+        if self._liberties is None:
+            return
+        self._liberties.fill(0)
+        seen = set()
+        for y in range(self.size):
+            for x in range(self.size):
+                if self.board[y, x] == 0 or (x, y) in seen:
+                    continue
+                group, liberties = self._collect_group(x, y)
+                seen.update(group)
+                for gx, gy in group:
+                    self._liberties[gy, gx] = liberties
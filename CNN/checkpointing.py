@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+import torch
+
+from utils import save_checkpoint
+
+
+LOGGER = logging.getLogger(__name__)
+
+_EPOCH_FILE = re.compile(r'checkpoint_epoch_(\d+)\.pt$')
+
+
+def snapshot_to_cpu(value: Any) -> Any:
+    """Deep-copy every tensor in a (nested) state dict to host memory."""
+    if isinstance(value, torch.Tensor):
+        return value.detach().to('cpu', copy=True)
+    if isinstance(value, dict):
+        return {k: snapshot_to_cpu(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [snapshot_to_cpu(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(snapshot_to_cpu(v) for v in value)
+    return value
+
+
+def _replace_with_alias(source: Path, alias: Path) -> None:
+    # 优先使用硬链接（不复制数据），文件系统不支持时退回复制；最后一步原子替换
+    tmp = alias.with_name(alias.name + '.tmp')
+    if tmp.exists():
+        tmp.unlink()
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copyfile(source, tmp)
+    os.replace(tmp, alias)
+
+
+class AsyncCheckpointWriter:
+    """Serialise checkpoints on a background thread.
+
+    ``submit`` snapshots the state to CPU on the caller's thread and returns;
+    the writer then saves the first path atomically, points the remaining
+    paths (latest/best) at it and prunes old epoch files.
+    """
+
+    def __init__(self, keep_last: int = 0) -> None:
+        self.keep_last = keep_last
+        # 最多排队两个快照，磁盘跟不上时对训练形成反压而不是无限占用内存
+        self._queue: queue.Queue = queue.Queue(maxsize=2)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, state: Any, paths: Sequence[Path]) -> None:
+        self._raise_pending_error()
+        self._queue.put((snapshot_to_cpu(state), list(paths)))
+
+    def close(self) -> None:
+        """Wait for queued checkpoints to hit the disk and stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_pending_error()
+
+    def _raise_pending_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Background checkpoint write failed") from error
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            state, paths = item
+            try:
+                self._write(state, paths)
+            except Exception as exc:
+                LOGGER.exception("Failed to write checkpoint %s", paths[0])
+                self._error = exc
+
+    def _write(self, state: Any, paths: Sequence[Path]) -> None:
+        primary, *aliases = paths
+        save_checkpoint(state, primary)
+        for alias in aliases:
+            _replace_with_alias(primary, alias)
+        LOGGER.info('Checkpoint saved to %s', ', '.join(str(p) for p in paths))
+        if self.keep_last > 0:
+            self._prune(primary.parent)
+
+    def _prune(self, directory: Path) -> None:
+        epoch_files = []
+        for path in directory.glob('checkpoint_epoch_*.pt'):
+            match = _EPOCH_FILE.search(path.name)
+            if match:
+                epoch_files.append((int(match.group(1)), path))
+        epoch_files.sort()
+        for _, path in epoch_files[:-self.keep_last]:
+            path.unlink()
+            LOGGER.info('Removed old checkpoint %s', path)
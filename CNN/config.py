@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 
 @dataclass
@@ -12,6 +12,7 @@ class TrainingConfig:
     output_dir: Path = Path('~/data/go_AI_runs/simple_cnn').expanduser()
     batch_size: int = 256
     num_workers: int = 4
+    prefetch_factor: int = 2  # batches each DataLoader worker keeps in flight
     epochs: int = 5
     steps_per_epoch: int = 4000
     eval_steps: int = 800
@@ -21,6 +22,27 @@ class TrainingConfig:
     seed: int = 42
     device: str = 'cuda' if __import__('torch').cuda.is_available() else 'cpu'
     save_every: int = 1
+    keep_last: int = 0  # number of checkpoint_epoch_*.pt files to keep (0 keeps all)
+    best_metric: str = 'acc1'  # 'acc1' (higher is better) or 'loss' (lower is better)
+    prefetch_batches: int = 2  # batches staged on the device ahead of compute (0 disables)
+    log_every: int = 50  # steps between progress-bar metric refreshes (each one syncs the device); 0 = epoch end only
+    profile: bool = False  # time each step phase (syncs the device) and append to profile.jsonl
+    profile_trace_steps: int = 0  # capture this many steps of the first epoch with torch.profiler
+    profile_trace_wait: int = 5  # steps to skip before the trace window starts
+    history_planes: int = 0  # number of previous positions fed as extra planes
+    liberty_planes: int = 0  # liberty-count planes (1, 2, ..., >=N liberties)
+    policy_head: str = 'fc'  # 'fc' (dense, board-size specific) or 'conv' (1x1 conv + pass logit)
+    channels: int = 64  # width of the residual tower
+    num_blocks: int = 6  # number of residual blocks
+    block_channels: Optional[List[int]] = None  # per-block inner widths of a pruned network
+    teacher_checkpoint: Optional[Path] = None  # enables distillation from this checkpoint
+    distill_alpha: float = 0.5  # weight of the KL term; the hard-label loss gets 1 - alpha
+    distill_temperature: float = 2.0  # softmax temperature applied to both teacher and student
+    amp: bool = False  # mixed precision: bf16 autocast on CPU, fp16 + GradScaler on CUDA
+    compile_model: bool = False  # run forward/backward through torch.compile
+    channels_last: bool = False  # NHWC memory format for weights and input batches
+    distributed: bool = False  # DistributedDataParallel, one process per rank via torchrun
+    dist_backend: Optional[str] = None  # defaults to nccl on CUDA, gloo otherwise
 
     def resolve_data_paths(self) -> List[Path]:
         if self.data_paths is None:
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
 
@@ -9,97 +9,7 @@ import numpy as np
 import torch
 from torch.utils.data import IterableDataset
 
-
-Color = str  # alias for readability
-
-
-class GoGameState:
-    """Minimal Go board state to rebuild positions and apply captures."""
-
-    def __init__(self, size: int) -> None:
-        if size <= 0 or size > 25:
-            raise ValueError(f"Unsupported board size: {size}")
-        self.size = size
-        self.board = np.zeros((size, size), dtype=np.int8)  # 0 empty, 1 black, -1 white
-
-    def apply_setup(self, color: Color, coords: Sequence[Tuple[int, int]]) -> None:
-        value = 1 if color == 'B' else -1
-        for x, y in coords:
-            # 转换1-indexed坐标到0-indexed
-            if 1 <= x <= self.size and 1 <= y <= self.size:
-                self.board[y-1, x-1] = value
-
-    def apply_empty(self, coords: Sequence[Tuple[int, int]]) -> None:
-        for x, y in coords:
-            # 转换1-indexed坐标到0-indexed
-            if 1 <= x <= self.size and 1 <= y <= self.size:
-                self.board[y-1, x-1] = 0
-
-    def play_move(self, color: Color, coord: Tuple[int, int]) -> List[Tuple[int, int]]:
-        x, y = coord
-        if self.board[y, x] != 0:
-            raise ValueError("attempt to play on occupied point")
-        value = 1 if color == 'B' else -1
-        self.board[y, x] = value
-
-        captured_groups: List[List[Tuple[int, int]]] = []
-        for nx, ny in self._neighbors(x, y):
-            if self.board[ny, nx] == -value:
-                group, liberties = self._collect_group(nx, ny)
-                if liberties == 0:
-                    captured_groups.append(group)
-
-        # 记录所有被提子的位置
-        captured_stones = []
-        for group in captured_groups:
-            for gx, gy in group:
-                self.board[gy, gx] = 0
-                captured_stones.append((gx, gy))
-
-        _, liberties = self._collect_group(x, y)
-        if liberties == 0:
-            # suicide move, revert captures and raise
-            for group in captured_groups:
-                for gx, gy in group:
-                    self.board[gy, gx] = -value
-            self.board[y, x] = 0
-            raise ValueError("suicide move")
-
-        return captured_stones
-
-    def make_features(self, to_play: Color) -> np.ndarray:
-        black = (self.board == 1).astype(np.float32)
-        white = (self.board == -1).astype(np.float32)
-        to_play_plane = np.full_like(black, 1.0 if to_play == 'B' else 0.0)
-        return np.stack([black, white, to_play_plane], axis=0)
-
-    def _neighbors(self, x: int, y: int) -> Iterator[Tuple[int, int]]:
-        if x > 0:
-            yield x - 1, y
-        if x + 1 < self.size:
-            yield x + 1, y
-        if y > 0:
-            yield x, y - 1
-        if y + 1 < self.size:
-            yield x, y + 1
-
-    def _collect_group(self, x: int, y: int) -> Tuple[List[Tuple[int, int]], int]:
-        value = self.board[y, x]
-        stack = [(x, y)]
-        visited = set(stack)
-        group: List[Tuple[int, int]] = []
-        liberties = set()
-        while stack:
-            cx, cy = stack.pop()
-            group.append((cx, cy))
-            for nx, ny in self._neighbors(cx, cy):
-                v = self.board[ny, nx]
-                if v == 0:
-                    liberties.add((nx, ny))
-                elif v == value and (nx, ny) not in visited:
-                    visited.add((nx, ny))
-                    stack.append((nx, ny))
-        return group, len(liberties)
+from board import Color, FeatureSet, GoGameState  # noqa: F401  (re-exported for existing imports)
 
 
 def sgf_coord_to_xy(coord: Sequence[int]) -> Tuple[int, int]:
@@ -113,6 +23,9 @@ class DatasetConfig:
     data_files: Sequence[Path]
     val_ratio: float = 0.1
     limit_games: Optional[int] = None  # optional cap for debugging
+    features: FeatureSet = field(default_factory=FeatureSet)
+    rank: int = 0  # distributed rank; games are sharded over ranks x workers
+    world_size: int = 1
 
 
 class GoMoveDataset(IterableDataset):
@@ -136,12 +49,15 @@ class GoMoveDataset(IterableDataset):
         worker_info = torch.utils.data.get_worker_info()
         worker_id = worker_info.id if worker_info else 0
         num_workers = worker_info.num_workers if worker_info else 1
+        # 先按进程(rank)再按DataLoader worker切分，每个分片互不重叠
+        shard_id = self.cfg.rank * num_workers + worker_id
+        num_shards = self.cfg.world_size * num_workers
 
         games_seen = 0
         for path in self.cfg.data_files:
             with path.open('r', encoding='utf-8') as fh:
                 for game_index, line in enumerate(fh):
-                    if game_index % num_workers != worker_id:
+                    if game_index % num_shards != shard_id:
                         continue
                     if self.cfg.limit_games is not None and games_seen >= self.cfg.limit_games:
                         return
@@ -152,7 +68,7 @@ class GoMoveDataset(IterableDataset):
                     if not line:
                         continue
                     moves = json.loads(line)
-                    state = GoGameState(self.board_size)
+                    state = GoGameState(self.board_size, self.cfg.features)
                     try:
                         yield from self._game_to_samples(state, moves)
                     except ValueError:
@@ -175,6 +91,7 @@ class GoMoveDataset(IterableDataset):
         for i, move in enumerate(moves):
             if not isinstance(move, dict) or len(move) != 1:
                 continue
+            # 自对弈数据中的pass记为{"B": []}，不生成样本，下面的坐标检查会跳过它
 
             # 提取棋子颜色和位置
             color = list(move.keys())[0]
@@ -207,11 +124,17 @@ def build_dataloader(
     mode: str,
     batch_size: int,
     num_workers: int,
+    prefetch_factor: Optional[int] = None,
 ) -> torch.utils.data.DataLoader:
     dataset = GoMoveDataset(cfg, mode)
+    loader_kwargs = {}
+    # prefetch_factor只在有worker进程时有效
+    if num_workers > 0 and prefetch_factor is not None:
+        loader_kwargs['prefetch_factor'] = prefetch_factor
     return torch.utils.data.DataLoader(
         dataset,
         batch_size=batch_size,
         num_workers=num_workers,
         pin_memory=True,
+        **loader_kwargs,
     )
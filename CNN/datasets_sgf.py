@@ -4,12 +4,12 @@ import numpy as np
 import torch
 from torch.utils.data import IterableDataset
 from sgfmill import sgf
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
 
 # 重用GoGameState类
-from datasets import GoGameState
+from board import FeatureSet, GoGameState
 
 
 Color = str  # alias for readability
@@ -21,6 +21,9 @@ class DatasetConfig:
     data_files: Sequence[Path]
     val_ratio: float = 0.1
     limit_games: Optional[int] = None  # optional cap for debugging
+    features: FeatureSet = field(default_factory=FeatureSet)
+    rank: int = 0  # distributed rank; games are sharded over ranks x workers
+    world_size: int = 1
 
 
 class SgfGoMoveDataset(IterableDataset):
@@ -44,10 +47,13 @@ class SgfGoMoveDataset(IterableDataset):
         worker_info = torch.utils.data.get_worker_info()
         worker_id = worker_info.id if worker_info else 0
         num_workers = worker_info.num_workers if worker_info else 1
+        # 先按进程(rank)再按DataLoader worker切分，每个分片互不重叠
+        shard_id = self.cfg.rank * num_workers + worker_id
+        num_shards = self.cfg.world_size * num_workers
 
         games_seen = 0
         for file_index, sgf_path in enumerate(self.cfg.data_files):
-            if file_index % num_workers != worker_id:
+            if file_index % num_shards != shard_id:
                 continue
             if self.cfg.limit_games is not None and games_seen >= self.cfg.limit_games:
                 return
@@ -66,7 +72,7 @@ class SgfGoMoveDataset(IterableDataset):
                 main_sequence = game.get_main_sequence()
 
                 # 从空棋盘开始重建游戏状态
-                state = GoGameState(self.board_size)
+                state = GoGameState(self.board_size, self.cfg.features)
 
                 # 跳过根节点，处理每一步棋
                 for i, node in enumerate(main_sequence[1:], 1):  # 跳过根节点
@@ -106,11 +112,17 @@ def build_sgf_dataloader(
     mode: str,
     batch_size: int,
     num_workers: int,
+    prefetch_factor: Optional[int] = None,
 ) -> torch.utils.data.DataLoader:
     dataset = SgfGoMoveDataset(cfg, mode)
+    loader_kwargs = {}
+    # prefetch_factor只在有worker进程时有效
+    if num_workers > 0 and prefetch_factor is not None:
+        loader_kwargs['prefetch_factor'] = prefetch_factor
     return torch.utils.data.DataLoader(
         dataset,
         batch_size=batch_size,
         num_workers=num_workers,
         pin_memory=True,
+        **loader_kwargs,
     )
\ No newline at end of file
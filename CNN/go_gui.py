@@ -10,16 +10,18 @@ import logging
 import tkinter as tk
 from tkinter import messagebox, ttk
 from pathlib import Path
-from typing import Optional, Tuple, List
+from typing import Dict, List, Optional, Tuple
+import queue
 import threading
 import time
 
 import numpy as np
 import torch
 
-from model import SimplePolicyNet
-from datasets import GoGameState
-from utils import load_checkpoint
+from board import FeatureSet, GoGameState
+from mcts import MCTS, ko_point
+from runtime import EvalCache, Policy, RemotePolicy, load_policy, policy_probs
+from scoring import area_score, format_result, game_over
 
 LOGGER = logging.getLogger(__name__)
 
@@ -47,23 +49,31 @@ class GoBoardCanvas(tk.Canvas):
         self.captured_stones = []  # 被提子的位置（用于显示效果）
         self.capture_animation_timer = None
 
+        # 图元分三层：grid(网格/星位/坐标) < stone(棋子) < overlay(最后一手/提子标记)
+        # 图元只创建一次，之后只修改有变化的交叉点
+        self._stone_items: Dict[Tuple[int, int], int] = {}
+        self._drawn: Dict[Tuple[int, int], int] = {}  # 当前画布上显示的棋子 {(x,y): color}
+        self._capture_marks: List[Tuple[int, int]] = []
+
         self.draw_board()
+        self._create_stone_items()
+        self._last_move_item = self.create_oval(0, 0, 0, 0, fill='red', outline='red', state='hidden', tags='overlay')
         self.bind('<Button-1>', self.on_click)
         self.bind('<Motion>', self.on_mouse_move)
 
     def draw_board(self):
-        """绘制棋盘"""
-        self.delete("all")
+        """绘制棋盘（网格层，只在创建时绘制一次）"""
+        self.delete("grid")
 
         # 绘制网格线
         offset = self.cell_size
         for i in range(self.size):
             # 垂直线
             x = offset + i * self.cell_size
-            self.create_line(x, offset, x, offset + self.board_size, width=1, fill='black')
+            self.create_line(x, offset, x, offset + self.board_size, width=1, fill='black', tags='grid')
             # 水平线
             y = offset + i * self.cell_size
-            self.create_line(offset, y, offset + self.board_size, y, width=1, fill='black')
+            self.create_line(offset, y, offset + self.board_size, y, width=1, fill='black', tags='grid')
 
         # 绘制星位点
         star_points = []
@@ -77,47 +87,64 @@ class GoBoardCanvas(tk.Canvas):
         for x, y in star_points:
             px = offset + x * self.cell_size
             py = offset + y * self.cell_size
-            self.create_oval(px-3, py-3, px+3, py+3, fill='black', outline='black')
+            self.create_oval(px-3, py-3, px+3, py+3, fill='black', outline='black', tags='grid')
 
         # 绘制坐标标签
         for i in range(self.size):
             # 横坐标
             x = offset + i * self.cell_size
-            self.create_text(x, offset//2, text=str(i+1), font=('Arial', 8))
-            self.create_text(x, offset + self.board_size + offset//2, text=str(i+1), font=('Arial', 8))
+            self.create_text(x, offset//2, text=str(i+1), font=('Arial', 8), tags='grid')
+            self.create_text(x, offset + self.board_size + offset//2, text=str(i+1), font=('Arial', 8), tags='grid')
             # 纵坐标
             y = offset + i * self.cell_size
-            self.create_text(offset//2, y, text=str(self.size-i), font=('Arial', 8))
-            self.create_text(offset + self.board_size + offset//2, y, text=str(self.size-i), font=('Arial', 8))
+            self.create_text(offset//2, y, text=str(self.size-i), font=('Arial', 8), tags='grid')
+            self.create_text(offset + self.board_size + offset//2, y, text=str(self.size-i), font=('Arial', 8), tags='grid')
+        self.tag_lower('grid')
+
+    def _create_stone_items(self):
+        """为每个交叉点预先创建一个隐藏的棋子图元"""
+        radius = self.cell_size // 3
+        for y in range(self.size):
+            for x in range(self.size):
+                px, py = self.coord_to_pixel(x, y)
+                self._stone_items[(x, y)] = self.create_oval(
+                    px - radius, py - radius, px + radius, py + radius,
+                    width=2, state='hidden', tags='stone'
+                )
 
     def redraw(self):
-        """重新绘制棋盘和棋子"""
-        self.draw_board()
-
-        # 绘制被提子的位置（红色X标记）
-        for x, y in self.captured_stones:
-            px, py = self.coord_to_pixel(x, y)
-            # 绘制红色X标记
+        """把画布同步到 stones / last_move / captured_stones，只更新有变化的图元"""
+        # 棋子：隐藏被移除的，修改新增或变色的
+        for point in self._drawn.keys() - self.stones.keys():
+            self.itemconfigure(self._stone_items[point], state='hidden')
+        for point, color in self.stones.items():
+            if self._drawn.get(point) != color:
+                self.itemconfigure(
+                    self._stone_items[point],
+                    fill='black' if color == 1 else 'white',
+                    outline='white' if color == 1 else 'black',
+                    state='normal',
+                )
+        self._drawn = dict(self.stones)
+
+        # 被提子的位置（红色X标记），仅在标记集合变化时重建
+        if self.captured_stones != self._capture_marks:
+            self.delete('capture')
             size = self.cell_size // 4
-            self.create_line(px-size, py-size, px+size, py+size, fill='red', width=3)
-            self.create_line(px-size, py+size, px+size, py-size, fill='red', width=3)
-
-        # 绘制棋子
-        for (x, y), color in self.stones.items():
-            px, py = self.coord_to_pixel(x, y)
-            stone_color = 'black' if color == 1 else 'white'
-            outline_color = 'white' if color == 1 else 'black'
-
-            self.create_oval(
-                px - self.cell_size//3, py - self.cell_size//3,
-                px + self.cell_size//3, py + self.cell_size//3,
-                fill=stone_color, outline=outline_color, width=2
-            )
+            for x, y in self.captured_stones:
+                px, py = self.coord_to_pixel(x, y)
+                self.create_line(px-size, py-size, px+size, py+size, fill='red', width=3, tags=('overlay', 'capture'))
+                self.create_line(px-size, py+size, px+size, py-size, fill='red', width=3, tags=('overlay', 'capture'))
+            self._capture_marks = list(self.captured_stones)
 
         # 标记最后一步棋
         if self.last_move:
             px, py = self.coord_to_pixel(*self.last_move)
-            self.create_oval(px-4, py-4, px+4, py+4, fill='red', outline='red')
+            self.coords(self._last_move_item, px-4, py-4, px+4, py+4)
+            self.itemconfigure(self._last_move_item, state='normal')
+        else:
+            self.itemconfigure(self._last_move_item, state='hidden')
+        self.tag_raise('overlay')
 
     def coord_to_pixel(self, x: int, y: int) -> Tuple[int, int]:
         """棋盘坐标转换为像素坐标"""
@@ -180,7 +207,23 @@ class GoBoardCanvas(tk.Canvas):
 class GoGameGUI:
     """围棋游戏GUI主类"""
 
-    def __init__(self, checkpoint_path: str, board_size: int = 19, human_color: str = 'B'):
+    POLL_MS = 50  # 主线程轮询AI结果的间隔
+
+    def __init__(
+        self,
+        checkpoint_path: Optional[str],
+        board_size: int = 19,
+        human_color: str = 'B',
+        channels_last: bool = False,
+        compile_model: bool = False,
+        server: Optional[str] = None,
+        cache_size: int = 50000,
+        cache_symmetries: bool = False,
+        komi: float = 7.5,
+        mcts_visits: int = 0,
+        mcts_seconds: Optional[float] = None,
+        mcts_threads: int = 1,
+    ):
         self.root = tk.Tk()
         self.root.title("围棋AI对弈")
         self.root.resizable(False, False)
@@ -192,13 +235,36 @@ class GoGameGUI:
         self.current_player = 'B'
         self.game_active = True
         self.move_count = 0
+        self.passes = 0  # 连续pass次数
+        self.ko: Optional[Tuple[int, int]] = None  # 当前一方不能立即提回的劫
+        self.komi = komi
+        self.result: Optional[str] = None
 
         # 加载AI模型
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = self._load_model(checkpoint_path)
+        if server:
+            self.model, self.features = self._connect_server(server)
+        else:
+            self.model, self.features = self._load_model(checkpoint_path, channels_last, compile_model)
+
+        # 同一局面(如悔棋、重新开始后)不再重复调用模型
+        self.cache = EvalCache(cache_size, symmetries=cache_symmetries) if cache_size > 0 else None
+
+        # 可选的树搜索：更强但每步可能需要数秒，因此AI在后台线程思考
+        self.mcts_visits = mcts_visits
+        self.mcts_seconds = mcts_seconds
+        self.mcts_threads = mcts_threads
+        self.engine = self._make_engine()
+
+        # AI工作线程状态；重新开始时递增generation，旧线程的结果被丢弃
+        self._ai_results: queue.Queue = queue.Queue()
+        self._ai_thread: Optional[threading.Thread] = None
+        self._ai_cancel: Optional[threading.Event] = None
+        self._ai_generation = 0
+        self._ai_started = 0.0
 
         # 游戏状态
-        self.game_state = GoGameState(board_size)
+        self.game_state = GoGameState(board_size, self.features)
 
         # 创建UI组件
         self._create_widgets()
@@ -207,31 +273,52 @@ class GoGameGUI:
         if self.current_player == self.ai_color:
             self.root.after(1000, self._ai_move)
 
-    def _load_model(self, checkpoint_path: str) -> SimplePolicyNet:
-        """加载AI模型"""
+    def _load_model(
+        self,
+        checkpoint_path: str,
+        channels_last: bool = False,
+        compile_model: bool = False,
+    ) -> Tuple[torch.nn.Module, FeatureSet]:
+        """加载AI模型及其输入特征集"""
         try:
             checkpoint_path = Path(checkpoint_path).expanduser()
             if not checkpoint_path.exists():
                 raise FileNotFoundError(f"找不到模型文件: {checkpoint_path}")
 
-            model = SimplePolicyNet(board_size=self.board_size)
-            state_dict = load_checkpoint(checkpoint_path, self.device)
-
-            if 'model' in state_dict:
-                model.load_state_dict(state_dict['model'])
-            else:
-                model.load_state_dict(state_dict)
-
-            model.to(self.device)
-            model.eval()
+            model, features = load_policy(
+                checkpoint_path,
+                self.board_size,
+                self.device,
+                channels_last=channels_last,
+                compile_model=compile_model,
+            )
 
             LOGGER.info(f"成功加载模型: {checkpoint_path}")
-            return model
+            return model, features
 
         except Exception as e:
             messagebox.showerror("错误", f"加载模型失败: {e}")
             raise
 
+    def _make_engine(self) -> Optional[MCTS]:
+        """按设置创建搜索引擎，未启用搜索时返回None"""
+        if self.mcts_visits <= 0 and not self.mcts_seconds:
+            return None
+        return MCTS(self.model, self.device, komi=self.komi, threads=self.mcts_threads, cache=self.cache)
+
+    def _connect_server(self, address: str) -> Tuple[Policy, FeatureSet]:
+        """连接推理服务，使用服务端加载的模型"""
+        try:
+            model = RemotePolicy(address)
+            if model.board_size != self.board_size:
+                raise ValueError(f"推理服务的棋盘大小为 {model.board_size}，当前为 {self.board_size}")
+            LOGGER.info(f"已连接推理服务: {address}")
+            return model, model.features
+
+        except Exception as e:
+            messagebox.showerror("错误", f"连接推理服务失败: {e}")
+            raise
+
     def _create_widgets(self):
         """创建UI组件"""
         # 主框架
@@ -251,6 +338,12 @@ class GoGameGUI:
         self.status_label = ttk.Label(info_frame, text="", font=('Arial', 12, 'bold'))
         self.status_label.grid(row=0, column=0, columnspan=3, pady=5)
 
+        # AI思考进度
+        self.progress_label = ttk.Label(info_frame, text="")
+        self.progress_label.grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=2)
+        self.progress_bar = ttk.Progressbar(info_frame, mode='indeterminate', length=160)
+        self.progress_bar.grid(row=2, column=2, sticky=tk.E, pady=2)
+
         # 控制按钮
         control_frame = ttk.Frame(info_frame)
         control_frame.grid(row=1, column=0, columnspan=3, pady=10)
@@ -265,7 +358,8 @@ class GoGameGUI:
     def _update_status(self):
         """更新状态显示"""
         if not self.game_active:
-            self.status_label.config(text="游戏结束")
+            text = "游戏结束" if self.result is None else f"游戏结束: {self.result}"
+            self.status_label.config(text=text)
             return
 
         current_color_name = "黑棋" if self.current_player == 'B' else "白棋"
@@ -283,14 +377,19 @@ class GoGameGUI:
             if (x, y) in self.board_canvas.stones:
                 messagebox.showwarning("警告", "此位置已有棋子")
                 return
+            if self.ko == (x, y):
+                messagebox.showwarning("警告", "劫争中不能立即提回")
+                return
 
             # 尝试下棋
             captured_stones = self.game_state.play_move(self.current_player, (x, y))
             self.board_canvas.add_stone(x, y, 1 if self.current_player == 'B' else -1, captured_stones)
+            self.passes = 0
+            self.ko = ko_point(self.game_state, x, y, captured_stones)
 
             # 切换玩家
-            self._switch_player()
             self.move_count += 1
+            self._switch_player()
 
             # AI回应
             if self.game_active and self.current_player == self.ai_color:
@@ -304,47 +403,152 @@ class GoGameGUI:
         if not self.game_active or self.current_player != self.human_color:
             return
 
-        self._switch_player()
+        self.passes += 1
+        self.ko = None
         self.move_count += 1
+        self._switch_player()
 
         if self.game_active and self.current_player == self.ai_color:
             self.root.after(500, self._ai_move)
 
     def _ai_move(self):
-        """AI下棋"""
-        if not self.game_active or self.current_player != self.ai_color:
+        """在后台线程启动AI思考，主线程通过after()轮询结果"""
+        if not self.game_active or self.current_player != self.ai_color or self._ai_thread is not None:
             return
 
+        self._ai_generation += 1
+        self._ai_cancel = threading.Event()
+        self._ai_started = time.perf_counter()
+        # 工作线程使用局面副本，不接触Tk对象和self.game_state
+        self._ai_thread = threading.Thread(
+            target=self._ai_worker,
+            args=(
+                self._ai_generation,
+                self.game_state.copy(),
+                self.current_player,
+                self.passes,
+                self.ko,
+                self.engine,
+                self._ai_cancel,
+            ),
+            name='ai-move',
+            daemon=True,
+        )
+        self._ai_thread.start()
+        self.progress_bar.start(20)
+        self.root.after(self.POLL_MS, self._poll_ai, self._ai_generation)
+
+    def _ai_worker(
+        self,
+        generation: int,
+        state: GoGameState,
+        color: str,
+        passes: int,
+        ko: Optional[Tuple[int, int]],
+        engine: Optional[MCTS],
+        cancel: threading.Event,
+    ):
+        """工作线程：计算AI落子并放入结果队列"""
         try:
-            # 获取AI落子
-            coord, _ = self._get_ai_move()
+            coord, _ = self._get_ai_move(state, color, engine, cancel, passes, ko)
+            self._ai_results.put((generation, coord, None))
+        except Exception as e:
+            self._ai_results.put((generation, None, e))
+
+    def _poll_ai(self, generation: int):
+        """主线程轮询AI结果，未完成时刷新思考进度"""
+        if generation != self._ai_generation:
+            return  # 思考已被取消
+
+        while True:
+            try:
+                result_generation, coord, error = self._ai_results.get_nowait()
+            except queue.Empty:
+                self._show_progress()
+                self.root.after(self.POLL_MS, self._poll_ai, generation)
+                return
+            if result_generation == generation:
+                break  # 更早的结果来自已取消的思考，直接丢弃
+
+        self._ai_thread = None
+        self._ai_cancel = None
+        self._hide_progress()
+        if error is not None:
+            messagebox.showerror("错误", f"AI下棋出错: {error}")
+            self.game_active = False
+            self._update_status()
+            return
 
+        try:
             # 执行AI落子
             if coord is None:
                 # AI选择Pass
-                pass
+                self.passes += 1
+                self.ko = None
             else:
                 x, y = coord
                 captured_stones = self.game_state.play_move(self.current_player, coord)
                 self.board_canvas.add_stone(x, y, 1 if self.current_player == 'B' else -1, captured_stones)
+                self.passes = 0
+                self.ko = ko_point(self.game_state, x, y, captured_stones)
 
             # 切换玩家
-            self._switch_player()
             self.move_count += 1
+            self._switch_player()
 
         except Exception as e:
             messagebox.showerror("错误", f"AI下棋出错: {e}")
             self.game_active = False
             self._update_status()
 
-    def _get_ai_move(self) -> Tuple[Optional[Tuple[int, int]], List[Tuple[int, int, float]]]:
-        """获取AI推荐落子位置"""
-        features = self.game_state.make_features(self.current_player)
-        tensor = torch.from_numpy(features).unsqueeze(0).to(self.device)
-
-        with torch.no_grad():
-            logits = self.model(tensor)
-            probs = torch.softmax(logits, dim=1).cpu().numpy()[0]
+    def _show_progress(self):
+        """显示AI已思考的时间和搜索次数"""
+        text = f"AI 思考中... {time.perf_counter() - self._ai_started:.1f}s"
+        root = self.engine.root if self.engine is not None else None
+        if root is not None:
+            text += f"，已搜索 {root.n} 次"
+        self.progress_label.config(text=text)
+
+    def _hide_progress(self):
+        self.progress_bar.stop()
+        self.progress_label.config(text="")
+
+    def _cancel_ai(self):
+        """取消正在进行的AI思考（重新开始对局时）"""
+        if self._ai_thread is None:
+            return
+        self._ai_cancel.set()
+        self._ai_generation += 1
+        self._ai_thread = None
+        self._ai_cancel = None
+        self._hide_progress()
+        if self.engine is not None:
+            # 旧线程可能仍在退出途中，新对局换一个搜索引擎，避免共用同一棵树
+            self.engine = self._make_engine()
+
+    def _get_ai_move(
+        self,
+        state: GoGameState,
+        color: str,
+        engine: Optional[MCTS] = None,
+        cancel: Optional[threading.Event] = None,
+        passes: int = 0,
+        ko: Optional[Tuple[int, int]] = None,
+    ) -> Tuple[Optional[Tuple[int, int]], List[Tuple[int, int, float]]]:
+        """获取AI推荐落子位置（在工作线程中调用）"""
+        if engine is not None:
+            # GoGameState.play_move不检查劫，禁止提回的点要交给搜索
+            engine.set_position(state, color, ko, passes)
+            coord = engine.search(visits=self.mcts_visits or None, seconds=self.mcts_seconds, stop=cancel)
+            total = max(engine.root.n, 1)
+            suggestions = [
+                (move[0] + 1, move[1] + 1, visits / total)
+                for move, visits, _, _ in engine.top_moves(5)
+                if move is not None
+            ]
+            return coord, suggestions
+
+        probs = policy_probs(self.model, state, color, self.device, self.cache)
 
         # 按概率排序
         order = np.argsort(probs)[::-1]
@@ -352,10 +556,15 @@ class GoGameGUI:
         best_move = None
 
         for idx in order:
+            if idx >= self.board_size * self.board_size:
+                # 卷积策略头的pass输出：还没找到合法落子时选择pass
+                if best_move is None:
+                    break
+                continue
             y, x = divmod(idx, self.board_size)  # 注意这里的坐标转换
 
             # 跳过已占用的位置
-            if self.game_state.board[y, x] != 0:
+            if state.board[y, x] != 0:
                 continue
 
             prob = float(probs[idx])
@@ -364,9 +573,8 @@ class GoGameGUI:
             # 验证落子合法性
             if best_move is None:
                 try:
-                    temp_state = GoGameState(self.board_size)
-                    temp_state.board = self.game_state.board.copy()
-                    temp_state.play_move(self.current_player, (x, y))
+                    temp_state = state.copy()
+                    temp_state.play_move(color, (x, y))
                     best_move = (x, y)
                 except ValueError:
                     continue  # 非法位置，尝试下一个
@@ -378,14 +586,22 @@ class GoGameGUI:
         self.current_player = 'W' if self.current_player == 'B' else 'B'
         self._update_status()
 
-        # 检查游戏是否结束
-        if self.move_count >= self.board_size * self.board_size:
-            self.game_active = False
-            self._update_status()
+        # 检查游戏是否结束：连续两次pass、双方只剩自己的眼可下，或达到步数上限
+        if game_over(self.game_state.board, self.passes) or self.move_count >= 2 * self.board_size * self.board_size:
+            self._end_game()
+
+    def _end_game(self):
+        """按数子法计分并结束对局"""
+        score = area_score(self.game_state.board, self.komi)
+        self.result = format_result(score)
+        self.game_active = False
+        self._update_status()
+        messagebox.showinfo("对局结束", f"数子结果 (贴目 {self.komi:g}): {self.result}")
 
     def _restart_game(self):
         """重新开始游戏"""
-        self.game_state = GoGameState(self.board_size)
+        self._cancel_ai()
+        self.game_state = GoGameState(self.board_size, self.features)
         self.board_canvas.stones = {}
         self.board_canvas.last_move = None
         self.board_canvas.captured_stones = []
@@ -396,6 +612,9 @@ class GoGameGUI:
         self.current_player = 'B'
         self.game_active = True
         self.move_count = 0
+        self.passes = 0
+        self.ko = None
+        self.result = None
         self._update_status()
 
         # 如果AI先手，立即下棋
@@ -410,9 +629,19 @@ class GoGameGUI:
 def parse_args() -> argparse.Namespace:
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description="围棋GUI对弈程序")
-    parser.add_argument("--checkpoint", required=True, help="模型检查点文件路径")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--checkpoint", help="模型检查点文件路径")
+    source.add_argument("--server", help="使用推理服务 (unix:/path.sock 或 host:port)")
     parser.add_argument("--board-size", type=int, default=19, choices=[9, 13, 19], help="棋盘大小")
     parser.add_argument("--human-color", choices=["B", "W", "black", "white"], default="B", help="人类玩家颜色")
+    parser.add_argument("--komi", type=float, default=7.5, help="贴目")
+    parser.add_argument("--mcts-visits", type=int, default=0, help="每步MCTS搜索次数 (0为直接使用策略网络)")
+    parser.add_argument("--mcts-seconds", type=float, default=None, help="每步MCTS搜索时间 (秒)")
+    parser.add_argument("--mcts-threads", type=int, default=1, help="共享同一棵搜索树的线程数")
+    parser.add_argument("--cache-size", type=int, default=50000, help="评估缓存保存的局面数 (0为关闭)")
+    parser.add_argument("--cache-symmetries", action="store_true", help="8个对称局面共用缓存项")
+    parser.add_argument("--compile", action="store_true", help="使用torch.compile编译模型")
+    parser.add_argument("--channels-last", action="store_true", help="使用channels_last内存布局")
     return parser.parse_args()
 
 
@@ -426,7 +655,16 @@ def main():
         app = GoGameGUI(
             checkpoint_path=args.checkpoint,
             board_size=args.board_size,
-            human_color=args.human_color
+            human_color=args.human_color,
+            channels_last=args.channels_last,
+            compile_model=args.compile,
+            server=args.server,
+            cache_size=args.cache_size,
+            cache_symmetries=args.cache_symmetries,
+            komi=args.komi,
+            mcts_visits=args.mcts_visits,
+            mcts_seconds=args.mcts_seconds,
+            mcts_threads=args.mcts_threads,
         )
         app.run()
 
@@ -0,0 +1,407 @@
+"""GTP (Go Text Protocol) engine around the policy network and MCTS.
+
+The model is loaded once; ``genmove`` searches with a per-move time budget
+derived from ``time_settings`` / ``time_left``. After each ``genmove`` the
+engine ponders on the opponent's turn until the next command arrives, and
+the tree is reused when the opponent's move was among those explored.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import torch
+
+from board import GoGameState
+from mcts import MCTS, ko_point
+from runtime import EvalCache, Policy, RemotePolicy, load_policy
+
+LOGGER = logging.getLogger(__name__)
+
+GTP_COLUMNS = 'ABCDEFGHJKLMNOPQRSTUVWXYZ'  # GTP跳过字母I
+
+
+class GTPError(Exception):
+    """Reported to the controller as a ``?`` failure response."""
+
+
+def parse_color(token: str) -> str:
+    token = token.lower()
+    if token in ('b', 'black'):
+        return 'B'
+    if token in ('w', 'white'):
+        return 'W'
+    raise GTPError('invalid color')
+
+
+def parse_vertex(token: str, size: int) -> Optional[Tuple[int, int]]:
+    """GTP vertex (``D4``) to 0-based ``(x, y)`` with ``y = 0`` at the bottom; ``None`` for pass."""
+    token = token.upper()
+    if token == 'PASS':
+        return None
+    col = GTP_COLUMNS.find(token[:1])
+    try:
+        row = int(token[1:])
+    except ValueError:
+        raise GTPError('invalid coordinate') from None
+    if col < 0 or col >= size or not 1 <= row <= size:
+        raise GTPError('invalid coordinate')
+    return col, row - 1
+
+
+def format_vertex(coord: Optional[Tuple[int, int]]) -> str:
+    if coord is None:
+        return 'pass'
+    x, y = coord
+    return f'{GTP_COLUMNS[x]}{y + 1}'
+
+
+class TimeManager:
+    """Per-move search budget from GTP main time and Canadian byo-yomi."""
+
+    def __init__(self, safety: float = 0.1, min_seconds: float = 0.05) -> None:
+        self.safety = safety  # 每步预留的通信/调度余量（秒）
+        self.min_seconds = min_seconds
+        self.main_time = 0.0
+        self.byo_time = 0.0
+        self.byo_stones = 0
+        self.enabled = False
+        self.clock: Dict[str, Tuple[float, int]] = {}
+
+    def set_time_settings(self, main_time: float, byo_time: float, byo_stones: int) -> None:
+        self.main_time, self.byo_time, self.byo_stones = main_time, byo_time, byo_stones
+        # GTP规定byo_yomi_time>0且byo_yomi_stones=0表示不限时
+        self.enabled = not (byo_time > 0 and byo_stones == 0)
+        self.clock = {color: (main_time, 0) for color in ('B', 'W')}
+        if main_time <= 0 and byo_stones > 0:
+            self.clock = {color: (byo_time, byo_stones) for color in ('B', 'W')}
+
+    def set_time_left(self, color: str, seconds: float, stones: int) -> None:
+        self.clock[color] = (seconds, stones)
+
+    def spend(self, color: str, seconds: float) -> None:
+        # 控制端没有发time_left时自行扣减
+        remaining, stones = self.clock.get(color, (self.main_time, 0))
+        remaining -= seconds
+        if stones > 0:
+            stones -= 1
+            if stones == 0:
+                remaining, stones = self.byo_time, self.byo_stones
+        elif remaining <= 0 and self.byo_stones > 0:
+            remaining, stones = self.byo_time, self.byo_stones
+        self.clock[color] = (max(remaining, 0.0), stones)
+
+    def budget(self, color: str, board_size: int, move_number: int) -> Optional[float]:
+        """Seconds to search this move, or ``None`` when the game is untimed."""
+        if not self.enabled:
+            return None
+        remaining, stones = self.clock.get(color, (self.main_time, 0))
+        if stones > 0:
+            seconds = remaining / stones
+        else:
+            # 预计全局约为交叉点数的60%手，按本方剩余手数平均分配主时间
+            expected_moves = 0.6 * board_size * board_size
+            moves_left = max(10.0, (expected_moves - move_number) / 2)
+            seconds = remaining / moves_left
+            if self.byo_stones > 0:
+                seconds += self.byo_time / self.byo_stones
+        return max(self.min_seconds, seconds - self.safety)
+
+
+class GTPEngine:
+    def __init__(
+        self,
+        load: Callable[[int], Tuple[Policy, object]],
+        board_size: int,
+        device: torch.device,
+        visits: Optional[int],
+        seconds: Optional[float],
+        threads: int = 1,
+        batch_size: int = 16,
+        ponder: bool = True,
+        ponder_visits: int = 50000,
+        default_visits: int = 800,
+        cache_size: int = 50000,
+        cache_symmetries: bool = False,
+    ) -> None:
+        self._load = load
+        self.device = device
+        self.visits = visits
+        self.seconds = seconds
+        self.threads = threads
+        self.batch_size = batch_size
+        self.ponder_enabled = ponder
+        self.ponder_visits = ponder_visits
+        self.default_visits = default_visits
+        self.cache_size = cache_size
+        self.cache_symmetries = cache_symmetries
+        self.komi = 7.5
+        self.time = TimeManager()
+        self._ponder_thread: Optional[threading.Thread] = None
+        self._ponder_stop = threading.Event()
+        self.commands: Dict[str, Callable[[List[str]], str]] = {
+            'protocol_version': lambda args: '2',
+            'name': lambda args: 'TinyGo',
+            'version': lambda args: '1.0',
+            'known_command': lambda args: 'true' if args and args[0] in self.commands else 'false',
+            'list_commands': lambda args: '\n'.join(self.commands),
+            'quit': lambda args: '',
+            'boardsize': self.cmd_boardsize,
+            'clear_board': self.cmd_clear_board,
+            'komi': self.cmd_komi,
+            'play': self.cmd_play,
+            'genmove': self.cmd_genmove,
+            'time_settings': self.cmd_time_settings,
+            'time_left': self.cmd_time_left,
+            'showboard': self.cmd_showboard,
+        }
+        self._set_board_size(board_size)
+
+    # ------------------------------------------------------------- lifecycle
+    def _set_board_size(self, size: int) -> None:
+        self.model, self.features = self._load(size)
+        self.board_size = size
+        self.cache = EvalCache(self.cache_size, self.cache_symmetries) if self.cache_size > 0 else None
+        self.engine = MCTS(
+            self.model,
+            self.device,
+            batch_size=self.batch_size,
+            komi=self.komi,
+            threads=self.threads,
+            cache=self.cache,
+        )
+        self._reset_game()
+
+    def _reset_game(self) -> None:
+        self.state = GoGameState(self.board_size, self.features)
+        self.to_play = 'B'
+        self.ko: Optional[Tuple[int, int]] = None
+        self.passes = 0  # 连续pass次数
+        self.move_number = 0
+        self.engine.root = None
+
+    def _apply(self, color: str, coord: Optional[Tuple[int, int]]) -> None:
+        if coord is None:
+            self.ko = None
+            self.passes += 1
+        else:
+            captured = self.state.play_move(color, coord)
+            self.ko = ko_point(self.state, coord[0], coord[1], captured)
+            self.passes = 0
+        self.to_play = 'W' if color == 'B' else 'B'
+        self.move_number += 1
+
+    def _start_ponder(self) -> None:
+        # 连续两次pass后对局已结束，没有可以思考的局面
+        if not self.ponder_enabled or self.passes >= 2:
+            return
+        self.engine.set_position(self.state, self.to_play, self.ko, self.passes)
+        self._ponder_stop.clear()
+        self._ponder_thread = threading.Thread(
+            target=self.engine.search,
+            kwargs={'visits': self.ponder_visits, 'stop': self._ponder_stop},
+            name='ponder',
+            daemon=True,
+        )
+        self._ponder_thread.start()
+
+    def stop_ponder(self) -> None:
+        if self._ponder_thread is None:
+            return
+        self._ponder_stop.set()
+        self._ponder_thread.join()
+        self._ponder_thread = None
+        LOGGER.info("Pondered to %d visits", self.engine.root.n)
+
+    # -------------------------------------------------------------- commands
+    def cmd_boardsize(self, args: List[str]) -> str:
+        try:
+            size = int(args[0])
+        except (IndexError, ValueError):
+            raise GTPError('boardsize not an integer') from None
+        if size != self.board_size:
+            try:
+                self._set_board_size(size)
+            except Exception as exc:
+                LOGGER.warning("Cannot switch to board size %d: %s", size, exc)
+                raise GTPError('unacceptable size') from None
+        else:
+            self._reset_game()
+        return ''
+
+    def cmd_clear_board(self, args: List[str]) -> str:
+        self._reset_game()
+        return ''
+
+    def cmd_komi(self, args: List[str]) -> str:
+        try:
+            self.komi = float(args[0])
+        except (IndexError, ValueError):
+            raise GTPError('komi not a float') from None
+        self.engine.komi = self.komi
+        self.engine.root = None  # 节点价值按旧贴目计算，不再复用
+        return ''
+
+    def cmd_play(self, args: List[str]) -> str:
+        if len(args) < 2:
+            raise GTPError('invalid color or coordinate')
+        color = parse_color(args[0])
+        coord = parse_vertex(args[1], self.board_size)
+        try:
+            self._apply(color, coord)
+        except ValueError:
+            raise GTPError('illegal move') from None
+        return ''
+
+    def cmd_genmove(self, args: List[str]) -> str:
+        if not args:
+            raise GTPError('invalid color')
+        color = parse_color(args[0])
+        start = time.perf_counter()
+        budget = self.time.budget(color, self.board_size, self.move_number)
+        if budget is None:
+            visits, seconds = self.visits, self.seconds
+            if visits is None and seconds is None:
+                visits = self.default_visits
+        else:
+            # 有时限时以时间为准，--visits仍作为上限
+            visits, seconds = self.visits, budget
+        self.engine.set_position(self.state, color, self.ko, self.passes)
+        reused = self.engine.root.n
+        coord = self.engine.search(visits=visits, seconds=seconds)
+        elapsed = time.perf_counter() - start
+        LOGGER.info(
+            "genmove %s: %s after %d visits (%d reused) in %.2fs, budget %s",
+            color,
+            format_vertex(coord),
+            self.engine.root.n,
+            reused,
+            elapsed,
+            'none' if budget is None else f'{budget:.2f}s',
+        )
+        self._apply(color, coord)
+        self.time.spend(color, elapsed)
+        self._start_ponder()
+        return format_vertex(coord)
+
+    def cmd_time_settings(self, args: List[str]) -> str:
+        try:
+            main_time, byo_time, byo_stones = float(args[0]), float(args[1]), int(args[2])
+        except (IndexError, ValueError):
+            raise GTPError('syntax error') from None
+        self.time.set_time_settings(main_time, byo_time, byo_stones)
+        return ''
+
+    def cmd_time_left(self, args: List[str]) -> str:
+        try:
+            color, seconds, stones = parse_color(args[0]), float(args[1]), int(args[2])
+        except (IndexError, ValueError):
+            raise GTPError('syntax error') from None
+        self.time.set_time_left(color, seconds, stones)
+        return ''
+
+    def cmd_showboard(self, args: List[str]) -> str:
+        size = self.board_size
+        symbols = {0: '.', 1: 'X', -1: 'O'}
+        lines = ['   ' + ' '.join(GTP_COLUMNS[:size])]
+        for y in range(size - 1, -1, -1):
+            row = ' '.join(symbols[int(v)] for v in self.state.board[y])
+            lines.append(f'{y + 1:2d} {row}')
+        return '\n' + '\n'.join(lines)
+
+    # ------------------------------------------------------------------ loop
+    def handle(self, line: str) -> Tuple[str, bool]:
+        """Execute one command line; returns the full response and whether to quit."""
+        parts = line.split('#', 1)[0].split()
+        if not parts:
+            return '', False
+        cmd_id = ''
+        if parts[0].isdigit():
+            cmd_id = parts.pop(0)
+        if not parts:
+            return '', False
+        name, args = parts[0].lower(), parts[1:]
+        # 对方思考期间的后台搜索在处理任何命令前停止
+        self.stop_ponder()
+        handler = self.commands.get(name)
+        try:
+            if handler is None:
+                raise GTPError('unknown command')
+            result = handler(args)
+            response = f'={cmd_id} {result}'.rstrip(' ') if result else f'={cmd_id}'
+        except GTPError as exc:
+            response = f'?{cmd_id} {exc}'
+        except Exception as exc:
+            # 引擎内部错误也要回复，否则控制端会一直等待这条命令的结果
+            LOGGER.exception("command failed: %s", line.strip())
+            response = f'?{cmd_id} {exc}'
+        return response + '\n\n', name == 'quit'
+
+    def run(self, stdin=sys.stdin, stdout=sys.stdout) -> None:
+        for line in stdin:
+            response, quit_requested = self.handle(line)
+            if response:
+                stdout.write(response)
+                stdout.flush()
+            if quit_requested:
+                break
+        self.stop_ponder()
+        if self.cache is not None:
+            LOGGER.info("Evaluation cache: %s", self.cache.stats())
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='GTP engine for the TinyGo policy network')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--checkpoint', help='Checkpoint or exported artifact')
+    source.add_argument('--server', help='Use a running inference_server.py (unix:/path.sock or host:port)')
+    parser.add_argument('--board-size', type=int, default=19)
+    parser.add_argument('--device', default=None, help='Torch device (defaults to cuda if available)')
+    parser.add_argument('--visits', type=int, default=None, help='Visit cap per move (default 800 when untimed)')
+    parser.add_argument('--seconds', type=float, default=None, help='Search time per move when the game is untimed')
+    parser.add_argument('--threads', type=int, default=1, help='Search threads sharing one tree')
+    parser.add_argument('--batch', type=int, default=16, help='Leaves evaluated per forward pass')
+    parser.add_argument('--no-ponder', action='store_true', help="Do not search during the opponent's turn")
+    parser.add_argument('--ponder-visits', type=int, default=50000, help='Stop pondering once the tree has this many visits')
+    parser.add_argument('--cache-size', type=int, default=50000, help='Positions kept in the evaluation cache (0 disables)')
+    parser.add_argument('--cache-symmetries', action='store_true', help='Share cache entries between the 8 symmetric boards')
+    return parser.parse_args()
+
+
+def main() -> None:
+    # stdout只用于GTP协议，日志写到stderr
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s', stream=sys.stderr)
+    args = parse_args()
+    device = torch.device(args.device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+
+    def load(size: int) -> Tuple[Policy, object]:
+        if args.server:
+            model = RemotePolicy(args.server)
+            if model.board_size != size:
+                raise ValueError(f"server plays {model.board_size}x{model.board_size}")
+            return model, model.features
+        return load_policy(Path(args.checkpoint).expanduser(), size, device)
+
+    engine = GTPEngine(
+        load,
+        args.board_size,
+        device,
+        visits=args.visits,
+        seconds=args.seconds,
+        threads=args.threads,
+        batch_size=args.batch,
+        ponder=not args.no_ponder,
+        ponder_visits=args.ponder_visits,
+        cache_size=args.cache_size,
+        cache_symmetries=args.cache_symmetries,
+    )
+    engine.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Long-lived policy inference service with dynamic batching across clients.
+
+Clients (``runtime.RemotePolicy``) send feature planes over a Unix socket or
+localhost TCP. A ``runtime.DynamicBatcher`` gathers pending positions until
+``--max-batch`` positions are queued or the oldest has waited
+``--max-wait-ms``, then runs them through the model in one forward pass.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import socketserver
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import torch
+
+from runtime import DynamicBatcher, load_policy, recv_frame, send_frame
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def setup(self) -> None:
+        if self.request.family in (socket.AF_INET, socket.AF_INET6):
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self) -> None:
+        server = self.server
+        while True:
+            try:
+                header, payload = recv_frame(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                reply, data = self._dispatch(server, header, payload)
+            except Exception as exc:
+                reply, data = {'error': str(exc)}, b''
+            try:
+                send_frame(self.request, reply, data)
+            except OSError:
+                return
+
+    def _dispatch(self, server, header: Dict[str, Any], payload: bytes) -> Tuple[Dict[str, Any], bytes]:
+        op = header.get('op')
+        if op == 'info':
+            return server.info, b''
+        if op == 'stats':
+            batcher = server.batcher
+            return {
+                'batches': batcher.batches,
+                'positions': batcher.positions,
+                'avg_batch': batcher.positions / max(batcher.batches, 1),
+            }, b''
+        if op != 'infer':
+            raise ValueError(f"Unknown op: {op}")
+        count = int(header['count'])
+        size = server.info['board_size']
+        num_planes = server.features.num_planes
+        plane_bytes = count * num_planes * size * size
+        planes = np.frombuffer(payload, dtype=np.uint8, count=plane_bytes).reshape(count, num_planes, size, size)
+        legal = None
+        if header.get('legal'):
+            packed = np.frombuffer(payload, dtype=np.uint8, offset=plane_bytes).reshape(count, -1)
+            legal = np.unpackbits(packed, axis=1, count=server.info['num_actions']).astype(bool)
+        probs, top = server.batcher.submit(planes, legal, int(header.get('topk', 0)))
+        return {'topk': top}, probs.astype(np.float32).tobytes()
+
+
+def _interrupt(signum, frame) -> None:
+    raise KeyboardInterrupt
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Serve a policy model to many games with dynamic batching')
+    parser.add_argument('--checkpoint', required=True, help='Checkpoint or exported artifact')
+    parser.add_argument('--board-size', type=int, default=19)
+    parser.add_argument('--device', default=None, help='Torch device (defaults to cuda if available)')
+    parser.add_argument('--unix', default=None, help='Listen on this Unix socket path instead of TCP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch', type=int, default=64, help='Largest number of positions per forward pass')
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help='Longest a request waits for the batch to fill')
+    parser.add_argument('--compile', action='store_true', help='Compile the model with torch.compile')
+    parser.add_argument('--channels-last', action='store_true', help='Use channels_last memory format')
+    return parser.parse_args()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    args = parse_args()
+    device = torch.device(args.device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+    model, features = load_policy(
+        Path(args.checkpoint).expanduser(),
+        args.board_size,
+        device,
+        channels_last=args.channels_last,
+        compile_model=args.compile,
+    )
+    example = torch.zeros(1, features.num_planes, args.board_size, args.board_size, device=device)
+    with torch.no_grad():
+        num_actions = model(example).size(1)
+
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.unlink(args.unix)
+        server = _UnixServer(args.unix, _Handler)
+        address = f'unix:{args.unix}'
+    else:
+        server = _TCPServer((args.host, args.port), _Handler)
+        address = f'{args.host}:{server.server_address[1]}'
+    server.features = features
+    server.info = {'board_size': args.board_size, 'features': features.to_dict(), 'num_actions': num_actions}
+    server.batcher = DynamicBatcher(model, device, args.board_size, args.max_batch, args.max_wait_ms)
+    LOGGER.info(
+        "Serving %s on %s (device %s, max batch %d, max wait %.1f ms)",
+        args.checkpoint,
+        address,
+        device,
+        args.max_batch,
+        args.max_wait_ms,
+    )
+    # 被进程管理器以SIGTERM结束时同样清理socket文件并输出统计
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.close()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+        LOGGER.info(
+            "Served %d positions in %d batches (avg batch %.1f)",
+            server.batcher.positions,
+            server.batcher.batches,
+            server.batcher.positions / max(server.batcher.batches, 1),
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,481 @@
+"""PUCT Monte Carlo tree search on top of the policy network.
+
+Priors come from the policy net and are computed for ``batch_size`` leaves
+per forward pass. Virtual loss steers the simulations of one batch down
+different paths. The network has no value head, so leaves are scored by
+``value_fn`` (a cheap area estimate by default), and lines that end in two
+passes by their Tromp-Taylor score. The tree is kept between moves:
+``set_position`` re-roots it at the matching child or grandchild.
+
+With ``threads > 1`` several workers share the tree. Each node has its own
+lock around its visit counts, values and children, so workers only
+contend when they pass through the same node at the same moment; the
+shared condition guards just the set of leaves waiting for evaluation.
+The forward passes (which release the GIL) go through a
+``DynamicBatcher``. Batches submitted by concurrent workers are merged, and
+one worker's batch is evaluated while the others keep selecting.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from board import Color, GoGameState
+from runtime import DynamicBatcher, EvalCache, Policy, batch_policy_probs
+from scoring import area_score, dilate
+
+
+ValueFn = Callable[[GoGameState, Color], float]
+
+
+def _other(color: Color) -> Color:
+    return 'W' if color == 'B' else 'B'
+
+
+def area_estimate(state: GoGameState, to_play: Color, komi: float = 7.5) -> float:
+    """Value in [-1, 1] for ``to_play`` from stones plus empty points touching only one color."""
+    board = state.board
+    black = board == 1
+    white = board == -1
+    empty = board == 0
+    near_black = dilate(black)
+    near_white = dilate(white)
+    score = (
+        int(black.sum()) + int((empty & near_black & ~near_white).sum())
+        - int(white.sum()) - int((empty & near_white & ~near_black).sum())
+        - komi
+    )
+    # 领先一路棋盘宽度的目数约对应0.76
+    value = math.tanh(score / state.size)
+    return value if to_play == 'B' else -value
+
+
+def ko_point(state: GoGameState, x: int, y: int, captured: List[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+    """Point the opponent may not retake right after ``(x, y)`` captured ``captured`` (simple ko)."""
+    # 单子提单子，且落下的子只剩被提处一口气时构成劫
+    if len(captured) != 1:
+        return None
+    value = state.board[y, x]
+    for nx, ny in state._neighbors(x, y):
+        if state.board[ny, nx] != -value and (nx, ny) != captured[0]:
+            return None
+    return captured[0]
+
+
+class Node:
+    __slots__ = (
+        'state', 'to_play', 'passes', 'ko', 'n', 'value',
+        'priors', 'legal', 'child_n', 'child_w', 'children', 'terminal', 'lock',
+    )
+
+    def __init__(self, state: GoGameState, to_play: Color, passes: int = 0, ko: Optional[int] = None) -> None:
+        self.state = state
+        self.to_play = to_play
+        self.passes = passes
+        self.ko = ko  # 劫争时禁止立即提回的点
+        self.n = 0
+        self.value = 0.0
+        self.priors: Optional[np.ndarray] = None  # None until expanded
+        self.legal: Optional[np.ndarray] = None
+        self.child_n: Optional[np.ndarray] = None
+        self.child_w: Optional[np.ndarray] = None
+        self.children: Dict[int, Node] = {}
+        self.terminal: Optional[float] = None
+        # 保护n、child_n/child_w、legal和children；多线程搜索时只锁经过的节点
+        self.lock = threading.Lock()
+
+
+class MCTS:
+    """Batched PUCT search. Actions are point indices ``y * size + x``; ``size * size`` is pass."""
+
+    def __init__(
+        self,
+        policy: Policy,
+        device: torch.device,
+        c_puct: float = 1.5,
+        batch_size: int = 16,
+        virtual_loss: float = 1.0,
+        fpu_reduction: float = 0.25,
+        komi: float = 7.5,
+        value_fn: Optional[ValueFn] = None,
+        threads: int = 1,
+        batch_wait_ms: float = 0.0,
+        cache: Optional[EvalCache] = None,
+    ) -> None:
+        self.policy = policy
+        self.device = device
+        self.c_puct = c_puct
+        self.batch_size = batch_size
+        self.virtual_loss = virtual_loss
+        self.fpu_reduction = fpu_reduction
+        self.komi = komi
+        self.value_fn = value_fn or (lambda state, color: area_estimate(state, color, komi))
+        self.threads = threads
+        self.cache = cache
+        self.batch_wait_ms = batch_wait_ms
+        self.root: Optional[Node] = None
+        # 正在等待网络结果的叶子；其他模拟走到这里视为冲突。_cond只保护这个集合
+        self._inflight = set()
+        self._cond = threading.Condition()
+
+    # ------------------------------------------------------------------ tree
+    def set_position(
+        self,
+        state: GoGameState,
+        to_play: Color,
+        ko: Optional[Tuple[int, int]] = None,
+        passes: int = 0,
+    ) -> None:
+        """Re-root at ``state``, reusing the subtree if it is the root, a child or a grandchild.
+
+        ``ko`` is the point the side to move may not retake immediately, if any.
+        ``passes`` is the number of consecutive passes that led to ``state``;
+        after one pass, a pass by the side to move ends the game.
+        """
+        ko_action = None if ko is None else ko[1] * state.size + ko[0]
+        if self.root is not None:
+            candidates = [self.root]
+            for child in self.root.children.values():
+                candidates.append(child)
+                candidates.extend(child.children.values())
+            for node in candidates:
+                # pass前后盘面相同，只有连续pass次数和劫也一致才是同一个局面
+                if (
+                    node.to_play == to_play
+                    and node.passes == passes
+                    and node.ko == ko_action
+                    and np.array_equal(node.state.board, state.board)
+                ):
+                    self.root = node
+                    return
+        self.root = Node(state.copy(), to_play, passes=passes, ko=ko_action)
+        if passes >= 2:
+            self._score_terminal(self.root)
+
+    def _make_child(self, node: Node, action: int) -> Optional[Node]:
+        size = node.state.size
+        if action == size * size:
+            child = Node(node.state, _other(node.to_play), passes=node.passes + 1)
+            if child.passes >= 2:
+                self._score_terminal(child)
+        else:
+            y, x = divmod(action, size)
+            state = node.state.copy()
+            try:
+                captured = state.play_move(node.to_play, (x, y))
+            except ValueError:
+                node.legal[action] = False
+                return None
+            child = Node(state, _other(node.to_play), ko=self._ko_point(state, x, y, captured))
+        node.children[action] = child
+        return child
+
+    def _score_terminal(self, node: Node) -> None:
+        # 终局按数子法精确计分，不再用估值函数
+        score = area_score(node.state.board, self.komi)
+        node.terminal = float(np.sign(score if node.to_play == 'B' else -score))
+
+    @staticmethod
+    def _ko_point(state: GoGameState, x: int, y: int, captured: List[Tuple[int, int]]) -> Optional[int]:
+        point = ko_point(state, x, y, captured)
+        return None if point is None else point[1] * state.size + point[0]
+
+    def _expand(self, node: Node, probs: np.ndarray) -> None:
+        size = node.state.size
+        points = size * size
+        legal = np.ones(points + 1, dtype=bool)
+        legal[:points] = node.state.board.ravel() == 0
+        if node.ko is not None:
+            legal[node.ko] = False
+        priors = np.zeros(points + 1, dtype=np.float64)
+        priors[:probs.shape[0]] = probs
+        if probs.shape[0] == points:
+            # 全连接策略头没有pass输出，给pass一个很小的先验
+            priors[points] = 1.0 / (points + 1)
+        priors[~legal] = 0.0
+        total = priors.sum()
+        node.legal = legal
+        node.child_n = np.zeros(points + 1, dtype=np.float64)
+        node.child_w = np.zeros(points + 1, dtype=np.float64)
+        node.value = self.value_fn(node.state, node.to_play)
+        # priors最后赋值：其他线程以priors非空判断节点已展开，此时其余字段必须已就绪
+        node.priors = priors / total if total > 0 else legal / legal.sum()
+
+    def _select(self, node: Node) -> int:
+        n = node.child_n
+        q = np.where(n > 0, node.child_w / np.maximum(n, 1e-9), node.value - self.fpu_reduction)
+        u = self.c_puct * node.priors * math.sqrt(max(node.n, 1)) / (1.0 + n)
+        score = np.where(node.legal, q + u, -np.inf)
+        return int(score.argmax())
+
+    def _descend(self) -> Tuple[Node, List[Tuple[Node, int]]]:
+        node = self.root
+        path: List[Tuple[Node, int]] = []
+        vl = self.virtual_loss
+        while node.priors is not None and node.terminal is None:
+            with node.lock:
+                action = self._select(node)
+                child = node.children.get(action) or self._make_child(node, action)
+                if child is None:
+                    continue  # 非法点已标记，重新选择
+                node.child_n[action] += vl
+                node.child_w[action] -= vl
+            path.append((node, action))
+            node = child
+        return node, path
+
+    def _backup(self, path: List[Tuple[Node, int]], leaf: Node, value: float) -> None:
+        """``value`` is from the perspective of ``leaf.to_play``."""
+        vl = self.virtual_loss
+        with leaf.lock:
+            leaf.n += 1
+        for node, action in reversed(path):
+            value = -value
+            with node.lock:
+                node.child_n[action] += 1.0 - vl
+                node.child_w[action] += value + vl
+                node.n += 1
+
+    def _revert(self, path: List[Tuple[Node, int]]) -> None:
+        vl = self.virtual_loss
+        for node, action in path:
+            with node.lock:
+                node.child_n[action] -= vl
+                node.child_w[action] += vl
+
+    def _evaluate(self, leaves: List[Node]) -> None:
+        probs = batch_policy_probs(
+            self.policy,
+            [leaf.state for leaf in leaves],
+            [leaf.to_play for leaf in leaves],
+            self.device,
+            self.cache,
+        )
+        for leaf, leaf_probs in zip(leaves, probs):
+            self._expand(leaf, leaf_probs)
+
+    # ---------------------------------------------------------------- search
+    def _gather(self) -> Tuple[List[Tuple[Node, List[Tuple[Node, int]]]], int]:
+        """Descend up to ``batch_size`` times; returns leaves to evaluate and terminal visits done."""
+        pending: List[Tuple[Node, List[Tuple[Node, int]]]] = []
+        done = 0
+        for _ in range(self.batch_size):
+            leaf, path = self._descend()
+            if leaf.terminal is not None:
+                self._backup(path, leaf, leaf.terminal)
+                done += 1
+                continue
+            with self._cond:
+                claimed = id(leaf) not in self._inflight
+                if claimed:
+                    self._inflight.add(id(leaf))
+            if not claimed:
+                # 虚拟损失仍把模拟引到等待中的叶子，提前结束本批
+                self._revert(path)
+                break
+            pending.append((leaf, path))
+        return pending, done
+
+    def _finish(self, pending: List[Tuple[Node, List[Tuple[Node, int]]]], probs: np.ndarray) -> None:
+        # 叶子已被本线程占用，展开时不需要加锁
+        for (leaf, path), leaf_probs in zip(pending, probs):
+            self._expand(leaf, leaf_probs)
+            self._backup(path, leaf, leaf.value)
+        with self._cond:
+            for leaf, _ in pending:
+                self._inflight.discard(id(leaf))
+            self._cond.notify_all()
+
+    def run_batch(self) -> int:
+        """Run up to ``batch_size`` simulations with one forward pass; returns simulations done."""
+        pending, done = self._gather()
+        if pending:
+            probs = batch_policy_probs(
+                self.policy,
+                [leaf.state for leaf, _ in pending],
+                [leaf.to_play for leaf, _ in pending],
+                self.device,
+                self.cache,
+            )
+            self._finish(pending, probs)
+        return done + len(pending)
+
+    def _worker(self, batcher: DynamicBatcher, finished: Callable[[], bool], errors: List[BaseException]) -> None:
+        try:
+            while not finished() and not errors:
+                pending, done = self._gather()
+                if not pending:
+                    if not done:
+                        # 选中的叶子都在其他线程的批次里，等它们回填；终局访问不需要等待
+                        with self._cond:
+                            if self._inflight:
+                                self._cond.wait(timeout=0.01)
+                    continue
+                # 节点状态创建后不再修改，特征可以在锁外计算
+                planes = np.stack([leaf.state.make_features(leaf.to_play) for leaf, _ in pending])
+                if self.cache is not None:
+                    probs = self.cache.probs(planes, lambda missing: batcher.submit(missing)[0])
+                else:
+                    probs, _ = batcher.submit(planes)
+                self._finish(pending, probs)
+        except BaseException as exc:  # 交给search()在主线程重新抛出
+            with self._cond:
+                errors.append(exc)
+                self._cond.notify_all()
+
+    def _search_parallel(self, finished: Callable[[], bool]) -> None:
+        batcher = DynamicBatcher(
+            self.policy,
+            self.device,
+            self.root.state.size,
+            max_batch=self.batch_size * self.threads,
+            max_wait_ms=self.batch_wait_ms,
+        )
+        errors: List[BaseException] = []
+        workers = [
+            threading.Thread(target=self._worker, args=(batcher, finished, errors), name=f'mcts-{i}', daemon=True)
+            for i in range(self.threads)
+        ]
+        try:
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            batcher.close()
+        if errors:
+            raise errors[0]
+
+    def search(
+        self,
+        visits: Optional[int] = None,
+        seconds: Optional[float] = None,
+        stop: Optional[threading.Event] = None,
+    ) -> Optional[Tuple[int, int]]:
+        """Search from the current root; returns ``(x, y)`` of the most visited move or ``None`` to pass.
+
+        Setting ``stop`` (e.g. from another thread while pondering) ends the search early.
+        A root that ends the game (two passes) is not searched; the answer is
+        ``None``, i.e. pass, and ``best_move``/``sample_move``/``top_moves``
+        also report pass or no moves for such a root.
+        """
+        if self.root is None:
+            raise RuntimeError("call set_position() before search()")
+        if self.root.terminal is not None:
+            return None
+        if visits is None and seconds is None and stop is None:
+            raise ValueError("a visit or time budget is required")
+        deadline = time.perf_counter() + seconds if seconds is not None else math.inf
+        if self.root.priors is None:
+            self._evaluate([self.root])
+            self.root.n = 1
+        start = self.root.n
+
+        def finished() -> bool:
+            return (
+                (visits is not None and self.root.n - start >= visits)
+                or time.perf_counter() >= deadline
+                or (stop is not None and stop.is_set())
+            )
+
+        if self.threads > 1:
+            self._search_parallel(finished)
+        else:
+            while not finished():
+                self.run_batch()
+        return self.best_move()
+
+    def sample_move(self, temperature: float, rng: np.random.Generator, exclude: Optional[np.ndarray] = None) -> Optional[Tuple[int, int]]:
+        """Draw a root move with probability proportional to ``visits ** (1 / temperature)``.
+
+        ``temperature == 0`` is ``best_move``. ``exclude`` is an optional
+        ``(size, size)`` mask of points never to pick (e.g. own eyes). Pass
+        is never sampled: it is played only when it is the most visited move
+        or no board move has visits.
+        """
+        if self.root.child_n is None:
+            return None  # 根未展开（已终局），只能pass
+        size = self.root.state.size
+        points = size * size
+        counts = self.root.child_n.copy()
+        if exclude is not None:
+            counts[:points][exclude.ravel()] = 0.0
+        # 抽样到pass会让对方跟着pass直接终局，pass只作为最佳或唯一选择
+        if counts[:points].sum() <= 0 or counts.argmax() == points:
+            return None
+        counts = counts[:points]
+        if temperature > 0:
+            weights = (counts / counts.max()) ** (1.0 / temperature)
+            action = int(rng.choice(points, p=weights / weights.sum()))
+        else:
+            action = int(counts.argmax())
+        y, x = divmod(action, size)
+        return x, y
+
+    def best_move(self) -> Optional[Tuple[int, int]]:
+        if self.root.child_n is None:
+            return None
+        action = int(self.root.child_n.argmax())
+        size = self.root.state.size
+        if action == size * size or self.root.child_n[action] == 0:
+            return None
+        y, x = divmod(action, size)
+        return x, y
+
+    def top_moves(self, k: int) -> List[Tuple[Optional[Tuple[int, int]], int, float, float]]:
+        """``(coord or None for pass, visits, q, prior)`` for the ``k`` most visited root moves."""
+        root = self.root
+        if root.child_n is None:
+            return []
+        size = root.state.size
+        order = np.argsort(root.child_n)[::-1][:k]
+        moves = []
+        for action in order:
+            visits = int(root.child_n[action])
+            if visits == 0:
+                break
+            coord = None if action == size * size else divmod(int(action), size)[::-1]
+            moves.append((coord, visits, root.child_w[action] / visits, float(root.priors[action])))
+        return moves
+
+
+def search_many(engines: Sequence[MCTS], visits: int) -> None:
+    """Search several trees in lockstep, with all their leaves in one forward pass per round.
+
+    The engines must share one policy, device and cache (e.g. one per game in
+    a self-play batch) and have their roots set. Each gets ``visits`` more
+    simulations; trees whose root already ends the game are skipped.
+    """
+    # 已终局的根没有可搜索的分支
+    engines = [engine for engine in engines if engine.root.terminal is None]
+    if not engines:
+        return
+    lead = engines[0]
+
+    def evaluate(nodes: List[Node]) -> np.ndarray:
+        return batch_policy_probs(
+            lead.policy, [node.state for node in nodes], [node.to_play for node in nodes], lead.device, lead.cache
+        )
+
+    fresh = [engine for engine in engines if engine.root.priors is None]
+    if fresh:
+        for engine, probs in zip(fresh, evaluate([engine.root for engine in fresh])):
+            engine._expand(engine.root, probs)
+            engine.root.n = 1
+    targets = {id(engine): engine.root.n + visits for engine in engines}
+    active = list(engines)
+    while active:
+        gathered = [(engine, engine._gather()[0]) for engine in active]
+        leaves = [leaf for _, pending in gathered for leaf, _ in pending]
+        if leaves:
+            probs = evaluate(leaves)
+            offset = 0
+            for engine, pending in gathered:
+                engine._finish(pending, probs[offset:offset + len(pending)])
+                offset += len(pending)
+        active = [engine for engine in active if engine.root.n < targets[id(engine)]]
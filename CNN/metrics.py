@@ -3,6 +3,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 
 import torch
+import torch.distributed as dist
 
 
 @dataclass
@@ -29,15 +30,54 @@ class AverageMeter:
         return f"{self.name} {self.val:{self.fmt}} (avg {self.avg:{self.fmt}})"
 
 
-def topk_accuracy(logits: torch.Tensor, target: torch.Tensor, topk=(1,)):
+class DeviceAverageMeter:
+    """AverageMeter whose running sum stays on the device.
+
+    ``update`` only queues tensor ops; reading ``avg`` is the single point
+    where the host waits for the device.
+    """
+
+    def __init__(self, name: str, device: torch.device, fmt: str = ':.4f') -> None:
+        self.name = name
+        self.device = device
+        self.fmt = fmt
+        self.reset()
+
+    def reset(self) -> None:
+        self.sum = torch.zeros((), dtype=torch.float32, device=self.device)
+        self.count = 0
+
+    def update(self, val: torch.Tensor, n: int = 1) -> None:
+        self.sum += val.detach().float() * n
+        self.count += n
+
+    def all_reduce(self) -> None:
+        """Sum the running totals over all ranks of the default process group."""
+        if not (dist.is_available() and dist.is_initialized()):
+            return
+        totals = torch.stack([self.sum, torch.tensor(float(self.count), device=self.device)])
+        dist.all_reduce(totals)
+        self.sum = totals[0]
+        self.count = int(totals[1].item())
+
+    @property
+    def avg(self) -> float:
+        return self.sum.item() / self.count if self.count else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.name} (avg {self.avg:{self.fmt}})"
+
+
+def topk_correct(logits: torch.Tensor, target: torch.Tensor, topk=(1,)) -> torch.Tensor:
+    """Number of samples whose target is in the top-k, one entry per k, kept on device."""
     with torch.no_grad():
         maxk = max(topk)
         _, pred = logits.topk(maxk, dim=1)
         pred = pred.t()
         correct = pred.eq(target.view(1, -1))
+        return torch.stack([correct[:k].reshape(-1).float().sum(0) for k in topk])
 
-        results = []
-        for k in topk:
-            correct_k = correct[:k].reshape(-1).float().sum(0)
-            results.append((correct_k * 100.0 / target.size(0)).item())
-        return results
+
+def topk_accuracy(logits: torch.Tensor, target: torch.Tensor, topk=(1,)):
+    correct = topk_correct(logits, target, topk)
+    return (correct * 100.0 / target.size(0)).tolist()
@@ -1,16 +1,26 @@
 from __future__ import annotations
 
+import copy
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
 import torch
 import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+
+LOGGER = logging.getLogger(__name__)
 
 
 class ResidualBlock(nn.Module):
-    def __init__(self, channels: int) -> None:
+    def __init__(self, channels: int, mid_channels: Optional[int] = None) -> None:
         super().__init__()
-        self.conv1 = nn.Conv2d(channels, channels, kernel_size=3, padding=1, bias=False)
-        self.bn1 = nn.BatchNorm2d(channels)
+        # mid_channels是块内部(conv1输出/conv2输入)的宽度，剪枝后可以小于主干宽度
+        mid_channels = mid_channels or channels
+        self.conv1 = nn.Conv2d(channels, mid_channels, kernel_size=3, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(mid_channels)
         self.relu = nn.ReLU(inplace=True)
-        self.conv2 = nn.Conv2d(channels, channels, kernel_size=3, padding=1, bias=False)
+        self.conv2 = nn.Conv2d(mid_channels, channels, kernel_size=3, padding=1, bias=False)
         self.bn2 = nn.BatchNorm2d(channels)
 
     def forward(self, x: torch.Tensor) -> torch.Tensor:
@@ -25,32 +35,145 @@ class ResidualBlock(nn.Module):
         return out
 
 
+POLICY_HEADS = ('fc', 'conv')
+
+
 class SimplePolicyNet(nn.Module):
-    def __init__(self, board_size: int, in_channels: int = 3, channels: int = 64, num_blocks: int = 6) -> None:
+    """Residual CNN policy.
+
+    ``head='fc'`` is the original dense head tied to ``board_size`` and emits
+    ``board_size**2`` logits. ``head='conv'`` is fully convolutional: a 1x1
+    convolution gives one logit per point and a pooled linear layer adds a
+    pass logit (index ``board_size**2``), so the weights work on any board size.
+    ``block_channels`` sets the inner width of each residual block (as left by
+    ``prune.py``); by default every block is ``channels`` wide.
+    """
+
+    def __init__(
+        self,
+        board_size: int,
+        in_channels: int = 3,
+        channels: int = 64,
+        num_blocks: int = 6,
+        head: str = 'fc',
+        block_channels: Optional[List[int]] = None,
+    ) -> None:
         super().__init__()
+        if head not in POLICY_HEADS:
+            raise ValueError(f"Unknown policy head: {head}")
+        block_channels = list(block_channels) if block_channels is not None else [channels] * num_blocks
+        if len(block_channels) != num_blocks:
+            raise ValueError(f"Expected {num_blocks} block widths, got {len(block_channels)}")
         self.board_size = board_size
+        self.head = head
+        self.channels = channels
+        self.num_blocks = num_blocks
+        self.block_channels = block_channels
         self.stem = nn.Sequential(
             nn.Conv2d(in_channels, channels, kernel_size=3, padding=1, bias=False),
             nn.BatchNorm2d(channels),
             nn.ReLU(inplace=True),
         )
-        self.blocks = nn.ModuleList([ResidualBlock(channels) for _ in range(num_blocks)])
-        self.policy_head = nn.Sequential(
-            nn.Conv2d(channels, 2, kernel_size=1, bias=False),
-            nn.BatchNorm2d(2),
-            nn.ReLU(inplace=True),
-        )
-        self.fc = nn.Linear(2 * board_size * board_size, board_size * board_size)
+        self.blocks = nn.ModuleList([ResidualBlock(channels, width) for width in block_channels])
+        if head == 'fc':
+            self.policy_head = nn.Sequential(
+                nn.Conv2d(channels, 2, kernel_size=1, bias=False),
+                nn.BatchNorm2d(2),
+                nn.ReLU(inplace=True),
+            )
+            self.fc = nn.Linear(2 * board_size * board_size, board_size * board_size)
+        else:
+            self.policy_conv = nn.Conv2d(channels, 1, kernel_size=1)
+            self.pass_fc = nn.Linear(channels, 1)
 
         for m in self.modules():
             if isinstance(m, nn.Conv2d):
                 nn.init.kaiming_normal_(m.weight, mode='fan_out', nonlinearity='relu')
+        if head == 'conv':
+            # 输出层fan_out为1，kaiming初始化会让初始logits过大
+            nn.init.normal_(self.policy_conv.weight, std=0.01)
+            nn.init.zeros_(self.policy_conv.bias)
+
+    @property
+    def num_actions(self) -> int:
+        points = self.board_size * self.board_size
+        return points + 1 if self.head == 'conv' else points
+
+    @property
+    def arch(self) -> Dict[str, Any]:
+        """Constructor arguments recorded in checkpoints to rebuild the network."""
+        return {
+            'head': self.head,
+            'channels': self.channels,
+            'blocks': self.num_blocks,
+            'block_channels': self.block_channels,
+        }
 
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         out = self.stem(x)
         for block in self.blocks:
             out = block(out)
+        if self.head == 'conv':
+            board_logits = torch.flatten(self.policy_conv(out), 1)
+            pass_logit = self.pass_fc(out.mean(dim=(2, 3)))
+            return torch.cat([board_logits, pass_logit], dim=1)
         out = self.policy_head(out)
         out = torch.flatten(out, 1)
         out = self.fc(out)
         return out
+
+
+def detect_arch(state_dict: Dict[str, torch.Tensor]) -> Dict[str, Any]:
+    """Infer head type, width and depth from parameter names and shapes."""
+    head = 'conv' if any(k.endswith('policy_conv.weight') for k in state_dict) else 'fc'
+    stem = next(v for k, v in state_dict.items() if k.endswith('stem.0.weight'))
+    widths = {
+        int(k.split('blocks.')[1].split('.')[0]): v.shape[0]
+        for k, v in state_dict.items()
+        if 'blocks.' in k and k.endswith('conv1.weight')
+    }
+    return {
+        'head': head,
+        'channels': stem.shape[0],
+        'blocks': len(widths),
+        'block_channels': [widths[i] for i in sorted(widths)],
+    }
+
+
+def fold_batchnorm(model: SimplePolicyNet) -> SimplePolicyNet:
+    """Eval-mode copy of ``model`` with every BatchNorm folded into the preceding convolution."""
+    folded = copy.deepcopy(model).eval()
+
+    def fold(seq: nn.Sequential) -> None:
+        seq[0] = fuse_conv_bn_eval(seq[0], seq[1])
+        seq[1] = nn.Identity()
+
+    fold(folded.stem)
+    for block in folded.blocks:
+        block.conv1 = fuse_conv_bn_eval(block.conv1, block.bn1)
+        block.bn1 = nn.Identity()
+        block.conv2 = fuse_conv_bn_eval(block.conv2, block.bn2)
+        block.bn2 = nn.Identity()
+    if folded.head == 'fc':
+        fold(folded.policy_head)
+    return folded
+
+
+def compile_with_fallback(model: nn.Module, warmup: Callable[[nn.Module], None]) -> nn.Module:
+    """Wrap ``model`` with torch.compile and trigger compilation via ``warmup``.
+
+    The returned module shares parameters with ``model``; keep saving
+    ``model.state_dict()`` so checkpoints carry no ``_orig_mod.`` prefixes.
+    Falls back to the eager module if compilation is unavailable or fails.
+    """
+    if not hasattr(torch, 'compile'):
+        LOGGER.warning("torch.compile is not available in this PyTorch build, running eagerly")
+        return model
+    try:
+        compiled = torch.compile(model)
+        warmup(compiled)
+    except Exception as exc:  # 编译失败不影响训练/对弈，退回eager模式
+        LOGGER.warning("torch.compile failed (%s), falling back to eager execution", exc)
+        return model
+    LOGGER.info("Model compiled with torch.compile")
+    return compiled
@@ -8,20 +8,33 @@ from typing import List, Optional, Tuple
 import numpy as np
 import torch
 
-from model import SimplePolicyNet
-from datasets import GoGameState
-from utils import load_checkpoint
+from board import GoGameState
+from mcts import MCTS, ko_point
+from runtime import EvalCache, Policy, RemotePolicy, load_policy, policy_probs
+from scoring import area_score, format_result, game_over
 
 LOGGER = logging.getLogger(__name__)
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Play Go against the trained CNN policy")
-    parser.add_argument("--checkpoint", required=True, help="Path to checkpoint_latest.pt or specific epoch checkpoint")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--checkpoint", help="Path to checkpoint_latest.pt or specific epoch checkpoint")
+    source.add_argument("--server", help="Use a running inference_server.py (unix:/path.sock or host:port)")
     parser.add_argument("--board-size", type=int, default=19)
     parser.add_argument("--human-color", choices=["B", "W", "black", "white"], default="B")
     parser.add_argument("--device", default=None, help="Torch device, e.g. cuda or cpu (defaults to auto)")
+    parser.add_argument("--komi", type=float, default=7.5, help="Komi used for the final score")
     parser.add_argument("--topk", type=int, default=5, help="Show top-k AI move suggestions")
+    parser.add_argument("--mcts-visits", type=int, default=0, help="Search this many visits per move with MCTS (0 plays the raw policy)")
+    parser.add_argument("--mcts-seconds", type=float, default=None, help="Search for this many seconds per move with MCTS")
+    parser.add_argument("--mcts-batch", type=int, default=16, help="Leaves evaluated per forward pass")
+    parser.add_argument("--mcts-threads", type=int, default=1, help="Search threads sharing one tree")
+    parser.add_argument("--c-puct", type=float, default=1.5, help="PUCT exploration constant")
+    parser.add_argument("--cache-size", type=int, default=50000, help="Positions kept in the evaluation cache (0 disables)")
+    parser.add_argument("--cache-symmetries", action="store_true", help="Share cache entries between the 8 symmetric boards")
+    parser.add_argument("--compile", action="store_true", help="Compile the model with torch.compile")
+    parser.add_argument("--channels-last", action="store_true", help="Use channels_last memory format")
     return parser.parse_args()
 
 
@@ -48,50 +61,56 @@ def format_board(state: GoGameState) -> str:
     return "\n".join(rows)
 
 
-def human_move(state: GoGameState, color: str, move_str: str) -> bool:
+def human_move(
+    state: GoGameState, color: str, move_str: str, ko: Optional[Tuple[int, int]] = None
+) -> Tuple[bool, Optional[Tuple[int, int]]]:
+    """Play the typed move; returns whether it was accepted and the resulting ko point."""
     move_str = move_str.strip().lower()
     if move_str in {"pass", "p"}:
-        return True
+        return True, None
     if move_str in {"quit", "exit", "resign"}:
         raise SystemExit("Game ended by user.")
     parts = move_str.replace(",", " ").split()
     if len(parts) != 2:
         print("请输入坐标，如 '4 4' 或输入 pass")
-        return False
+        return False, ko
     try:
         x = int(parts[0])
         y = int(parts[1])
     except ValueError:
         print("坐标需要为整数")
-        return False
+        return False, ko
     if not (1 <= x <= state.size and 1 <= y <= state.size):
         print("坐标超出棋盘范围")
-        return False
+        return False, ko
+    if ko == (x - 1, y - 1):
+        print("非法落子: 劫争中不能立即提回")
+        return False, ko
     try:
-        state.play_move(color, (x - 1, y - 1))
+        captured = state.play_move(color, (x - 1, y - 1))
     except ValueError as exc:
         print(f"非法落子: {exc}")
-        return False
-    return True
+        return False, ko
+    return True, ko_point(state, x - 1, y - 1, captured)
 
 
 def ai_move(
-    model: SimplePolicyNet,
+    model: Policy,
     state: GoGameState,
     color: str,
     device: torch.device,
     topk: int,
+    cache: Optional[EvalCache] = None,
 ) -> Tuple[Optional[Tuple[int, int]], List[Tuple[int, int, float]]]:
-    features = state.make_features(color)
-    tensor = torch.from_numpy(features).unsqueeze(0).to(device)
-    with torch.no_grad():
-        logits = model(tensor)
-        probs = torch.softmax(logits, dim=1).cpu().numpy()[0]
+    probs = policy_probs(model, state, color, device, cache)
     size = state.size
     order = np.argsort(probs)[::-1]
     suggestions: List[Tuple[int, int, float]] = []
     move_coord: Optional[Tuple[int, int]] = None
     for idx in order:
+        if idx >= size * size:
+            # 卷积策略头的最后一个输出是pass，排在所有合法点之前时选择pass
+            break
         x, y = to_xy(idx, size)
         if state.board[y, x] != 0:
             continue
@@ -100,8 +119,7 @@ def ai_move(
             suggestions.append((x + 1, y + 1, prob))
         try:
             # simulate move on copy to ensure legality
-            temp = GoGameState(size)
-            temp.board = state.board.copy()
+            temp = state.copy()
             temp.play_move(color, (x, y))
         except ValueError:
             continue
@@ -110,6 +128,26 @@ def ai_move(
     return move_coord, suggestions
 
 
+def mcts_move(
+    engine: MCTS,
+    state: GoGameState,
+    color: str,
+    args: argparse.Namespace,
+    passes: int = 0,
+    ko: Optional[Tuple[int, int]] = None,
+) -> Optional[Tuple[int, int]]:
+    # 与上一次搜索的局面相同或相差一两手时沿用已有的搜索树；对方刚pass时搜索需要知道再pass就终局
+    # GoGameState.play_move不检查劫，禁止提回的点要交给搜索
+    engine.set_position(state, color, ko, passes)
+    reused = engine.root.n
+    coord = engine.search(visits=args.mcts_visits or None, seconds=args.mcts_seconds)
+    print(f"AI ({color}) 搜索 {engine.root.n} 次访问 (复用 {reused} 次): ")
+    for i, (move, visits, q, prior) in enumerate(engine.top_moves(args.topk), start=1):
+        where = "PASS" if move is None else f"({move[0] + 1:2d}, {move[1] + 1:2d})"
+        print(f"  Top{i}: {where} 访问 {visits:5d} 胜率估计 {(q + 1) / 2:.3f} 先验 {prior:.4f}")
+    return coord
+
+
 def main() -> None:
     args = parse_args()
     device = torch.device(
@@ -117,52 +155,92 @@ def main() -> None:
         if args.device
         else ("cuda" if torch.cuda.is_available() else "cpu")
     )
-    checkpoint_path = Path(args.checkpoint).expanduser()
-    if not checkpoint_path.exists():
-        raise FileNotFoundError(checkpoint_path)
-
-    model = SimplePolicyNet(board_size=args.board_size)
-    state_dict = load_checkpoint(checkpoint_path, device)
-    if 'model' in state_dict:
-        model.load_state_dict(state_dict['model'])
+    if args.server:
+        model = RemotePolicy(args.server)
+        features = model.features
+        if model.board_size != args.board_size:
+            raise SystemExit(f"推理服务的棋盘大小为 {model.board_size}，与 --board-size {args.board_size} 不一致")
+        print(f"使用推理服务: {args.server}")
     else:
-        model.load_state_dict(state_dict)
-    model.to(device)
-    model.eval()
-
-    print(f"加载模型: {checkpoint_path}")
-    print(f"使用设备: {device}")
-
-    state = GoGameState(args.board_size)
+        checkpoint_path = Path(args.checkpoint).expanduser()
+        if not checkpoint_path.exists():
+            raise FileNotFoundError(checkpoint_path)
+
+        model, features = load_policy(
+            checkpoint_path,
+            args.board_size,
+            device,
+            channels_last=args.channels_last,
+            compile_model=args.compile,
+        )
+
+        print(f"加载模型: {checkpoint_path}")
+        print(f"使用设备: {device}")
+
+    cache = EvalCache(args.cache_size, symmetries=args.cache_symmetries) if args.cache_size > 0 else None
+    engine = None
+    if args.mcts_visits > 0 or args.mcts_seconds:
+        engine = MCTS(
+            model,
+            device,
+            c_puct=args.c_puct,
+            batch_size=args.mcts_batch,
+            komi=args.komi,
+            threads=args.mcts_threads,
+            cache=cache,
+        )
+
+    state = GoGameState(args.board_size, features)
     human_color = 'B' if args.human_color.lower().startswith('b') else 'W'
     current = 'B'
     move_count = 0
+    passes = 0
+    ko: Optional[Tuple[int, int]] = None  # 当前一方不能立即提回的劫
 
     while True:
         print("\n当前棋盘:")
         print(format_board(state))
         if current == human_color:
             move_input = input(f"轮到你 ({current})，请输入坐标或 pass: ")
-            if human_move(state, current, move_input):
+            accepted, ko = human_move(state, current, move_input, ko)
+            if accepted:
+                passes = passes + 1 if move_input.strip().lower() in {"pass", "p"} else 0
                 current = 'W' if current == 'B' else 'B'
                 move_count += 1
         else:
-            coord, suggestions = ai_move(model, state, current, device, args.topk)
-            print(f"AI ({current}) 建议: ")
-            for i, (sx, sy, prob) in enumerate(suggestions, start=1):
-                print(f"  Top{i}: ({sx:2d}, {sy:2d}) 概率 {prob:.4f}")
+            if engine is not None:
+                coord = mcts_move(engine, state, current, args, passes, ko)
+            else:
+                coord, suggestions = ai_move(model, state, current, device, args.topk, cache)
+                print(f"AI ({current}) 建议: ")
+                for i, (sx, sy, prob) in enumerate(suggestions, start=1):
+                    print(f"  Top{i}: ({sx:2d}, {sy:2d}) 概率 {prob:.4f}")
             if coord is None:
                 print("AI 无合法落子，选择 PASS")
+                passes += 1
+                ko = None
             else:
                 cx, cy = coord
                 print(f"AI 落子 ({cx + 1}, {cy + 1})")
-                state.play_move(current, coord)
+                captured = state.play_move(current, coord)
+                passes = 0
+                ko = ko_point(state, cx, cy, captured)
+            if cache is not None:
+                stats = cache.stats()
+                print(f"评估缓存: {stats['entries']} 个局面，命中率 {stats['hit_rate']:.1%}")
             current = 'W' if current == 'B' else 'B'
             move_count += 1
 
-        if move_count >= args.board_size * args.board_size * 2:
-            print("达到设定步数上限，结束对局。")
-            break
+        if game_over(state.board, passes):
+            print("\n双方连续 PASS 或已无可下之处，对局结束。")
+        elif move_count >= args.board_size * args.board_size * 2:
+            print("\n达到设定步数上限，结束对局。")
+        else:
+            continue
+        score = area_score(state.board, args.komi)
+        print(format_board(state))
+        print(f"数子结果 (贴目 {args.komi:g}): {format_result(score)}")
+        break
 
 
 if __name__ == '__main__':
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import collections
+import queue
+import threading
+from typing import Iterable, Iterator, Optional, Tuple
+
+import torch
+
+
+Batch = Tuple[torch.Tensor, torch.Tensor]
+
+
+def restarting(loader: Iterable[Batch]) -> Iterator[Batch]:
+    """Iterate ``loader`` forever, starting a new pass whenever it is exhausted."""
+    while True:
+        produced = False
+        for batch in loader:
+            produced = True
+            yield batch
+        if not produced:
+            raise RuntimeError("DataLoader produced no batches")
+
+
+class DevicePrefetcher:
+    """Endless batch iterator that keeps the next ``depth`` batches already on the device.
+
+    On CUDA the host-to-device copies run on a side stream and the compute
+    stream waits on a per-batch event. On other devices a background thread
+    pulls from the loader and moves batches while the main thread computes.
+    """
+
+    def __init__(
+        self,
+        loader: Iterable[Batch],
+        device: torch.device,
+        memory_format: torch.memory_format = torch.contiguous_format,
+        depth: int = 2,
+    ) -> None:
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        self.device = device
+        self.memory_format = memory_format
+        self.depth = depth
+        self._source = restarting(loader)
+        self._use_stream = device.type == 'cuda'
+        if self._use_stream:
+            self._stream = torch.cuda.Stream(device=device)
+            self._ready: collections.deque = collections.deque()
+        else:
+            self._queue: queue.Queue = queue.Queue(maxsize=depth)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._produce, name='device-prefetcher', daemon=True)
+            self._thread.start()
+
+    def __iter__(self) -> 'DevicePrefetcher':
+        return self
+
+    def __next__(self) -> Batch:
+        if self._use_stream:
+            return self._next_from_stream()
+        item = self._queue.get()
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def close(self) -> None:
+        if self._use_stream:
+            self._ready.clear()
+            return
+        self._stop.set()
+        # 清空队列，让阻塞在put上的后台线程能够退出
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._thread.join()
+
+    def _move(self, batch: Batch) -> Batch:
+        inputs, targets = batch
+        inputs = inputs.to(self.device, non_blocking=True, memory_format=self.memory_format)
+        targets = targets.to(self.device, non_blocking=True)
+        return inputs, targets
+
+    def _next_from_stream(self) -> Batch:
+        while len(self._ready) < self.depth:
+            batch = next(self._source)
+            with torch.cuda.stream(self._stream):
+                moved = self._move(batch)
+                event = torch.cuda.Event()
+                event.record(self._stream)
+            self._ready.append((moved, event))
+        (inputs, targets), event = self._ready.popleft()
+        current = torch.cuda.current_stream(self.device)
+        current.wait_event(event)
+        # 张量在副stream上分配，需告知缓存分配器它们也在计算stream上使用
+        inputs.record_stream(current)
+        targets.record_stream(current)
+        return inputs, targets
+
+    def _produce(self) -> None:
+        try:
+            for batch in self._source:
+                moved = self._move(batch)
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(moved, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if self._stop.is_set():
+                    return
+        except BaseException as exc:  # 交给主线程在下一次__next__时抛出
+            self._put_error(exc)
+
+    def _put_error(self, exc: BaseException) -> None:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(exc, timeout=0.1)
+                return
+            except queue.Full:
+                continue
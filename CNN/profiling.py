@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+import torch
+
+
+def synchronize(device: torch.device) -> None:
+    """Block until queued work on ``device`` has finished (no-op on CPU)."""
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    elif device.type == 'mps':
+        torch.mps.synchronize()
+
+
+class PhaseTimer:
+    """Accumulate wall time per training-step phase.
+
+    When disabled, ``phase()`` returns a shared no-op context, so the loop
+    pays neither timing nor device-synchronisation costs.
+    """
+
+    PHASES = ('data', 'h2d', 'forward', 'backward', 'optimizer')
+
+    def __init__(self, device: torch.device, enabled: bool) -> None:
+        self.device = device
+        self.enabled = enabled
+        self._noop = nullcontext()
+        self.reset()
+
+    def reset(self) -> None:
+        self.totals = dict.fromkeys(self.PHASES, 0.0)
+        self.steps = 0
+        self.samples = 0
+        self._start = time.perf_counter()
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return self._noop
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name: str) -> Iterator[None]:
+        # 前后都同步，确保异步kernel的耗时记在真正执行它的阶段
+        synchronize(self.device)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            synchronize(self.device)
+            self.totals[name] += time.perf_counter() - start
+
+    def step(self, batch_size: int) -> None:
+        self.steps += 1
+        self.samples += batch_size
+
+    def summary(self, epoch: int) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self._start
+        steps = max(self.steps, 1)
+        phases = {
+            name: {
+                'sec': total,
+                'ms_per_step': total * 1000.0 / steps,
+                'pct': total * 100.0 / elapsed if elapsed else 0.0,
+            }
+            for name, total in self.totals.items()
+        }
+        return {
+            'epoch': epoch,
+            'steps': self.steps,
+            'samples': self.samples,
+            'elapsed_sec': elapsed,
+            'samples_per_sec': self.samples / elapsed if elapsed else 0.0,
+            'loader_starvation_pct': phases['data']['pct'],
+            'phases': phases,
+        }
+
+
+def append_jsonl(path: Path, record: Dict[str, Any]) -> None:
+    with path.open('a', encoding='utf-8') as fh:
+        fh.write(json.dumps(record) + '\n')
+
+
+def build_trace_profiler(device: torch.device, wait: int, active: int, trace_path: Path) -> torch.profiler.profile:
+    """torch.profiler over ``active`` steps after skipping ``wait``; call ``.step()`` once per step."""
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if device.type == 'cuda':
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(wait=wait, warmup=1, active=active, repeat=1),
+        on_trace_ready=lambda prof: prof.export_chrome_trace(str(trace_path)),
+        record_shapes=True,
+    )
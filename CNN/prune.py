@@ -0,0 +1,162 @@
+"""Structured channel pruning of SimplePolicyNet residual blocks.
+
+Each residual block's inner channels (conv1 outputs / bn1 / conv2 inputs)
+are scored by the magnitude of their bn1 gamma. The weakest channels are cut
+out of the weight tensors, the smaller dense network is optionally fine-tuned
+with ``Trainer``, and the result is saved as a regular checkpoint.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import math
+from pathlib import Path
+from typing import List
+
+import torch
+import torch.nn as nn
+
+from config import TrainingConfig
+from model import ResidualBlock, SimplePolicyNet
+from quantize import latency_ms
+from trainer import Trainer
+from utils import configure_logging, load_policy_model, prepare_output_dir, save_checkpoint
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _round_keep(count: int, width: int, multiple_of: int, min_channels: int) -> int:
+    # 向上取整到multiple_of的倍数，对齐CPU卷积核的向量宽度
+    count = max(count, min_channels)
+    count = int(math.ceil(count / multiple_of) * multiple_of)
+    return min(count, width)
+
+
+def select_channels(
+    model: SimplePolicyNet,
+    ratio: float,
+    scope: str = 'block',
+    multiple_of: int = 8,
+    min_channels: int = 8,
+) -> List[torch.Tensor]:
+    """Indices of the inner channels to keep in each block, in original order."""
+    scores = [block.bn1.weight.detach().abs() for block in model.blocks]
+    if scope == 'global':
+        # 所有块共用一个阈值，不重要的块会被剪得更多
+        all_scores = torch.cat(scores)
+        num_pruned = int(all_scores.numel() * ratio)
+        threshold = all_scores.sort().values[num_pruned - 1] if num_pruned > 0 else -1.0
+        counts = [int((s > threshold).sum()) for s in scores]
+    else:
+        counts = [s.numel() - int(s.numel() * ratio) for s in scores]
+    keep = []
+    for block_scores, count in zip(scores, counts):
+        count = _round_keep(count, block_scores.numel(), multiple_of, min_channels)
+        keep.append(block_scores.topk(count).indices.sort().values)
+    return keep
+
+
+def _prune_block(block: ResidualBlock, keep: torch.Tensor) -> ResidualBlock:
+    pruned = ResidualBlock(block.conv1.in_channels, keep.numel())
+    pruned.conv1.weight.data.copy_(block.conv1.weight.data[keep])
+    for name in ('weight', 'bias', 'running_mean', 'running_var'):
+        getattr(pruned.bn1, name).data.copy_(getattr(block.bn1, name).data[keep])
+    pruned.bn1.num_batches_tracked.copy_(block.bn1.num_batches_tracked)
+    pruned.conv2.weight.data.copy_(block.conv2.weight.data[:, keep])
+    pruned.bn2.load_state_dict(block.bn2.state_dict())
+    return pruned
+
+
+def prune_model(model: SimplePolicyNet, keep: List[torch.Tensor]) -> SimplePolicyNet:
+    """Dense copy of ``model`` containing only the ``keep`` channels of each block."""
+    model = model.cpu().eval()
+    pruned = SimplePolicyNet(
+        board_size=model.board_size,
+        in_channels=model.stem[0].in_channels,
+        channels=model.channels,
+        num_blocks=model.num_blocks,
+        head=model.head,
+        block_channels=[k.numel() for k in keep],
+    )
+    # 主干和策略头不变，直接拷贝；残差块换成剪枝后的版本
+    state = {k: v for k, v in model.state_dict().items() if not k.startswith('blocks.')}
+    pruned.load_state_dict(state, strict=False)
+    pruned.blocks = nn.ModuleList([_prune_block(b, k) for b, k in zip(model.blocks, keep)])
+    return pruned.eval()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Prune residual-block channels of a policy checkpoint and fine-tune it')
+    parser.add_argument('--checkpoint', required=True)
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--board-size', type=int, default=19)
+    parser.add_argument('--ratio', type=float, default=0.5, help='Fraction of block channels to remove')
+    parser.add_argument('--scope', choices=['block', 'global'], default='block', help='Rank channels per block or across all blocks')
+    parser.add_argument('--multiple-of', type=int, default=8, help='Round kept channel counts up to this multiple')
+    parser.add_argument('--min-channels', type=int, default=8, help='Never keep fewer channels than this in a block')
+    parser.add_argument('--data-paths', nargs='*', default=None, help='.data files for fine-tuning (default: Training_data)')
+    parser.add_argument('--epochs', type=int, default=1, help='Fine-tuning epochs (0 skips fine-tuning)')
+    parser.add_argument('--steps-per-epoch', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--num-workers', type=int, default=4)
+    parser.add_argument('--learning-rate', type=float, default=0.005)
+    parser.add_argument('--device', type=str, default=None)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    output_dir = prepare_output_dir(Path(args.output_dir).expanduser())
+    configure_logging(output_dir / 'train.log')
+    device = args.device or ('cuda' if torch.cuda.is_available() else 'cpu')
+
+    model, features = load_policy_model(Path(args.checkpoint).expanduser(), args.board_size, torch.device('cpu'))
+    keep = select_channels(model, args.ratio, args.scope, args.multiple_of, args.min_channels)
+    pruned = prune_model(model, keep)
+    example = torch.zeros(1, features.num_planes, args.board_size, args.board_size)
+    LOGGER.info(
+        "Block widths %s -> %s, params %d -> %d, CPU batch-1 latency %.2f ms -> %.2f ms",
+        model.block_channels,
+        pruned.block_channels,
+        sum(p.numel() for p in model.parameters()),
+        sum(p.numel() for p in pruned.parameters()),
+        latency_ms(model, example),
+        latency_ms(pruned, example),
+    )
+    checkpoint = {
+        'epoch': 0,
+        'model': pruned.state_dict(),
+        'features': features.to_dict(),
+        'arch': pruned.arch,
+    }
+    save_checkpoint(checkpoint, output_dir / 'checkpoint_pruned.pt')
+    LOGGER.info("Pruned model written to %s", output_dir / 'checkpoint_pruned.pt')
+    if args.epochs <= 0:
+        return
+
+    cfg = TrainingConfig(
+        board_size=args.board_size,
+        data_paths=[Path(p) for p in args.data_paths] if args.data_paths else None,
+        output_dir=output_dir,
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        epochs=args.epochs,
+        steps_per_epoch=args.steps_per_epoch,
+        learning_rate=args.learning_rate,
+        device=device,
+        history_planes=features.history,
+        liberty_planes=features.liberties,
+        policy_head=pruned.head,
+        channels=pruned.channels,
+        num_blocks=pruned.num_blocks,
+        block_channels=pruned.block_channels,
+    )
+    trainer = Trainer(cfg)
+    # Trainer按cfg搭好同样结构的网络，这里只换入剪枝后的权重
+    trainer.model.load_state_dict(pruned.state_dict())
+    trainer.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""Post-training int8 quantization of a SimplePolicyNet checkpoint for CPU play."""
+from __future__ import annotations
+
+import argparse
+import copy
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import torch
+import torch.ao.quantization as tq
+import torch.nn as nn
+
+from artifact import save_artifact
+from config import TrainingConfig
+from datasets import DatasetConfig, FeatureSet, build_dataloader
+from metrics import topk_correct
+from model import ResidualBlock, SimplePolicyNet
+from utils import load_policy_model
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class QuantizableResidualBlock(nn.Module):
+    def __init__(self, block: ResidualBlock) -> None:
+        super().__init__()
+        self.conv1 = block.conv1
+        self.bn1 = block.bn1
+        self.relu1 = nn.ReLU()
+        self.conv2 = block.conv2
+        self.bn2 = block.bn2
+        # 残差相加需要FloatFunctional才能在int8下执行
+        self.skip = nn.quantized.FloatFunctional()
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        out = self.relu1(self.bn1(self.conv1(x)))
+        out = self.bn2(self.conv2(out))
+        return self.skip.add_relu(out, x)
+
+    def fuse(self) -> None:
+        tq.fuse_modules(self, [['conv1', 'bn1', 'relu1'], ['conv2', 'bn2']], inplace=True)
+
+
+class QuantizablePolicyNet(nn.Module):
+    """SimplePolicyNet rearranged for eager-mode quantization.
+
+    The conv tower runs statically quantized with BatchNorm folded into the
+    convolutions; the linear layers (``fc`` / ``pass_fc``) take float inputs
+    and are dynamically quantized.
+    """
+
+    def __init__(self, model: SimplePolicyNet) -> None:
+        super().__init__()
+        model = copy.deepcopy(model).cpu().eval()
+        self.head = model.head
+        self.quant = tq.QuantStub()
+        self.dequant = tq.DeQuantStub()
+        self.stem = model.stem
+        self.blocks = nn.ModuleList([QuantizableResidualBlock(b) for b in model.blocks])
+        if self.head == 'fc':
+            self.policy_head = model.policy_head
+            self.fc = model.fc
+        else:
+            self.policy_conv = model.policy_conv
+            self.pass_fc = model.pass_fc
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        out = self.stem(self.quant(x))
+        for block in self.blocks:
+            out = block(out)
+        if self.head == 'fc':
+            out = self.dequant(self.policy_head(out))
+            return self.fc(torch.flatten(out, 1))
+        board_logits = torch.flatten(self.dequant(self.policy_conv(out)), 1)
+        pass_logit = self.pass_fc(self.dequant(out).mean(dim=(2, 3)))
+        return torch.cat([board_logits, pass_logit], dim=1)
+
+    def fuse(self) -> None:
+        tq.fuse_modules(self.stem, [['0', '1', '2']], inplace=True)
+        for block in self.blocks:
+            block.fuse()
+        if self.head == 'fc':
+            tq.fuse_modules(self.policy_head, [['0', '1', '2']], inplace=True)
+
+
+def default_engine() -> str:
+    engines = torch.backends.quantized.supported_engines
+    for engine in ('x86', 'fbgemm', 'qnnpack'):
+        if engine in engines:
+            return engine
+    raise RuntimeError("No quantized engine available in this PyTorch build")
+
+
+def quantize_model(model: SimplePolicyNet, calibration_batches: List[torch.Tensor], engine: str) -> nn.Module:
+    torch.backends.quantized.engine = engine
+    qmodel = QuantizablePolicyNet(model).eval()
+    qmodel.fuse()
+    qmodel.qconfig = tq.get_default_qconfig(engine)
+    # 全连接层不做静态量化，稍后统一做动态量化
+    for name in ('fc', 'pass_fc'):
+        if hasattr(qmodel, name):
+            getattr(qmodel, name).qconfig = None
+    tq.prepare(qmodel, inplace=True)
+    with torch.no_grad():
+        for inputs in calibration_batches:
+            qmodel(inputs)
+    tq.convert(qmodel, inplace=True)
+    return tq.quantize_dynamic(qmodel, {nn.Linear}, dtype=torch.qint8)
+
+
+def evaluate(model: nn.Module, batches: List[Dict[str, torch.Tensor]]) -> Dict[str, float]:
+    correct = torch.zeros(2)
+    total = 0
+    with torch.no_grad():
+        for batch in batches:
+            logits = model(batch['inputs'])
+            correct += topk_correct(logits, batch['targets'], topk=(1, 5))
+            total += batch['targets'].size(0)
+    acc1, acc5 = (correct * 100.0 / max(total, 1)).tolist()
+    return {'acc1': acc1, 'acc5': acc5, 'samples': total}
+
+
+def latency_ms(model: nn.Module, example: torch.Tensor, repeat: int = 50) -> float:
+    with torch.no_grad():
+        for _ in range(5):
+            model(example)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            model(example)
+    return (time.perf_counter() - start) * 1000.0 / repeat
+
+
+def collect_batches(
+    data_paths: List[Path],
+    board_size: int,
+    features: FeatureSet,
+    mode: str,
+    batch_size: int,
+    num_batches: int,
+) -> List[Dict[str, torch.Tensor]]:
+    # 校准用训练划分，评估用验证划分，两者不重叠
+    cfg = DatasetConfig(board_size=board_size, data_files=data_paths, val_ratio=0.1, features=features)
+    loader = build_dataloader(cfg, mode=mode, batch_size=batch_size, num_workers=0)
+    batches = []
+    for inputs, targets in loader:
+        batches.append({'inputs': inputs, 'targets': targets})
+        if len(batches) >= num_batches:
+            break
+    return batches
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Quantize a trained policy checkpoint to int8 for CPU play')
+    parser.add_argument('--checkpoint', required=True)
+    parser.add_argument('--output', required=True, help='Path of the int8 TorchScript artifact')
+    parser.add_argument('--board-size', type=int, default=19)
+    parser.add_argument('--data-paths', nargs='*', default=None, help='.data files (default: Training_data)')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--calib-batches', type=int, default=32, help='Batches of positions used for calibration')
+    parser.add_argument('--eval-batches', type=int, default=50, help='Held-out batches for the accuracy comparison')
+    parser.add_argument('--engine', default=None, help='Quantized engine (x86, fbgemm, qnnpack); default auto')
+    return parser.parse_args()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    args = parse_args()
+    device = torch.device('cpu')
+    model, features = load_policy_model(Path(args.checkpoint).expanduser(), args.board_size, device)
+    data_paths = TrainingConfig(
+        data_paths=[Path(p) for p in args.data_paths] if args.data_paths else None
+    ).resolve_data_paths()
+
+    calibration = collect_batches(data_paths, args.board_size, features, 'train', args.batch_size, args.calib_batches)
+    held_out = collect_batches(data_paths, args.board_size, features, 'val', args.batch_size, args.eval_batches)
+    if not calibration:
+        raise SystemExit("No calibration positions found")
+
+    engine = args.engine or default_engine()
+    qmodel = quantize_model(model, [b['inputs'] for b in calibration], engine)
+
+    example = torch.zeros(1, features.num_planes, args.board_size, args.board_size)
+    scripted = torch.jit.trace(qmodel, example)
+    output = Path(args.output).expanduser()
+    save_artifact(
+        scripted,
+        output,
+        {
+            'board_size': args.board_size,
+            'features': features.to_dict(),
+            'head': model.head,
+            'quantized': True,
+            'quantized_engine': engine,
+        },
+    )
+    LOGGER.info("Int8 model written to %s", output)
+
+    if held_out:
+        fp32 = evaluate(model, held_out)
+        int8 = evaluate(scripted, held_out)
+        LOGGER.info(
+            "Held-out %d positions: fp32 acc@1 %.2f%% acc@5 %.2f%% | int8 acc@1 %.2f%% acc@5 %.2f%% "
+            "| delta acc@1 %+.2f acc@5 %+.2f",
+            fp32['samples'],
+            fp32['acc1'],
+            fp32['acc5'],
+            int8['acc1'],
+            int8['acc5'],
+            int8['acc1'] - fp32['acc1'],
+            int8['acc5'] - fp32['acc5'],
+        )
+    else:
+        LOGGER.warning("No held-out positions available, skipping accuracy comparison")
+    LOGGER.info(
+        "Batch-1 latency: fp32 %.2f ms, int8 %.2f ms",
+        latency_ms(model, example),
+        latency_ms(scripted, example),
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+"""Minimal inference runtime for the play front-ends.
+
+Only torch, numpy and the board engine are imported up front. An exported
+artifact (``export.py`` / ``quantize.py``) is loaded as a TorchScript graph;
+the training stack is imported lazily, and only for a full training checkpoint.
+``RemotePolicy`` talks to a shared ``inference_server.py`` instead of holding
+a model in this process.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from artifact import is_artifact, load_artifact
+from board import Color, FeatureSet, GoGameState
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def load_policy(
+    path: Path,
+    board_size: int,
+    device: torch.device,
+    channels_last: bool = False,
+    compile_model: bool = False,
+) -> Tuple[nn.Module, FeatureSet]:
+    """Load an exported artifact or, failing that, a training checkpoint."""
+    if is_artifact(path):
+        model, meta = load_artifact(path, device)
+        if meta.get('head') == 'fc' and meta.get('board_size') != board_size:
+            raise ValueError(f"{path} was exported for board size {meta.get('board_size')}, not {board_size}")
+        return model, FeatureSet.from_dict(meta.get('features'))
+    # 训练checkpoint需要完整的模型定义，按需导入
+    from utils import load_policy_model
+
+    return load_policy_model(path, board_size, device, channels_last=channels_last, compile_model=compile_model)
+
+
+# 帧格式：两个大端uint32(头部长度、负载长度)，JSON头部，原始字节负载
+_FRAME = struct.Struct('!II')
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    while size:
+        n = sock.recv_into(view, size)
+        if n == 0:
+            raise ConnectionError("Connection closed by peer")
+        view = view[n:]
+        size -= n
+    return bytes(buf)
+
+
+def send_frame(sock: socket.socket, header: Dict[str, Any], payload: bytes = b'') -> None:
+    head = json.dumps(header).encode('utf-8')
+    sock.sendall(_FRAME.pack(len(head), len(payload)) + head + payload)
+
+
+def recv_frame(sock: socket.socket) -> Tuple[Dict[str, Any], bytes]:
+    head_len, payload_len = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    header = json.loads(_recv_exact(sock, head_len).decode('utf-8'))
+    return header, _recv_exact(sock, payload_len) if payload_len else b''
+
+
+def connect(address: str) -> socket.socket:
+    """Connect to ``unix:/path/to.sock`` or ``host:port``."""
+    if address.startswith('unix:'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address[len('unix:'):])
+        return sock
+    host, _, port = address.rpartition(':')
+    sock = socket.create_connection((host or '127.0.0.1', int(port)))
+    # 请求很小且一问一答，关闭Nagle避免额外延迟
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+class RemotePolicy:
+    """Client of ``inference_server.py``; usable wherever a local model is passed to ``policy_probs``."""
+
+    def __init__(self, address: str) -> None:
+        self.address = address
+        self._sock = connect(address)
+        # 一个连接上同时只有一个请求在途
+        self._lock = threading.Lock()
+        info, _ = self._request({'op': 'info'})
+        self.board_size: int = info['board_size']
+        self.features = FeatureSet.from_dict(info['features'])
+        self.num_actions: int = info['num_actions']
+
+    def _request(self, header: Dict[str, Any], payload: bytes = b'') -> Tuple[Dict[str, Any], bytes]:
+        with self._lock:
+            send_frame(self._sock, header, payload)
+            reply, data = recv_frame(self._sock)
+        if 'error' in reply:
+            raise RuntimeError(f"Inference server {self.address}: {reply['error']}")
+        return reply, data
+
+    def infer(
+        self,
+        planes: np.ndarray,
+        legal: Optional[np.ndarray] = None,
+        topk: int = 0,
+    ) -> Tuple[np.ndarray, List[List[Tuple[int, float]]]]:
+        """Probabilities for ``planes`` of shape (N, C, S, S) plus the top-k legal moves of each.
+
+        ``legal`` is an optional (N, num_actions) boolean mask; without it the
+        server masks occupied points only.
+        """
+        count = planes.shape[0]
+        payload = planes.astype(np.uint8, copy=False).tobytes()  # 特征平面都是0/1
+        if legal is not None:
+            payload += np.packbits(legal.astype(bool, copy=False), axis=1).tobytes()
+        reply, data = self._request(
+            {'op': 'infer', 'count': count, 'topk': topk, 'legal': legal is not None},
+            payload,
+        )
+        probs = np.frombuffer(data, dtype=np.float32).reshape(count, self.num_actions)
+        return probs, [[(int(i), float(p)) for i, p in row] for row in reply['topk']]
+
+    def stats(self) -> Dict[str, Any]:
+        return self._request({'op': 'stats'})[0]
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+Policy = Union[nn.Module, RemotePolicy]
+
+
+def _transform(planes: np.ndarray, t: int) -> np.ndarray:
+    """One of the 8 board symmetries applied to the last two axes."""
+    if t >= 4:
+        planes = np.flip(planes, -1)
+    return np.rot90(planes, t % 4, axes=(-2, -1))
+
+
+def _untransform(planes: np.ndarray, t: int) -> np.ndarray:
+    planes = np.rot90(planes, -(t % 4), axes=(-2, -1))
+    return np.flip(planes, -1) if t >= 4 else planes
+
+
+class EvalCache:
+    """LRU cache of policy outputs keyed by the exact input planes.
+
+    The key is the bit-packed feature planes, which covers stones, side to
+    move, history and liberty planes. With ``symmetries`` the 8 rotations and
+    reflections of a position share one entry, stored in a canonical
+    orientation and mapped back on lookup.
+    """
+
+    def __init__(self, max_entries: int = 50000, symmetries: bool = False) -> None:
+        self.max_entries = max_entries
+        self.symmetries = symmetries
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[bytes, np.ndarray]' = OrderedDict()
+        # MCTS工作线程会并发查询
+        self._lock = threading.Lock()
+
+    def _key(self, planes: np.ndarray) -> Tuple[bytes, int]:
+        if not self.symmetries:
+            return np.packbits(planes.astype(bool)).tobytes(), 0
+        keys = [np.packbits(_transform(planes, t).astype(bool)).tobytes() for t in range(8)]
+        t = min(range(8), key=keys.__getitem__)
+        return keys[t], t
+
+    @staticmethod
+    def _map_probs(probs: np.ndarray, size: int, t: int, inverse: bool) -> np.ndarray:
+        if t == 0:
+            return probs
+        points = size * size
+        board = probs[:points].reshape(size, size)
+        board = _untransform(board, t) if inverse else _transform(board, t)
+        return np.concatenate([board.ravel(), probs[points:]])
+
+    def probs(self, planes: np.ndarray, evaluate: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """Probabilities for stacked ``planes``; only cache misses are passed to ``evaluate``."""
+        size = planes.shape[-1]
+        keys = [self._key(p) for p in planes]
+        out: List[Optional[np.ndarray]] = [None] * len(planes)
+        with self._lock:
+            for i, (key, t) in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    out[i] = self._map_probs(entry, size, t, inverse=True)
+            missing = [i for i, row in enumerate(out) if row is None]
+            self.hits += len(planes) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            fresh = evaluate(planes[missing])
+            with self._lock:
+                for i, row in zip(missing, fresh):
+                    key, t = keys[i]
+                    self._entries[key] = self._map_probs(np.array(row), size, t, inverse=False)
+                    self._entries.move_to_end(key)
+                    out[i] = row
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return np.stack(out)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def planes_probs(model: Policy, planes: np.ndarray, device: torch.device) -> np.ndarray:
+    """Policy softmax for stacked feature planes (N, C, S, S), shape (N, num_actions)."""
+    if isinstance(model, RemotePolicy):
+        return model.infer(planes)[0]
+    tensor = torch.from_numpy(planes).to(device).float()
+    with torch.no_grad():
+        logits = model(tensor)
+        return torch.softmax(logits.float(), dim=1).cpu().numpy()
+
+
+def batch_policy_probs(
+    model: Policy,
+    states: Sequence[GoGameState],
+    colors: Sequence[Color],
+    device: torch.device,
+    cache: Optional[EvalCache] = None,
+) -> np.ndarray:
+    """Policy softmax for several positions in one forward pass, shape (N, num_actions)."""
+    planes = np.stack([state.make_features(color) for state, color in zip(states, colors)])
+    if cache is not None:
+        return cache.probs(planes, lambda missing: planes_probs(model, missing, device))
+    return planes_probs(model, planes, device)
+
+
+def policy_probs(
+    model: Policy,
+    state: GoGameState,
+    color: Color,
+    device: torch.device,
+    cache: Optional[EvalCache] = None,
+) -> np.ndarray:
+    """Softmax over all policy outputs (``size*size`` points, plus pass for conv heads)."""
+    return batch_policy_probs(model, [state], [color], device, cache)[0]
+
+
+class _Pending:
+    __slots__ = ('planes', 'legal', 'topk', 'done', 'probs', 'top', 'error')
+
+    def __init__(self, planes: np.ndarray, legal: Optional[np.ndarray], topk: int) -> None:
+        self.planes = planes
+        self.legal = legal
+        self.topk = topk
+        self.done = threading.Event()
+        self.probs: Optional[np.ndarray] = None
+        self.top: List[List[Tuple[int, float]]] = []
+        self.error: Optional[str] = None
+
+
+class DynamicBatcher:
+    """Merge concurrent inference requests from many threads into batched forward passes."""
+
+    def __init__(
+        self,
+        model: Policy,
+        device: torch.device,
+        board_size: int,
+        max_batch: int = 64,
+        max_wait_ms: float = 2.0,
+    ) -> None:
+        self.model = model
+        self.device = device
+        self.board_size = board_size
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.positions = 0
+        self._queue: 'queue.Queue[Optional[_Pending]]' = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='dynamic-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        planes: np.ndarray,
+        legal: Optional[np.ndarray] = None,
+        topk: int = 0,
+    ) -> Tuple[np.ndarray, List[List[Tuple[int, float]]]]:
+        """Block until ``planes`` (N, C, S, S) have been evaluated."""
+        pending = _Pending(planes, legal, topk)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise RuntimeError(pending.error)
+        return pending.probs, pending.top
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _gather(self, first: _Pending) -> Tuple[List[_Pending], bool]:
+        batch = [first]
+        count = len(first.planes)
+        deadline = time.perf_counter() + self.max_wait
+        while count < self.max_batch:
+            try:
+                # 已在排队的请求总是并入本批，之后才按max_wait等待新请求
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            count += len(item.planes)
+        return batch, False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stop = self._gather(first)
+            try:
+                self._evaluate(batch)
+            except Exception as exc:  # 出错时通知等待中的所有客户端，服务继续运行
+                LOGGER.exception("Batch of %d requests failed", len(batch))
+                for pending in batch:
+                    pending.error = str(exc)
+            for pending in batch:
+                pending.done.set()
+
+    def _evaluate(self, batch: List[_Pending]) -> None:
+        points = self.board_size * self.board_size
+        planes = np.concatenate([p.planes for p in batch])
+        probs = planes_probs(self.model, planes, self.device)
+        self.batches += 1
+        self.positions += planes.shape[0]
+
+        topk = min(max(p.topk for p in batch), probs.shape[1])
+        if topk > 0:
+            # 默认只屏蔽已有棋子的点；客户端可以传入考虑了打劫/自杀的完整掩码
+            legal = np.ones(probs.shape, dtype=bool)
+            legal[:, :points] = (planes[:, 0] + planes[:, 1] == 0).reshape(len(planes), points)
+            offset = 0
+            for p in batch:
+                if p.legal is not None:
+                    legal[offset:offset + len(p.planes)] = p.legal
+                offset += len(p.planes)
+            masked = np.where(legal, probs, -1.0)
+            top_idx = np.argpartition(-masked, topk - 1, axis=1)[:, :topk]
+            top_val = np.take_along_axis(masked, top_idx, axis=1)
+            order = np.argsort(-top_val, axis=1)
+            top_idx = np.take_along_axis(top_idx, order, axis=1).tolist()
+            top_val = np.take_along_axis(top_val, order, axis=1).tolist()
+
+        offset = 0
+        for p in batch:
+            rows = slice(offset, offset + len(p.planes))
+            p.probs = probs[rows]
+            if p.topk > 0:
+                p.top = [
+                    [(i, v) for i, v in zip(idx[:p.topk], val[:p.topk]) if v >= 0.0]
+                    for idx, val in zip(top_idx[rows], top_val[rows])
+                ]
+            offset += len(p.planes)
@@ -0,0 +1,261 @@
+"""Self-play data generator writing games in the ``.data`` training format.
+
+Each worker process keeps ``--parallel`` games in flight and advances them in
+lockstep, so every ply is one forward pass over all games (or, with
+``--mcts-visits``, one pass per search round over the leaves of all trees).
+Moves are sampled at ``--temperature`` for the first ``--temperature-moves``
+plies and at ``--final-temperature`` afterwards. A game ends after two
+passes or when neither side has a move left outside its own eyes. Finished
+games are appended to the worker's current shard, one JSON move list per
+line; a pass is written as ``{"B": []}`` so replays keep every ply. A shard is renamed from ``.tmp`` to ``.data`` once it holds
+``--shard-games`` games, so a reader only ever sees complete files.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from arena import play_policy_move
+from board import Color, GoGameState
+from mcts import MCTS, ko_point, search_many
+from runtime import EvalCache, Policy, RemotePolicy, batch_policy_probs, load_policy
+from scoring import eye_mask, has_moves
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ShardWriter:
+    """Appends games to ``<prefix>_<index>.tmp`` and publishes it as ``.data`` every ``games_per_shard`` games."""
+
+    def __init__(self, output_dir: Path, prefix: str, games_per_shard: int) -> None:
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.games_per_shard = games_per_shard
+        self.index = 0
+        self.games = 0
+        self._fh = None
+        self.published: List[Path] = []
+
+    def _path(self, suffix: str) -> Path:
+        return self.output_dir / f'{self.prefix}_{self.index:05d}{suffix}'
+
+    def write(self, moves: List[Dict[str, List[int]]]) -> None:
+        if self._fh is None:
+            self._fh = self._path('.tmp').open('w', encoding='utf-8')
+        self._fh.write(json.dumps(moves) + '\n')
+        self.games += 1
+        if self.games >= self.games_per_shard:
+            self.rotate()
+
+    def rotate(self) -> None:
+        if self._fh is None:
+            return
+        self._fh.close()
+        self._fh = None
+        # 写完后再改名，训练端按*.data扫描时不会读到半个分片
+        final = self._path('.data')
+        os.replace(self._path('.tmp'), final)
+        self.published.append(final)
+        self.index += 1
+        self.games = 0
+
+    def close(self) -> None:
+        self.rotate()
+
+
+class SelfPlayGame:
+    __slots__ = ('state', 'to_play', 'ko', 'passes', 'ply', 'moves', 'engine')
+
+    def __init__(self, state: GoGameState, engine: Optional[MCTS]) -> None:
+        self.state = state
+        self.to_play: Color = 'B'
+        self.ko: Optional[Tuple[int, int]] = None
+        self.passes = 0  # 连续pass次数，用于判断终局
+        self.ply = 0  # 已走的总手数，包括全部pass
+        self.moves: List[Dict[str, List[int]]] = []
+        self.engine = engine
+
+
+def _play_ply(
+    games: List[SelfPlayGame],
+    model: Policy,
+    device: torch.device,
+    cache: Optional[EvalCache],
+    args: argparse.Namespace,
+    rng: np.random.Generator,
+) -> None:
+    """Advance every game by one move."""
+    if args.mcts_visits > 0:
+        for game in games:
+            game.engine.set_position(game.state, game.to_play, game.ko, game.passes)
+        search_many([game.engine for game in games], args.mcts_visits)
+    else:
+        probs = batch_policy_probs(model, [g.state for g in games], [g.to_play for g in games], device, cache)
+
+    for i, game in enumerate(games):
+        color = game.to_play
+        temperature = args.temperature if game.ply < args.temperature_moves else args.final_temperature
+        if args.mcts_visits > 0:
+            value = 1 if color == 'B' else -1
+            coord = game.engine.sample_move(temperature, rng, exclude=eye_mask(game.state.board, value))
+            captured = game.state.play_move(color, coord) if coord is not None else []
+        else:
+            coord, captured = play_policy_move(game.state, color, probs[i], game.ko, temperature, rng)
+        if coord is None:
+            # pass记为空坐标，训练数据加载时跳过，但重放时手数和轮次不会错位
+            game.passes += 1
+            game.ko = None
+            game.moves.append({color: []})
+        else:
+            game.passes = 0
+            game.ko = ko_point(game.state, coord[0], coord[1], captured)
+            game.moves.append({color: [coord[0] + 1, coord[1] + 1]})
+        game.to_play = 'W' if color == 'B' else 'B'
+        game.ply += 1
+
+
+def _worker_main(worker_id: int, num_games: int, args: argparse.Namespace, progress: mp.Queue) -> None:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    torch.set_num_threads(args.torch_threads)
+    device = torch.device(args.device)
+    if args.server:
+        model: Policy = RemotePolicy(args.server)
+        features = model.features
+    else:
+        model, features = load_policy(Path(args.checkpoint).expanduser(), args.board_size, device)
+    rng = np.random.default_rng(args.seed + worker_id)
+    cache = EvalCache(args.cache_size) if args.cache_size > 0 else None
+    writer = ShardWriter(Path(args.output_dir), f'{args.prefix}_w{worker_id:02d}', args.shard_games)
+    max_moves = args.max_moves or 2 * args.board_size * args.board_size
+
+    def new_game() -> SelfPlayGame:
+        engine = None
+        if args.mcts_visits > 0:
+            engine = MCTS(model, device, c_puct=args.c_puct, batch_size=args.mcts_batch, komi=args.komi, cache=cache)
+        return SelfPlayGame(GoGameState(args.board_size, features), engine)
+
+    started = 0
+    active: List[SelfPlayGame] = []
+    try:
+        while started < num_games or active:
+            while started < num_games and len(active) < args.parallel:
+                active.append(new_game())
+                started += 1
+            _play_ply(active, model, device, cache, args, rng)
+            boards = np.stack([game.state.board for game in active])
+            settled = ~has_moves(boards, 1) & ~has_moves(boards, -1)
+            still_active = []
+            for game, no_moves in zip(active, settled):
+                if game.passes >= 2 or no_moves or game.ply >= max_moves:
+                    writer.write(game.moves)
+                    progress.put((worker_id, game.ply))
+                else:
+                    still_active.append(game)
+            active = still_active
+    finally:
+        writer.close()
+    progress.put((worker_id, None))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Generate training games by self-play')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--checkpoint', help='Checkpoint or exported artifact (loaded by every worker)')
+    source.add_argument('--server', help='Share one inference_server.py between workers (unix:/path.sock or host:port)')
+    parser.add_argument('--output-dir', required=True, help='Directory for the .data shards')
+    parser.add_argument('--prefix', default=None, help='Shard file prefix (default selfplay_<timestamp>)')
+    parser.add_argument('--board-size', type=int, default=19)
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--games', type=int, default=1000, help='Total games over all workers')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // 4), help='Worker processes')
+    parser.add_argument('--torch-threads', type=int, default=None, help='Intra-op threads per worker (default cpus/workers)')
+    parser.add_argument('--parallel', type=int, default=64, help='Games in flight per worker, i.e. the batch size')
+    parser.add_argument('--shard-games', type=int, default=500, help='Games per output shard')
+    parser.add_argument('--temperature', type=float, default=1.0)
+    parser.add_argument('--temperature-moves', type=int, default=30, help='Plies played at --temperature')
+    parser.add_argument('--final-temperature', type=float, default=0.25, help='Temperature after --temperature-moves')
+    parser.add_argument('--max-moves', type=int, default=None, help='End the game after this many plies (default 2*size^2)')
+    parser.add_argument('--mcts-visits', type=int, default=0, help='Search each move with this many visits (0 = raw policy)')
+    parser.add_argument('--mcts-batch', type=int, default=8, help='Leaves per tree per search round')
+    parser.add_argument('--c-puct', type=float, default=1.5)
+    parser.add_argument('--komi', type=float, default=7.5)
+    parser.add_argument('--cache-size', type=int, default=50000, help='Evaluation cache entries per worker (0 disables)')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    args = parse_args()
+    args.prefix = args.prefix or time.strftime('selfplay_%Y%m%d_%H%M%S')
+    args.torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+    Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+
+    # spawn而不是fork：torch的线程池在fork后的子进程里不可用
+    ctx = mp.get_context('spawn')
+    progress = ctx.Queue()
+    shares = [args.games // args.workers + (i < args.games % args.workers) for i in range(args.workers)]
+    workers = [
+        ctx.Process(target=_worker_main, args=(i, share, args, progress), name=f'selfplay-{i}')
+        for i, share in enumerate(shares)
+        if share > 0
+    ]
+    for worker in workers:
+        worker.start()
+    LOGGER.info(
+        "Started %d workers (%d threads, %d games in flight each) writing to %s",
+        len(workers),
+        args.torch_threads,
+        args.parallel,
+        args.output_dir,
+    )
+
+    start = time.perf_counter()
+    last_log = start
+    games = moves = 0
+    running = len(workers)
+    while running:
+        try:
+            worker_id, num_moves = progress.get(timeout=1.0)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break  # 有worker异常退出，没来得及报告完成
+            continue
+        if num_moves is None:
+            running -= 1
+            continue
+        games += 1
+        moves += num_moves
+        now = time.perf_counter()
+        if now - last_log >= 10.0 or games == args.games:
+            elapsed = now - start
+            LOGGER.info(
+                "%d/%d games, %.2f games/s, %.0f moves/s, avg length %.0f",
+                games,
+                args.games,
+                games / elapsed,
+                moves / elapsed,
+                moves / games,
+            )
+            last_log = now
+    for worker in workers:
+        worker.join()
+    failed = [worker.name for worker in workers if worker.exitcode != 0]
+    if failed:
+        raise SystemExit(f"self-play workers failed: {', '.join(failed)}")
+    LOGGER.info("Wrote %d games (%d moves) in %.1fs", games, moves, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
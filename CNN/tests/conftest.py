@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 模块按脚本目录导入（from board import ...），测试时把CNN目录加入路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,25 @@
+import torch
+
+from arena import run_arena
+from board import FeatureSet
+from model import SimplePolicyNet
+
+
+def always_pass_model(size: int) -> SimplePolicyNet:
+    model = SimplePolicyNet(board_size=size, in_channels=FeatureSet().num_planes, channels=8, num_blocks=1, head='conv')
+    with torch.no_grad():
+        model.pass_fc.weight.zero_()
+        model.pass_fc.bias.fill_(100.0)
+    return model.eval()
+
+
+def test_game_ends_on_second_pass_by_either_side():
+    model = always_pass_model(5)
+    # 第二局A执白：第二次pass由A(side 0)走出，之后B不能再落子
+    games = run_arena(
+        (model, model), (FeatureSet(), FeatureSet()), 5, torch.device('cpu'), num_games=2, parallel=2, temperature=0.0
+    )
+
+    assert [game.moves for game in games] == [2, 2]
+    assert all(game.passes == 2 for game in games)
+    assert [game.score for game in games] == [-7.5, -7.5]
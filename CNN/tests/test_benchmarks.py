@@ -0,0 +1,37 @@
+import torch
+
+from benchmarks.bench_data import _throughput
+from benchmarks.common import BenchResult, compare_to_baseline, save_results
+
+
+def test_compare_to_baseline_flags_only_regressions(tmp_path):
+    baseline = tmp_path / 'baseline.json'
+    save_results([
+        BenchResult('train_samples_per_s', 100.0, 'samples/s'),
+        BenchResult('inference_p50_ms', 10.0, 'ms', higher_is_better=False),
+        BenchResult('feature_us', 5.0, 'us', higher_is_better=False),
+    ], baseline)
+
+    regressions = compare_to_baseline([
+        BenchResult('train_samples_per_s', 80.0, 'samples/s'),
+        BenchResult('inference_p50_ms', 10.5, 'ms', higher_is_better=False),
+        BenchResult('feature_us', 4.0, 'us', higher_is_better=False),
+        BenchResult('new_metric', 1.0, 'x'),
+    ], baseline, tolerance=0.1)
+
+    # 吞吐下降20%超出容差；延迟上升5%在容差内；变快和基线里没有的指标都不算
+    assert len(regressions) == 1
+    assert regressions[0].startswith('train_samples_per_s')
+
+
+def test_throughput_skips_warmup_batches():
+    consumed = []
+
+    def loader():
+        for index in range(10):
+            consumed.append(index)
+            yield torch.zeros(4, 1), torch.zeros(4)
+
+    assert _throughput(loader(), max_batches=3, warmup_batches=2) > 0
+    # 2个预热batch加3个计时batch，不多读
+    assert consumed == [0, 1, 2, 3, 4]
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from board import FeatureSet, GoGameState
+
+
+def test_rejected_suicide_keeps_full_history_buffer():
+    state = GoGameState(5, FeatureSet(history=2))
+    state.play_move('B', (1, 0))
+    state.play_move('W', (4, 4))
+    state.play_move('B', (0, 1))
+    before = state.make_features('W')
+
+    with pytest.raises(ValueError):
+        state.play_move('W', (0, 0))
+
+    np.testing.assert_array_equal(state.make_features('W'), before)
+
+
+def test_history_records_position_before_capture():
+    state = GoGameState(5, FeatureSet(history=1))
+    state.play_move('W', (0, 0))
+    state.play_move('B', (1, 0))
+    captured = state.play_move('B', (0, 1))
+
+    assert captured == [(0, 0)]
+    planes = state.make_features('W')
+    # 历史平面(3黑,4白)是提子前的盘面：白子仍在(0,0)，(0,1)尚未落子
+    assert planes[4, 0, 0] == 1
+    assert planes[3, 1, 0] == 0
+    assert planes[3, 0, 1] == 1
+
+
+def test_feature_planes_match_replay_recomputation():
+    features = FeatureSet(history=3, liberties=3)
+    state = GoGameState(7, features)
+    rng = np.random.default_rng(0)
+    boards = []  # 每一手之前的盘面
+    color = 'B'
+    for _ in range(200):
+        x, y = (int(v) for v in rng.integers(0, 7, size=2))
+        if state.board[y, x] != 0:
+            continue
+        before = state.board.copy()
+        try:
+            state.play_move(color, (x, y))
+        except ValueError:
+            continue
+        boards.append(before)
+        color = 'W' if color == 'B' else 'B'
+
+        planes = state.make_features(color)
+        for i in range(3):
+            past = boards[-1 - i] if i < len(boards) else np.zeros_like(before)
+            np.testing.assert_array_equal(planes[3 + 2 * i], past == 1)
+            np.testing.assert_array_equal(planes[4 + 2 * i], past == -1)
+
+        # 增量维护的气数平面与从头计算的结果一致
+        fresh = GoGameState(7, features)
+        ys, xs = np.nonzero(state.board == 1)
+        fresh.apply_setup('B', [(int(px) + 1, int(py) + 1) for px, py in zip(xs, ys)])
+        ys, xs = np.nonzero(state.board == -1)
+        fresh.apply_setup('W', [(int(px) + 1, int(py) + 1) for px, py in zip(xs, ys)])
+        np.testing.assert_array_equal(planes[9:], fresh.make_features(color)[9:])
+    assert len(boards) > 50
@@ -0,0 +1,25 @@
+import torch
+
+from checkpointing import AsyncCheckpointWriter
+from utils import load_checkpoint
+
+
+def test_writer_saves_aliases_and_prunes_old_epochs(tmp_path):
+    writer = AsyncCheckpointWriter(keep_last=2)
+    weight = torch.zeros(3)
+    for epoch in range(1, 5):
+        weight.fill_(epoch)
+        paths = [tmp_path / f'checkpoint_epoch_{epoch}.pt', tmp_path / 'checkpoint_latest.pt']
+        if epoch == 2:
+            paths.append(tmp_path / 'checkpoint_best.pt')
+        writer.submit({'epoch': epoch, 'model': {'weight': weight}}, paths)
+    # submit已在调用线程上拷贝了快照，之后修改张量不影响写入的内容
+    weight.fill_(-1)
+    writer.close()
+
+    names = sorted(path.name for path in tmp_path.iterdir())
+    assert names == ['checkpoint_best.pt', 'checkpoint_epoch_3.pt', 'checkpoint_epoch_4.pt', 'checkpoint_latest.pt']
+    latest = load_checkpoint(tmp_path / 'checkpoint_latest.pt', torch.device('cpu'))
+    best = load_checkpoint(tmp_path / 'checkpoint_best.pt', torch.device('cpu'))
+    assert latest['epoch'] == 4 and torch.equal(latest['model']['weight'], torch.full((3,), 4.0))
+    assert best['epoch'] == 2 and torch.equal(best['model']['weight'], torch.full((3,), 2.0))
@@ -0,0 +1,34 @@
+import torch
+
+from artifact import load_artifact
+from board import FeatureSet
+from export import export_policy
+from model import SimplePolicyNet
+
+
+def test_exported_artifact_matches_checkpoint(tmp_path):
+    torch.manual_seed(0)
+    features = FeatureSet()
+    model = SimplePolicyNet(board_size=5, in_channels=features.num_planes, channels=8, num_blocks=2, head='conv')
+    # 训练模式前向几次，让BatchNorm的统计量不再是初始值，折叠才有意义
+    model.train()
+    with torch.no_grad():
+        for _ in range(4):
+            model(torch.randn(16, features.num_planes, 5, 5))
+    model.eval()
+    checkpoint = tmp_path / 'checkpoint.pt'
+    torch.save({
+        'model': model.state_dict(),
+        'features': features.to_dict(),
+        'arch': {'channels': 8, 'blocks': 2, 'head': 'conv'},
+    }, checkpoint)
+
+    output = tmp_path / 'policy.pt'
+    export_policy(checkpoint, output, 5, torch.device('cpu'))
+    scripted, meta = load_artifact(output, torch.device('cpu'))
+
+    assert meta['board_size'] == 5 and meta['head'] == 'conv' and not meta['quantized']
+    assert FeatureSet.from_dict(meta['features']) == features
+    inputs = torch.randn(8, features.num_planes, 5, 5)
+    with torch.no_grad():
+        assert torch.allclose(scripted(inputs), model(inputs), atol=1e-4)
@@ -0,0 +1,37 @@
+import torch
+
+from board import FeatureSet
+from gtp import GTPEngine
+from model import SimplePolicyNet
+
+
+def make_engine(size: int = 5) -> GTPEngine:
+    def load(board_size: int):
+        torch.manual_seed(0)
+        model = SimplePolicyNet(board_size=board_size, in_channels=FeatureSet().num_planes, channels=8, num_blocks=1, head='conv')
+        return model.eval(), FeatureSet()
+
+    return GTPEngine(load, size, torch.device('cpu'), visits=16, seconds=None, batch_size=4)
+
+
+def test_no_ponder_after_two_passes():
+    engine = make_engine()
+    engine.handle('play B pass')
+    engine.handle('play W pass')
+
+    engine._start_ponder()
+
+    assert engine._ponder_thread is None
+
+
+def test_internal_error_gets_failure_response():
+    engine = make_engine()
+
+    def broken(args):
+        raise RuntimeError('boom')
+
+    engine.commands['broken'] = broken
+    response, quit_requested = engine.handle('7 broken')
+
+    assert response == '?7 boom\n\n'
+    assert not quit_requested
@@ -0,0 +1,94 @@
+import threading
+
+import torch
+
+from board import FeatureSet, GoGameState
+from mcts import MCTS, ko_point
+from model import SimplePolicyNet
+
+
+def make_engine(size: int = 5) -> MCTS:
+    torch.manual_seed(0)
+    model = SimplePolicyNet(board_size=size, in_channels=FeatureSet().num_planes, channels=8, num_blocks=1, head='conv')
+    return MCTS(model.eval(), torch.device('cpu'), batch_size=4)
+
+
+def test_pass_after_opponent_pass_ends_game():
+    engine = make_engine()
+    state = GoGameState(5, FeatureSet())
+    state.play_move('B', (2, 2))
+
+    engine.set_position(state, 'W', passes=1)
+    engine.search(visits=16)
+
+    assert engine.root.children[25].terminal is not None
+
+
+def test_pass_count_decides_tree_reuse():
+    engine = make_engine()
+    state = GoGameState(5, FeatureSet())
+    engine.set_position(state, 'B', passes=1)
+    engine.search(visits=8)
+    searched = engine.root
+
+    engine.set_position(state, 'B', passes=0)
+
+    assert engine.root is not searched
+    assert engine.root.passes == 0
+
+
+def test_search_from_finished_position_passes():
+    engine = make_engine()
+    state = GoGameState(5, FeatureSet())
+    engine.set_position(state, 'B', passes=2)
+
+    assert engine.search(stop=threading.Event()) is None
+    assert engine.root.n == 0
+
+
+def ko_position() -> GoGameState:
+    state = GoGameState(5, FeatureSet())
+    for color, coord in [('B', (1, 0)), ('W', (2, 0)), ('B', (0, 1)), ('W', (3, 1)), ('B', (1, 2)), ('W', (2, 2)), ('B', (4, 4)), ('W', (1, 1))]:
+        state.play_move(color, coord)
+    # 黑提掉(1,1)的白子，白不能立即在(1,1)提回
+    captured = state.play_move('B', (2, 1))
+    assert ko_point(state, 2, 1, captured) == (1, 1)
+    return state
+
+
+def test_ko_point_is_not_searched():
+    engine = make_engine()
+    engine.set_position(ko_position(), 'W', ko=(1, 1))
+    engine.search(visits=32)
+
+    assert not engine.root.legal[1 * 5 + 1]
+    assert 1 * 5 + 1 not in engine.root.children
+
+
+def test_ko_decides_tree_reuse():
+    engine = make_engine()
+    state = ko_position()
+    engine.set_position(state, 'W')
+    engine.search(visits=8)
+    searched = engine.root
+
+    engine.set_position(state, 'W', ko=(1, 1))
+
+    assert engine.root is not searched
+    assert engine.root.ko == 1 * 5 + 1
+
+
+def test_parallel_search_keeps_counts_consistent():
+    torch.manual_seed(0)
+    model = SimplePolicyNet(board_size=5, in_channels=FeatureSet().num_planes, channels=8, num_blocks=1, head='conv')
+    engine = MCTS(model.eval(), torch.device('cpu'), batch_size=4, threads=4)
+    engine.set_position(GoGameState(5, FeatureSet()), 'B')
+    engine.search(visits=300)
+
+    root = engine.root
+    # 所有虚拟损失都已撤回：根的访问数等于各子节点访问数之和加上根自身的一次
+    assert root.n >= 301
+    assert root.child_n.sum() == root.n - 1
+    assert not engine._inflight
+    for action, child in root.children.items():
+        assert child.n == root.child_n[action]
@@ -0,0 +1,26 @@
+import torch
+
+from board import FeatureSet
+from model import SimplePolicyNet
+from quantize import default_engine, quantize_model
+
+
+def test_int8_model_tracks_float_model():
+    torch.manual_seed(0)
+    features = FeatureSet()
+    model = SimplePolicyNet(board_size=5, in_channels=features.num_planes, channels=16, num_blocks=2, head='conv').eval()
+    # 输入与真实特征一样取0/1
+    calibration = [torch.randint(0, 2, (32, features.num_planes, 5, 5)).float() for _ in range(4)]
+    qmodel = quantize_model(model, calibration, default_engine())
+
+    inputs = torch.randint(0, 2, (64, features.num_planes, 5, 5)).float()
+    with torch.no_grad():
+        expected = model(inputs)
+        actual = qmodel(inputs)
+
+    assert actual.shape == (64, 26)
+    # 原模型不受量化影响
+    assert any(isinstance(m, torch.nn.BatchNorm2d) for m in model.modules())
+    # 随机初始化的logits很接近，误差按其离散程度衡量
+    assert (actual - expected).abs().max() < 0.5 * expected.std()
+    assert (actual.argmax(dim=1) == expected.argmax(dim=1)).float().mean() >= 0.8
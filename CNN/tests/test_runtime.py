@@ -0,0 +1,42 @@
+import numpy as np
+
+from board import FeatureSet, GoGameState
+from runtime import EvalCache, _transform, _untransform
+
+
+def equivariant_policy(planes: np.ndarray) -> np.ndarray:
+    # 每个点的分数由它到各棋子的距离决定，旋转/翻转局面后概率随之旋转/翻转
+    size = planes.shape[-1]
+    ys, xs = np.mgrid[0:size, 0:size]
+    out = []
+    for p in planes:
+        score = np.ones((size, size))
+        for weight, plane in ((3.0, p[0]), (1.0, p[1])):
+            for sy, sx in zip(*np.nonzero(plane)):
+                score += weight / (1.0 + (ys - sy) ** 2 + (xs - sx) ** 2)
+        out.append(np.append(score.ravel(), 1.0))
+    probs = np.array(out)
+    return probs / probs.sum(axis=1, keepdims=True)
+
+
+def test_symmetry_transform_round_trip():
+    board = np.arange(2 * 5 * 5).reshape(2, 5, 5)
+    for t in range(8):
+        np.testing.assert_array_equal(_untransform(_transform(board, t), t), board)
+    assert len({_transform(board, t).tobytes() for t in range(8)}) == 8
+
+
+def test_symmetric_positions_share_an_entry():
+    state = GoGameState(5, FeatureSet())
+    state.play_move('B', (1, 0))
+    state.play_move('W', (3, 2))
+    planes = state.make_features('B')
+    cache = EvalCache(symmetries=True)
+    cache.probs(planes[None], equivariant_policy)
+
+    for t in range(8):
+        rotated = np.ascontiguousarray(_transform(planes, t))[None]
+        cached = cache.probs(rotated, lambda missing: np.zeros((len(missing), 26)))
+        np.testing.assert_allclose(cached, equivariant_policy(rotated))
+    assert cache.stats()['hits'] == 8
+    assert cache.stats()['entries'] == 1
@@ -0,0 +1,37 @@
+import numpy as np
+
+from scoring import area_score, area_scores, eye_mask, game_over, ownership
+
+
+def test_area_score_counts_stones_and_surrounded_territory():
+    board = np.zeros((5, 5), dtype=np.int8)
+    board[:, 1] = 1  # 黑墙：左边一列是黑地
+    board[:, 3] = -1  # 白墙：右边一列是白地，中间一列两边都能到达，是单官
+    owners = ownership(board)
+
+    assert (owners[:, :2] == 1).all()
+    assert (owners[:, 2] == 0).all()
+    assert (owners[:, 3:] == -1).all()
+    assert area_score(board, komi=0.5) == -0.5
+
+
+def test_batched_scores_match_single_boards():
+    rng = np.random.default_rng(0)
+    boards = rng.choice(np.array([-1, 0, 0, 1], dtype=np.int8), size=(16, 7, 7))
+    batched = area_scores(boards, komi=7.5)
+
+    assert batched.shape == (16,)
+    np.testing.assert_array_equal(batched, [area_score(board, komi=7.5) for board in boards])
+
+
+def test_eye_mask_and_game_over():
+    board = np.ones((3, 3), dtype=np.int8)
+    board[0, 0] = 0
+    board[2, 2] = 0
+
+    assert eye_mask(board, 1)[0, 0] and eye_mask(board, 1)[2, 2]
+    assert not eye_mask(board, -1).any()
+    # 黑眼对白方不是眼，白方仍算有点可下，所以还没终局
+    assert not game_over(board, passes=0)
+    assert game_over(board, passes=2)
+    assert game_over(np.zeros((3, 3), dtype=np.int8), passes=0) is False
@@ -0,0 +1,36 @@
+import argparse
+import json
+
+import numpy as np
+import torch
+
+from board import FeatureSet, GoGameState
+from datasets import DatasetConfig, GoMoveDataset
+from model import SimplePolicyNet
+from selfplay import SelfPlayGame, _play_ply
+
+
+def test_passes_are_recorded_and_counted(tmp_path):
+    model = SimplePolicyNet(board_size=5, in_channels=FeatureSet().num_planes, channels=8, num_blocks=1, head='conv')
+    with torch.no_grad():
+        model.pass_fc.weight.zero_()
+        model.pass_fc.bias.fill_(100.0)
+    args = argparse.Namespace(mcts_visits=0, temperature=1.0, temperature_moves=30, final_temperature=0.25)
+    game = SelfPlayGame(GoGameState(5, FeatureSet()), None)
+    game.state.play_move('B', (2, 2))
+    game.moves.append({'B': [3, 3]})
+    game.ply = 1
+    game.to_play = 'W'
+
+    for _ in range(2):
+        _play_ply([game], model.eval(), torch.device('cpu'), None, args, np.random.default_rng(0))
+
+    assert game.moves == [{'B': [3, 3]}, {'W': []}, {'B': []}]
+    assert game.ply == 3
+    assert game.passes == 2
+
+    # 训练加载器跳过pass，只为真正的落子生成样本
+    path = tmp_path / 'game.data'
+    path.write_text(json.dumps(game.moves) + '\n', encoding='utf-8')
+    samples = list(GoMoveDataset(DatasetConfig(board_size=5, data_files=[path], val_ratio=0.0), 'train'))
+    assert [int(target) for _, target in samples] == [2 * 5 + 2]
@@ -0,0 +1,106 @@
+"""Accuracy vs inference-latency report for a set of policy models."""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List
+
+import torch
+
+from config import TrainingConfig
+from datasets import FeatureSet
+from quantize import collect_batches, evaluate, latency_ms
+from runtime import load_policy
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def pareto_front(rows: List[Dict]) -> None:
+    """Mark rows that no other row beats on both batch-1 latency and acc@1."""
+    for row in rows:
+        row['pareto'] = not any(
+            other['latency_ms'][1] <= row['latency_ms'][1]
+            and other['acc1'] >= row['acc1']
+            and (other['latency_ms'][1] < row['latency_ms'][1] or other['acc1'] > row['acc1'])
+            for other in rows
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Compare accuracy and latency of checkpoints and exported artifacts')
+    parser.add_argument('models', nargs='+', help='Checkpoints or artifacts (e.g. teacher, students, int8 exports)')
+    parser.add_argument('--board-size', type=int, default=19)
+    parser.add_argument('--data-paths', nargs='*', default=None, help='.data files (default: Training_data)')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--eval-batches', type=int, default=50, help='Held-out batches used for accuracy')
+    parser.add_argument('--latency-batch-sizes', type=int, nargs='*', default=[1, 16])
+    parser.add_argument('--output', default=None, help='Write the report as JSON')
+    return parser.parse_args()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    args = parse_args()
+    device = torch.device(args.device)
+    data_paths = TrainingConfig(
+        data_paths=[Path(p) for p in args.data_paths] if args.data_paths else None
+    ).resolve_data_paths()
+    if 1 not in args.latency_batch_sizes:
+        args.latency_batch_sizes.insert(0, 1)
+
+    # 相同特征配置的模型共用一份验证集
+    held_out: Dict[FeatureSet, List[Dict[str, torch.Tensor]]] = {}
+    rows = []
+    for name in args.models:
+        path = Path(name).expanduser()
+        model, features = load_policy(path, args.board_size, device)
+        if features not in held_out:
+            held_out[features] = [
+                {key: value.to(device) for key, value in batch.items()}
+                for batch in collect_batches(
+                    data_paths, args.board_size, features, 'val', args.batch_size, args.eval_batches
+                )
+            ]
+        accuracy = evaluate(model, held_out[features])
+        latencies = {}
+        for batch_size in args.latency_batch_sizes:
+            example = torch.zeros(batch_size, features.num_planes, args.board_size, args.board_size, device=device)
+            latencies[batch_size] = latency_ms(model, example)
+        # 冻结/量化后的TorchScript图里权重是常量，不再计为参数
+        params = sum(p.numel() for p in model.parameters())
+        rows.append({
+            'model': str(path),
+            'params': params or None,
+            'size_mb': path.stat().st_size / 2**20,
+            'latency_ms': latencies,
+            **accuracy,
+        })
+        LOGGER.info("%s: acc@1 %.2f%%, batch-1 %.2f ms", path, accuracy['acc1'], latencies[1])
+
+    if not any(row['samples'] for row in rows):
+        raise SystemExit("No held-out positions found")
+    pareto_front(rows)
+    rows.sort(key=lambda row: row['latency_ms'][1])
+
+    latency_cols = ''.join(f" {f'ms@bs{bs}':>10}" for bs in args.latency_batch_sizes)
+    print(f"{'model':<40} {'params':>9} {'MB':>6} {'acc@1':>7} {'acc@5':>7}{latency_cols}  pareto")
+    for row in rows:
+        latency_vals = ''.join(f" {row['latency_ms'][bs]:10.2f}" for bs in args.latency_batch_sizes)
+        path = Path(row['model'])
+        params = f"{row['params']:9d}" if row['params'] else f"{'-':>9}"
+        print(
+            f"{path.parent.name + '/' + path.name:<40} {params} {row['size_mb']:6.2f} "
+            f"{row['acc1']:6.2f}% {row['acc5']:6.2f}%{latency_vals}  {'*' if row['pareto'] else ''}"
+        )
+    if args.output:
+        output = Path(args.output).expanduser()
+        output.write_text(json.dumps({'device': str(device), 'models': rows}, indent=2), encoding='utf-8')
+        LOGGER.info("Report written to %s", output)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,10 @@ from __future__ import annotations
 import argparse
 from pathlib import Path
 
+from autotune import apply_tuned, autotune, best_trial, save_tuned
 from config import TrainingConfig
 from trainer import Trainer
+from utils import configure_logging, prepare_output_dir
 
 
 def parse_args() -> argparse.Namespace:
@@ -17,16 +19,70 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument('--eval-steps', type=int, default=800)
     parser.add_argument('--batch-size', type=int, default=256)
     parser.add_argument('--num-workers', type=int, default=4)
+    parser.add_argument('--prefetch-factor', type=int, default=2, help='Batches prefetched per DataLoader worker')
     parser.add_argument('--learning-rate', type=float, default=0.05)
     parser.add_argument('--momentum', type=float, default=0.9)
     parser.add_argument('--weight-decay', type=float, default=1e-4)
     parser.add_argument('--seed', type=int, default=42)
     parser.add_argument('--resume', type=str, default=None)
     parser.add_argument('--save-every', type=int, default=1)
+    parser.add_argument('--keep-last', type=int, default=0, help='Keep only the newest N epoch checkpoints (0 keeps all)')
+    parser.add_argument('--best-metric', choices=['acc1', 'loss'], default='acc1', help='Metric used to pick checkpoint_best.pt')
     parser.add_argument('--device', type=str, default=None)
+    parser.add_argument('--prefetch-batches', type=int, default=2, help='Batches to stage on the device ahead of compute (0 disables)')
+    parser.add_argument('--log-every', type=int, default=50, help='Steps between progress metric updates (0 = only at epoch end)')
+    parser.add_argument('--profile', action='store_true', help='Record per-phase step timings to profile.jsonl')
+    parser.add_argument('--profile-trace-steps', type=int, default=0, help='Export a torch.profiler trace of this many steps')
+    parser.add_argument('--profile-trace-wait', type=int, default=5, help='Steps to skip before the trace window')
+    parser.add_argument('--history-planes', type=int, default=0, help='Previous positions to include as feature planes')
+    parser.add_argument('--liberty-planes', type=int, default=0, help='Liberty-count feature planes (0 disables)')
+    parser.add_argument('--policy-head', choices=['fc', 'conv'], default='fc', help='Dense head or fully convolutional head with pass logit')
+    parser.add_argument('--channels', type=int, default=64, help='Residual tower width')
+    parser.add_argument('--num-blocks', type=int, default=6, help='Number of residual blocks')
+    parser.add_argument('--teacher', type=str, default=None, help='Distill from this teacher checkpoint')
+    parser.add_argument('--distill-alpha', type=float, default=0.5, help='Weight of the KL term (hard labels get 1 - alpha)')
+    parser.add_argument('--distill-temperature', type=float, default=2.0, help='Softmax temperature for distillation')
+    parser.add_argument('--amp', action='store_true', help='Mixed precision training (bf16 on CPU, fp16 on CUDA)')
+    parser.add_argument('--compile', action='store_true', help='Compile the model with torch.compile')
+    parser.add_argument('--channels-last', action='store_true', help='Use channels_last memory format')
+    parser.add_argument('--distributed', action='store_true', help='DistributedDataParallel training (launch with torchrun)')
+    parser.add_argument('--dist-backend', type=str, default=None, help='Process group backend (default nccl on CUDA, gloo on CPU)')
+    parser.add_argument('--autotune', action='store_true', help='Time a grid of loader settings first and train with the fastest')
+    parser.add_argument('--autotune-only', action='store_true', help='Stop after writing autotune.json')
+    parser.add_argument('--autotune-batch-sizes', type=int, nargs='*', default=[64, 128, 256, 512])
+    parser.add_argument('--autotune-workers', type=int, nargs='*', default=[0, 2, 4, 8])
+    parser.add_argument('--autotune-prefetch', type=int, nargs='*', default=[2, 4])
+    parser.add_argument('--autotune-steps', type=int, default=30, help='Timed steps per trial')
+    parser.add_argument('--tuned-config', type=str, default=None, help='Apply loader settings from an autotune.json')
     return parser.parse_args()
 
 
+def run_autotune(cfg: TrainingConfig, args: argparse.Namespace) -> TrainingConfig:
+    output_dir = prepare_output_dir(cfg.output_dir)
+    # 与Trainer共用train.log，后续configure_logging调用不会重复添加handler
+    configure_logging(output_dir / 'train.log')
+    results = autotune(
+        cfg,
+        batch_sizes=args.autotune_batch_sizes,
+        worker_counts=args.autotune_workers,
+        prefetch_factors=args.autotune_prefetch,
+        steps=args.autotune_steps,
+    )
+    print(f"{'batch':>6} {'workers':>8} {'prefetch':>9} {'samples/s':>11} {'peak MB':>9}")
+    for r in results:
+        status = f"  {r.error}" if r.error else ''
+        peak = 'n/a' if r.peak_memory_mb is None else f'{r.peak_memory_mb:.0f}'
+        print(f"{r.batch_size:6d} {r.num_workers:8d} {r.prefetch_factor:9d} {r.samples_per_sec:11.1f} {peak:>9}{status}")
+    best = best_trial(results)
+    path = output_dir / 'autotune.json'
+    save_tuned(path, best, results)
+    print(
+        f"最佳配置: batch_size={best.batch_size} num_workers={best.num_workers} "
+        f"prefetch_factor={best.prefetch_factor}，已写入 {path}"
+    )
+    return apply_tuned(cfg, path)
+
+
 def main() -> None:
     args = parse_args()
     cfg = TrainingConfig(
@@ -35,6 +91,7 @@ def main() -> None:
         output_dir=Path(args.output_dir).expanduser(),
         batch_size=args.batch_size,
         num_workers=args.num_workers,
+        prefetch_factor=args.prefetch_factor,
         epochs=args.epochs,
         steps_per_epoch=args.steps_per_epoch,
         eval_steps=args.eval_steps,
@@ -43,8 +100,34 @@ def main() -> None:
         weight_decay=args.weight_decay,
         seed=args.seed,
         save_every=args.save_every,
+        keep_last=args.keep_last,
+        best_metric=args.best_metric,
+        prefetch_batches=args.prefetch_batches,
+        log_every=args.log_every,
+        profile=args.profile,
+        profile_trace_steps=args.profile_trace_steps,
+        profile_trace_wait=args.profile_trace_wait,
         device=args.device or ('cuda' if __import__('torch').cuda.is_available() else 'cpu'),
+        history_planes=args.history_planes,
+        liberty_planes=args.liberty_planes,
+        policy_head=args.policy_head,
+        channels=args.channels,
+        num_blocks=args.num_blocks,
+        teacher_checkpoint=Path(args.teacher).expanduser() if args.teacher else None,
+        distill_alpha=args.distill_alpha,
+        distill_temperature=args.distill_temperature,
+        amp=args.amp,
+        compile_model=args.compile,
+        channels_last=args.channels_last,
+        distributed=args.distributed,
+        dist_backend=args.dist_backend,
     )
+    if args.tuned_config:
+        cfg = apply_tuned(cfg, Path(args.tuned_config).expanduser())
+    if args.autotune or args.autotune_only:
+        cfg = run_autotune(cfg, args)
+        if args.autotune_only:
+            return
     trainer = Trainer(cfg)
 
     # 如果没有指定resume参数，自动检查输出目录中是否有checkpoint
@@ -1,25 +1,34 @@
 from __future__ import annotations
 
 import logging
+import math
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional, Tuple
 from tqdm import tqdm
 
 import torch
+import torch.distributed as dist
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
+from torch.nn.parallel import DistributedDataParallel
 from torch.optim.lr_scheduler import CosineAnnealingLR
 
+from checkpointing import AsyncCheckpointWriter
 from config import TrainingConfig
-from datasets import DatasetConfig
+from datasets import DatasetConfig, FeatureSet
 from datasets import build_dataloader
-from metrics import AverageMeter, topk_accuracy
-from model import SimplePolicyNet
+from metrics import DeviceAverageMeter, topk_correct
+from model import SimplePolicyNet, compile_with_fallback
+from prefetcher import DevicePrefetcher, restarting
+from profiling import PhaseTimer, append_jsonl, build_trace_profiler
 from utils import (
+    DistributedContext,
     configure_logging,
+    init_distributed,
     load_checkpoint,
+    load_policy_model,
     prepare_output_dir,
-    save_checkpoint,
     save_config,
     set_seed,
 )
@@ -29,31 +38,74 @@ LOGGER = logging.getLogger(__name__)
 
 
 class Trainer:
-    def __init__(self, cfg: TrainingConfig) -> None:
+    """Builds the data pipeline, model and optimizer from ``cfg`` and runs the training loop.
+
+    With ``persist=False`` nothing is written to ``cfg.output_dir`` (no log
+    file, config or checkpoints); ``autotune`` uses this to time the real
+    training step.
+    """
+
+    def __init__(self, cfg: TrainingConfig, persist: bool = True) -> None:
         self.cfg = cfg
+        self.persist = persist
         set_seed(cfg.seed)
+        self.dist = init_distributed(cfg.device, cfg.dist_backend) if cfg.distributed else DistributedContext()
+        self.is_main = self.dist.is_main
         self.device = torch.device(cfg.device)
-        self.output_dir = prepare_output_dir(cfg.output_dir)
-        configure_logging(self.output_dir / 'train.log')
-        LOGGER.info("Training configuration: %s", cfg)
+        if cfg.distributed and self.device.type == 'cuda':
+            self.device = torch.device('cuda', self.dist.local_rank)
+        self.output_dir = prepare_output_dir(cfg.output_dir) if persist else cfg.output_dir
+        # 只有rank 0写日志文件和checkpoint，其余进程只输出警告
+        if not self.is_main:
+            logging.basicConfig(level=logging.WARNING)
+        elif persist:
+            configure_logging(self.output_dir / 'train.log')
+            LOGGER.info("Training configuration: %s", cfg)
+        # steps_per_epoch/eval_steps是所有rank合计的步数，每个epoch的总样本量不随进程数变化
+        self.steps_per_epoch = math.ceil(cfg.steps_per_epoch / self.dist.world_size)
+        self.eval_steps = math.ceil(cfg.eval_steps / self.dist.world_size)
+        if cfg.distributed:
+            LOGGER.info(
+                "Distributed training on %d ranks, %d steps per rank per epoch",
+                self.dist.world_size,
+                self.steps_per_epoch,
+            )
 
         data_paths = cfg.resolve_data_paths()
+        self.features = FeatureSet(history=cfg.history_planes, liberties=cfg.liberty_planes)
         dataset_cfg = DatasetConfig(
             board_size=cfg.board_size,
             data_files=data_paths,
             val_ratio=0.0,  # 临时禁用验证集以确保SGF数据正常工作
+            features=self.features,
+            rank=self.dist.rank,
+            world_size=self.dist.world_size,
         )
         self.train_loader = build_dataloader(
             dataset_cfg,
             mode='train',
             batch_size=cfg.batch_size,
             num_workers=cfg.num_workers,
+            prefetch_factor=cfg.prefetch_factor,
         )
         # 暂时不创建验证加载器
         self.val_loader = None
 
-        self.model = SimplePolicyNet(board_size=cfg.board_size)
+        self.model = SimplePolicyNet(
+            board_size=cfg.board_size,
+            in_channels=self.features.num_planes,
+            channels=cfg.channels,
+            num_blocks=cfg.num_blocks,
+            head=cfg.policy_head,
+            block_channels=cfg.block_channels,
+        )
         self.model.to(self.device)
+        self.memory_format = torch.channels_last if cfg.channels_last else torch.contiguous_format
+        if cfg.channels_last:
+            self.model.to(memory_format=torch.channels_last)
+        self.teacher: Optional[nn.Module] = None
+        if cfg.teacher_checkpoint is not None:
+            self.teacher = self._load_teacher(cfg.teacher_checkpoint)
         self.criterion = nn.CrossEntropyLoss()
         self.optimizer = optim.SGD(
             self.model.parameters(),
@@ -61,23 +113,92 @@ class Trainer:
             momentum=cfg.momentum,
             weight_decay=cfg.weight_decay,
         )
-        self.scheduler = CosineAnnealingLR(self.optimizer, T_max=cfg.epochs * cfg.steps_per_epoch)
+        self.scheduler = CosineAnnealingLR(self.optimizer, T_max=cfg.epochs * self.steps_per_epoch)
+        # 权重保持fp32，只在前向计算中使用低精度；fp16需要GradScaler防止梯度下溢
+        self.amp_dtype: Optional[torch.dtype] = None
+        if cfg.amp:
+            self.amp_dtype = torch.float16 if self.device.type == 'cuda' else torch.bfloat16
+        self.scaler = torch.amp.GradScaler('cuda', enabled=self.amp_dtype == torch.float16)
+        # self.model持有权重并用于保存；self.net是实际执行前向的模块（可能是DDP/编译后的包装）
+        forward_module: nn.Module = self.model
+        if cfg.distributed:
+            device_ids = [self.device.index] if self.device.type == 'cuda' else None
+            forward_module = DistributedDataParallel(self.model, device_ids=device_ids)
+        self.net = compile_with_fallback(forward_module, self._warmup) if cfg.compile_model else forward_module
         self.start_epoch = 0
+        self.best_score: Optional[float] = None
+        # checkpoint在后台线程写盘，训练不等待磁盘IO
+        self.checkpoint_writer = AsyncCheckpointWriter(cfg.keep_last) if self.is_main and persist else None
+
+        if self.is_main and persist:
+            save_config(cfg, self.output_dir / 'config.json')
+
+    def _load_teacher(self, path: Path) -> nn.Module:
+        teacher, features = load_policy_model(path, self.cfg.board_size, self.device, channels_last=self.cfg.channels_last)
+        # 师生共用同一批输入和同一套动作编号
+        if features != self.features:
+            raise ValueError(f"Teacher feature set {features} does not match configured {self.features}")
+        if teacher.num_actions != self.model.num_actions:
+            raise ValueError(
+                f"Teacher emits {teacher.num_actions} actions but the student emits {self.model.num_actions}; "
+                "use the same --policy-head as the teacher"
+            )
+        for param in teacher.parameters():
+            param.requires_grad_(False)
+        LOGGER.info(
+            "Distilling %s (%s, %d params) into student (%s, %d params), alpha %.2f, temperature %.1f",
+            path,
+            teacher.arch,
+            sum(p.numel() for p in teacher.parameters()),
+            self.model.arch,
+            sum(p.numel() for p in self.model.parameters()),
+            self.cfg.distill_alpha,
+            self.cfg.distill_temperature,
+        )
+        return teacher
 
-        save_config(cfg, self.output_dir / 'config.json')
+    def _distill_loss(self, logits: torch.Tensor, teacher_logits: torch.Tensor, targets: torch.Tensor) -> torch.Tensor:
+        temperature = self.cfg.distill_temperature
+        # softmax/KL在fp32下计算，避免AMP下的精度问题；乘T^2使梯度量级与温度无关
+        soft = F.kl_div(
+            F.log_softmax(logits.float() / temperature, dim=1),
+            F.log_softmax(teacher_logits.float() / temperature, dim=1),
+            reduction='batchmean',
+            log_target=True,
+        ) * (temperature * temperature)
+        hard = self.criterion(logits, targets)
+        return self.cfg.distill_alpha * soft + (1.0 - self.cfg.distill_alpha) * hard
 
     def maybe_load_checkpoint(self, path: Optional[Path]) -> None:
         if path is None or not path.exists():
             return
         checkpoint = load_checkpoint(path, self.device)
+        saved_features = FeatureSet.from_dict(checkpoint.get('features'))
+        if saved_features != self.features:
+            raise ValueError(
+                f"Checkpoint feature set {saved_features} does not match configured {self.features}"
+            )
         self.model.load_state_dict(checkpoint['model'])
         self.optimizer.load_state_dict(checkpoint['optimizer'])
         self.scheduler.load_state_dict(checkpoint['scheduler'])
+        # fp32训练的旧checkpoint没有scaler状态，此时保留新建的scaler
+        if self.scaler.is_enabled() and 'scaler' in checkpoint:
+            self.scaler.load_state_dict(checkpoint['scaler'])
         self.start_epoch = checkpoint.get('epoch', 0)
+        self.best_score = checkpoint.get('best_score')
         LOGGER.info("Resumed from checkpoint %s at epoch %d", path, self.start_epoch)
 
     def run(self) -> None:
-        global_step = self.start_epoch * self.cfg.steps_per_epoch
+        try:
+            self._run_epochs()
+        finally:
+            if self.checkpoint_writer is not None:
+                self.checkpoint_writer.close()
+        if self.cfg.distributed:
+            dist.destroy_process_group()
+
+    def _run_epochs(self) -> None:
+        global_step = self.start_epoch * self.steps_per_epoch
         for epoch in range(self.start_epoch, self.cfg.epochs):
             train_metrics, global_step = self.train_one_epoch(epoch, global_step)
             LOGGER.info(
@@ -88,6 +209,13 @@ class Trainer:
                 train_metrics['acc5'],
             )
             val_metrics = self.evaluate(epoch)
+            if self.teacher is not None:
+                LOGGER.info(
+                    "Epoch %d teacher acc@1 %.2f%%, student/teacher top-1 agreement %.2f%%",
+                    epoch + 1,
+                    train_metrics['teacher_acc1'],
+                    train_metrics['agreement'],
+                )
             if val_metrics is not None:
                 LOGGER.info(
                     "Epoch %d val   loss %.4f acc@1 %.2f%% acc@5 %.2f%%",
@@ -96,63 +224,149 @@ class Trainer:
                     val_metrics['acc1'],
                     val_metrics['acc5'],
                 )
-            if (epoch + 1) % self.cfg.save_every == 0:
-                self.save_checkpoint(epoch)
+            if not self.is_main:
+                continue
+            # 有验证集时按验证指标挑选最佳模型，否则退回训练指标
+            metrics = val_metrics if val_metrics is not None else train_metrics
+            is_best = self._update_best(metrics[self.cfg.best_metric])
+            if (epoch + 1) % self.cfg.save_every == 0 or is_best:
+                self.save_checkpoint(epoch, metrics, is_best)
+
+    def _update_best(self, score: float) -> bool:
+        if self.cfg.best_metric == 'loss':
+            improved = self.best_score is None or score < self.best_score
+        else:
+            improved = self.best_score is None or score > self.best_score
+        if improved:
+            self.best_score = score
+        return improved
 
     def train_one_epoch(self, epoch: int, global_step: int):
         self.model.train()
-        loss_meter = AverageMeter('loss')
-        acc1_meter = AverageMeter('acc1')
-        acc5_meter = AverageMeter('acc5')
+        # 指标在设备上累加，只在刷新进度条和epoch结束时同步
+        loss_meter = DeviceAverageMeter('loss', self.device)
+        acc1_meter = DeviceAverageMeter('acc1', self.device)
+        acc5_meter = DeviceAverageMeter('acc5', self.device)
+        meters = [loss_meter, acc1_meter, acc5_meter]
+        if self.teacher is not None:
+            teacher_acc1_meter = DeviceAverageMeter('teacher_acc1', self.device)
+            agreement_meter = DeviceAverageMeter('agreement', self.device)
+            meters += [teacher_acc1_meter, agreement_meter]
+
+        timer = PhaseTimer(self.device, enabled=self.cfg.profile)
+        trace = None
+        if self.is_main and self.cfg.profile_trace_steps > 0 and epoch == self.start_epoch:
+            trace = build_trace_profiler(
+                self.device,
+                wait=self.cfg.profile_trace_wait,
+                active=self.cfg.profile_trace_steps,
+                trace_path=self.output_dir / f'trace_epoch_{epoch+1}.json',
+            )
+            trace.start()
 
-        iterator = iter(self.train_loader)
+        batches = self.make_batches()
 
         # 创建进度条
-        pbar = tqdm(total=self.cfg.steps_per_epoch,
+        pbar = tqdm(total=self.steps_per_epoch,
                     desc=f'Epoch {epoch+1}',
-                    unit='batch')
+                    unit='batch',
+                    disable=not self.is_main)
 
         steps = 0
-        while steps < self.cfg.steps_per_epoch:
-            try:
-                inputs, targets = next(iterator)
-            except StopIteration:
-                iterator = iter(self.train_loader)
-                inputs, targets = next(iterator)
-            inputs = inputs.to(self.device, non_blocking=True)
-            targets = targets.to(self.device, non_blocking=True)
-
-            logits = self.model(inputs)
-            loss = self.criterion(logits, targets)
+        while steps < self.steps_per_epoch:
+            with timer.phase('data'):
+                inputs, targets = next(batches)
+            inputs, targets, loss, logits, teacher_logits = self.train_step(inputs, targets, timer)
 
-            self.optimizer.zero_grad()
-            loss.backward()
-            nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=1.0)
-            self.optimizer.step()
-            self.scheduler.step()
-
-            acc1, acc5 = topk_accuracy(logits, targets, topk=(1, 5))
             batch_size = inputs.size(0)
-            loss_meter.update(loss.item(), batch_size)
-            acc1_meter.update(acc1, batch_size)
-            acc5_meter.update(acc5, batch_size)
+            timer.step(batch_size)
+            if trace is not None:
+                trace.step()
+            correct = topk_correct(logits, targets, topk=(1, 5)) * (100.0 / batch_size)
+            loss_meter.update(loss, batch_size)
+            acc1_meter.update(correct[0], batch_size)
+            acc5_meter.update(correct[1], batch_size)
+            if self.teacher is not None:
+                teacher_correct = topk_correct(teacher_logits, targets, topk=(1,)) * (100.0 / batch_size)
+                teacher_acc1_meter.update(teacher_correct[0], batch_size)
+                agreement = (logits.argmax(dim=1) == teacher_logits.argmax(dim=1)).float().mean() * 100.0
+                agreement_meter.update(agreement, batch_size)
 
             steps += 1
             global_step += 1
 
-            # 更新进度条
-            pbar.set_postfix({
-                'Loss': f'{loss_meter.avg:.4f}',
-                'Acc@1': f'{acc1_meter.avg:.2f}%',
-                'Acc@5': f'{acc5_meter.avg:.2f}%'
-            })
+            # 读取指标会强制同步设备，因此每log_every步才刷新一次；log_every为0时只在epoch末刷新
+            refresh = self.cfg.log_every > 0 and steps % self.cfg.log_every == 0
+            if self.is_main and (refresh or steps == self.steps_per_epoch):
+                pbar.set_postfix({
+                    'Loss': f'{loss_meter.avg:.4f}',
+                    'Acc@1': f'{acc1_meter.avg:.2f}%',
+                    'Acc@5': f'{acc5_meter.avg:.2f}%'
+                })
             pbar.update(1)
 
         pbar.close()
-        return (
-            {'loss': loss_meter.avg, 'acc1': acc1_meter.avg, 'acc5': acc5_meter.avg},
-            global_step,
+        if isinstance(batches, DevicePrefetcher):
+            batches.close()
+        if trace is not None:
+            trace.stop()
+        if self.cfg.profile and self.is_main:
+            self._log_profile(timer.summary(epoch + 1))
+        for meter in meters:
+            meter.all_reduce()
+        return {meter.name: meter.avg for meter in meters}, global_step
+
+    def make_batches(self) -> Iterator[Tuple[torch.Tensor, torch.Tensor]]:
+        """Endless training batches, staged on the device ahead of time when ``prefetch_batches > 0``."""
+        # 预取器在计算当前batch时已把后续batch搬到设备上，并负责loader耗尽后的重启
+        if self.cfg.prefetch_batches > 0:
+            return DevicePrefetcher(self.train_loader, self.device, self.memory_format, depth=self.cfg.prefetch_batches)
+        return restarting(self.train_loader)
+
+    def train_step(self, inputs: torch.Tensor, targets: torch.Tensor, timer: PhaseTimer):
+        """One optimizer step on a batch.
+
+        Returns the batch as moved to the device, the loss, the logits and the
+        teacher logits (``None`` unless distilling).
+        """
+        # 使用预取器时张量已在设备上，这里的.to()直接返回原张量
+        with timer.phase('h2d'):
+            inputs = inputs.to(self.device, non_blocking=True, memory_format=self.memory_format)
+            targets = targets.to(self.device, non_blocking=True)
+
+        teacher_logits = None
+        with timer.phase('forward'), self._autocast():
+            logits = self.net(inputs)
+            if self.teacher is None:
+                loss = self.criterion(logits, targets)
+            else:
+                # 教师logits随batch即时计算，无需维护与数据流对齐的logit缓存
+                with torch.no_grad():
+                    teacher_logits = self.teacher(inputs)
+                loss = self._distill_loss(logits, teacher_logits, targets)
+
+        with timer.phase('backward'):
+            self.optimizer.zero_grad()
+            self.scaler.scale(loss).backward()
+        with timer.phase('optimizer'):
+            # 裁剪前必须先还原梯度的真实尺度
+            self.scaler.unscale_(self.optimizer)
+            nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=1.0)
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
+            self.scheduler.step()
+        return inputs, targets, loss, logits, teacher_logits
+
+    def _log_profile(self, summary: dict) -> None:
+        phases = summary['phases']
+        LOGGER.info(
+            "Epoch %d profile: %.1f samples/s, loader starvation %.1f%%, ms/step %s",
+            summary['epoch'],
+            summary['samples_per_sec'],
+            summary['loader_starvation_pct'],
+            ' '.join(f"{name}={stats['ms_per_step']:.1f}" for name, stats in phases.items()),
         )
+        append_jsonl(self.output_dir / 'profile.jsonl', summary)
 
     def evaluate(self, epoch: int):
         if self.val_loader is None:
@@ -160,39 +374,72 @@ class Trainer:
             return None
 
         self.model.eval()
-        loss_meter = AverageMeter('loss')
-        acc1_meter = AverageMeter('acc1')
-        acc5_meter = AverageMeter('acc5')
+        loss_meter = DeviceAverageMeter('loss', self.device)
+        acc1_meter = DeviceAverageMeter('acc1', self.device)
+        acc5_meter = DeviceAverageMeter('acc5', self.device)
         iterator = iter(self.val_loader)
         steps = 0
         with torch.no_grad():
-            while steps < self.cfg.eval_steps:
+            while steps < self.eval_steps:
                 try:
                     inputs, targets = next(iterator)
                 except StopIteration:
                     iterator = iter(self.val_loader)
                     inputs, targets = next(iterator)
-                inputs = inputs.to(self.device, non_blocking=True)
+                inputs = inputs.to(self.device, non_blocking=True, memory_format=self.memory_format)
                 targets = targets.to(self.device, non_blocking=True)
-                logits = self.model(inputs)
-                loss = self.criterion(logits, targets)
-                acc1, acc5 = topk_accuracy(logits, targets, topk=(1, 5))
+                with self._autocast():
+                    logits = self.net(inputs)
+                    loss = self.criterion(logits, targets)
                 batch_size = inputs.size(0)
-                loss_meter.update(loss.item(), batch_size)
-                acc1_meter.update(acc1, batch_size)
-                acc5_meter.update(acc5, batch_size)
+                correct = topk_correct(logits, targets, topk=(1, 5)) * (100.0 / batch_size)
+                loss_meter.update(loss, batch_size)
+                acc1_meter.update(correct[0], batch_size)
+                acc5_meter.update(correct[1], batch_size)
                 steps += 1
+        for meter in (loss_meter, acc1_meter, acc5_meter):
+            meter.all_reduce()
         return {'loss': loss_meter.avg, 'acc1': acc1_meter.avg, 'acc5': acc5_meter.avg}
 
-    def save_checkpoint(self, epoch: int) -> None:
+    def _autocast(self):
+        return torch.autocast(
+            device_type=self.device.type,
+            dtype=self.amp_dtype,
+            enabled=self.amp_dtype is not None,
+        )
+
+    def _warmup(self, net: nn.Module) -> None:
+        # 用一个假batch跑一次前向+反向触发编译，随后恢复权重和BN统计量
+        snapshot = {k: v.detach().clone() for k, v in self.model.state_dict().items()}
+        size = self.cfg.board_size
+        inputs = torch.zeros(
+            self.cfg.batch_size, self.features.num_planes, size, size, device=self.device
+        ).to(memory_format=self.memory_format)
+        targets = torch.zeros(self.cfg.batch_size, dtype=torch.long, device=self.device)
+        with self._autocast():
+            loss = self.criterion(net(inputs), targets)
+        loss.backward()
+        self.model.zero_grad(set_to_none=True)
+        self.model.load_state_dict(snapshot)
+
+    def save_checkpoint(self, epoch: int, metrics: Optional[dict] = None, is_best: bool = False) -> None:
         checkpoint = {
             'epoch': epoch + 1,
             'model': self.model.state_dict(),
             'optimizer': self.optimizer.state_dict(),
             'scheduler': self.scheduler.state_dict(),
+            'features': self.features.to_dict(),
+            'arch': self.model.arch,
+            'metrics': metrics,
+            'best_score': self.best_score,
         }
-        path = self.output_dir / f'checkpoint_epoch_{epoch+1}.pt'
-        save_checkpoint(checkpoint, path)
-        latest = self.output_dir / 'checkpoint_latest.pt'
-        save_checkpoint(checkpoint, latest)
-        LOGGER.info('Checkpoint saved to %s', path)
+        if self.scaler.is_enabled():
+            checkpoint['scaler'] = self.scaler.state_dict()
+        paths = []
+        if (epoch + 1) % self.cfg.save_every == 0:
+            paths.append(self.output_dir / f'checkpoint_epoch_{epoch+1}.pt')
+            paths.append(self.output_dir / 'checkpoint_latest.pt')
+        if is_best:
+            paths.append(self.output_dir / 'checkpoint_best.pt')
+        if paths:
+            self.checkpoint_writer.submit(checkpoint, paths)
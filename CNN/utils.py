@@ -2,13 +2,18 @@ from __future__ import annotations
 
 import json
 import logging
+import os
 import random
-from dataclasses import asdict
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
 
 import numpy as np
 import torch
+import torch.distributed as dist
+
+from datasets import FeatureSet
+from model import SimplePolicyNet, compile_with_fallback, detect_arch
 
 
 def set_seed(seed: int) -> None:
@@ -52,9 +57,92 @@ def configure_logging(log_path: Path) -> None:
     )
 
 
+@dataclass
+class DistributedContext:
+    rank: int = 0
+    world_size: int = 1
+    local_rank: int = 0
+
+    @property
+    def is_main(self) -> bool:
+        return self.rank == 0
+
+
+def init_distributed(device: str, backend: Optional[str] = None) -> DistributedContext:
+    """Join the process group described by the torchrun environment variables."""
+    if 'RANK' not in os.environ or 'WORLD_SIZE' not in os.environ:
+        raise RuntimeError("Distributed training must be launched with torchrun")
+    ctx = DistributedContext(
+        rank=int(os.environ['RANK']),
+        world_size=int(os.environ['WORLD_SIZE']),
+        local_rank=int(os.environ.get('LOCAL_RANK', 0)),
+    )
+    if backend is None:
+        backend = 'nccl' if device.startswith('cuda') else 'gloo'
+    if device.startswith('cuda'):
+        torch.cuda.set_device(ctx.local_rank)
+    dist.init_process_group(backend=backend)
+    return ctx
+
+
 def save_checkpoint(state: Dict[str, Any], path: Path) -> None:
-    torch.save(state, path)
+    # 先写临时文件再原子替换，写到一半崩溃也不会损坏已有的checkpoint
+    tmp = path.with_name(path.name + '.tmp')
+    with tmp.open('wb') as fh:
+        torch.save(state, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
 
 
 def load_checkpoint(path: Path, device: torch.device) -> Dict[str, Any]:
     return torch.load(path, map_location=device)
+
+
+def strip_compile_prefix(state_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop the ``_orig_mod.`` prefix torch.compile adds to parameter names."""
+    prefix = '_orig_mod.'
+    return {(k[len(prefix):] if k.startswith(prefix) else k): v for k, v in state_dict.items()}
+
+
+def load_policy_model(
+    path: Path,
+    board_size: int,
+    device: torch.device,
+    channels_last: bool = False,
+    compile_model: bool = False,
+) -> Tuple[torch.nn.Module, FeatureSet]:
+    """Rebuild the policy net from a training checkpoint or a bare state_dict."""
+    checkpoint = load_checkpoint(path, device)
+    if 'model' in checkpoint:
+        state_dict = checkpoint['model']
+        features = FeatureSet.from_dict(checkpoint.get('features'))
+        arch = checkpoint.get('arch') or {}
+    else:
+        state_dict = checkpoint
+        features = FeatureSet()
+        arch = {}
+    state_dict = strip_compile_prefix(state_dict)
+    # 旧checkpoint没有(完整的)arch信息时根据参数名和形状推断
+    arch = {**detect_arch(state_dict), **arch}
+    model = SimplePolicyNet(
+        board_size=board_size,
+        in_channels=features.num_planes,
+        channels=arch['channels'],
+        num_blocks=arch['blocks'],
+        head=arch['head'],
+        block_channels=arch['block_channels'],
+    )
+    model.load_state_dict(state_dict)
+    model.to(device)
+    if channels_last:
+        model.to(memory_format=torch.channels_last)
+    model.eval()
+    if compile_model:
+        def warmup(net: torch.nn.Module) -> None:
+            example = torch.zeros(1, features.num_planes, board_size, board_size, device=device)
+            with torch.no_grad():
+                net(example)
+
+        return compile_with_fallback(model, warmup), features
+    return model, features